@@ -0,0 +1,180 @@
+"""NumPyによる成績集計
+
+全半荘を (局 × 席) の収支と (和了 × 役) の行列に平坦化し、
+プレイヤーごとの成績とチーム合計をまとめて計算する。
+結果は calc_player_data_by_round を順に呼んだ場合と一致する。
+"""
+from array import array
+from dataclasses import dataclass
+from itertools import chain
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from config import DORA_FANS, RARE_FANS
+from data_structures import PlayerData, PlayerHalfRoundData, RoundData
+
+# 役の行列の空き（流し満貫の -1 と区別する）
+FAN_PAD = np.iinfo(np.int32).min
+
+
+@dataclass
+class GameTable:
+    """全半荘を平坦化した配列"""
+    player_n: int
+    names: List[List[str]]      # 半荘ごとの席順の名前
+    final_scores: np.ndarray    # (半荘, 席) total_point
+    hand_counts: np.ndarray     # (半荘,) 局数
+    delta_main: np.ndarray      # (局, 席) 和了による収支
+    hule_slots: np.ndarray      # (和了,) 半荘 * 人数 + 和了者の席
+    fan_ids: np.ndarray         # (和了, 役) 役ID（FAN_PAD で埋める）
+    fan_vals: np.ndarray        # (和了, 役)
+
+    @property
+    def game_n(self) -> int:
+        return len(self.names)
+
+
+def build_table(round_data_list: Sequence[RoundData], player_n: int) -> GameTable:
+    """RoundDataのリストを配列に変換"""
+    game_n = len(round_data_list)
+    final_scores = np.array([round_data.scores for round_data in round_data_list], dtype=np.int64).reshape(game_n, player_n)
+    hand_counts = np.fromiter((len(round_data.hands) for round_data in round_data_list), dtype=np.int64, count=game_n)
+
+    deltas = array('i')
+    hule_slots = array('q')
+    fan_counts = array('q')
+    fan_flat = array('q')  # id, val, id, val, ...
+    # 局・和了の数だけ回るため、メソッドはローカル変数に取り出しておく
+    add_deltas, add_slot, add_count, add_fans = deltas.extend, hule_slots.append, fan_counts.append, fan_flat.extend
+    flatten = chain.from_iterable
+    for game, round_data in enumerate(round_data_list):
+        base = game * player_n
+        for hand in round_data.hands:
+            add_deltas(hand.deltaMain)
+            for hule in hand.huleData:
+                add_slot(base + hule.seat)
+                add_count(len(hule.fans))
+                add_fans(flatten(hule.fans))
+
+    delta_main = np.frombuffer(deltas, dtype=np.intc).astype(np.int64).reshape(-1, player_n)
+
+    # (和了, 役) の行列に並べ直す
+    counts = np.frombuffer(fan_counts, dtype=np.int64)
+    pairs = np.frombuffer(fan_flat, dtype=np.int64).reshape(-1, 2)
+    width = int(counts.max()) if len(counts) else 0
+    rows = np.repeat(np.arange(len(counts)), counts)
+    cols = np.arange(len(pairs)) - np.repeat(np.cumsum(counts) - counts, counts)
+    fan_ids = np.full((len(counts), width), FAN_PAD, dtype=np.int64)
+    fan_vals = np.zeros((len(counts), width), dtype=np.int64)
+    fan_ids[rows, cols] = pairs[:, 0]
+    fan_vals[rows, cols] = pairs[:, 1]
+
+    return GameTable(
+        player_n=player_n,
+        names=[list(round_data.names) for round_data in round_data_list],
+        final_scores=final_scores,
+        hand_counts=hand_counts,
+        delta_main=delta_main,
+        hule_slots=np.frombuffer(hule_slots, dtype=np.int64),
+        fan_ids=fan_ids,
+        fan_vals=fan_vals,
+    )
+
+
+def _reduce_by_game(ufunc: np.ufunc, values: np.ndarray, hand_counts: np.ndarray) -> np.ndarray:
+    """局ごとの値を半荘ごとに畳み込む（局がない半荘は0）"""
+    result = np.zeros((len(hand_counts), values.shape[1]), dtype=values.dtype)
+    nonempty = hand_counts > 0
+    if nonempty.any():
+        starts = (np.cumsum(hand_counts) - hand_counts)[nonempty]
+        result[nonempty] = ufunc.reduceat(values, starts, axis=0)
+    return result
+
+
+def player_stats(table: GameTable) -> Dict[str, np.ndarray]:
+    """(半荘, 席) ごとの成績"""
+    slot_n = table.game_n * table.player_n
+    shape = (table.game_n, table.player_n)
+
+    dora_hits = np.isin(table.fan_ids, DORA_FANS)
+    dora_per_hule = (table.fan_vals * dora_hits).sum(axis=1)
+    dora = np.bincount(table.hule_slots, weights=dora_per_hule, minlength=slot_n)
+
+    return {
+        "score": table.final_scores / 1000,
+        "maxHule": np.maximum(_reduce_by_game(np.maximum, table.delta_main, table.hand_counts), 0),
+        "paySum": _reduce_by_game(np.add, np.maximum(-table.delta_main, 0), table.hand_counts),
+        "doraCount": dora.astype(np.int64).reshape(shape),
+    }
+
+
+def rare_fans_by_slot(table: GameTable) -> Dict[int, List[int]]:
+    """(半荘 * 人数 + 席) ごとのレア役IDのリスト（和了・役の順）"""
+    rows, cols = np.nonzero(np.isin(table.fan_ids, RARE_FANS))
+    rare: Dict[int, List[int]] = {}
+    for slot, fan_id in zip(table.hule_slots[rows].tolist(), table.fan_ids[rows, cols].tolist()):
+        rare.setdefault(slot, []).append(fan_id)
+    return rare
+
+
+def aggregate_players(round_data_list: Sequence[RoundData], player_n: int) -> Dict[str, PlayerData]:
+    """全半荘のプレイヤーデータを作成"""
+    table = build_table(round_data_list, player_n)
+    stats = {key: values.tolist() for key, values in player_stats(table).items()}
+    rare = rare_fans_by_slot(table)
+
+    player_data_dict: Dict[str, PlayerData] = {}
+    rows = zip(table.names, stats["score"], stats["maxHule"], stats["paySum"], stats["doraCount"])
+    for game, (names, scores, max_hules, pay_sums, dora_counts) in enumerate(rows):
+        base = game * player_n
+        for seat, name in enumerate(names):
+            player_data = player_data_dict.get(name)
+            if player_data is None:
+                player_data = player_data_dict[name] = PlayerData()
+            player_data.dataList.append(PlayerHalfRoundData(
+                scores[seat], max_hules[seat], pay_sums[seat], dora_counts[seat], rare.get(base + seat, []),
+            ))
+    return player_data_dict
+
+
+def team_score_table(round_data_list: Sequence[RoundData], player_data_dict: Dict[str, PlayerData],
+                     teams: Sequence[str]) -> Tuple[List[List], List]:
+    """総合結果シートの半荘ごとのチーム別得点と、チームごとの合計
+
+    チームに所属しない名前は先頭のチームとして扱う。
+    """
+    game_n = len(round_data_list)
+    team_n = len(teams)
+    team_to_col = {team: col for col, team in enumerate(teams)}
+
+    seat_n = len(round_data_list[0].names) if round_data_list else 0
+    scores = np.array([round_data.scores for round_data in round_data_list], dtype=np.int64).reshape(game_n, seat_n) / 1000
+    cols = np.array([
+        [team_to_col.get(player_data_dict[name].team, 0) if name in player_data_dict else -1 for name in round_data.names]
+        for round_data in round_data_list
+    ], dtype=np.int64).reshape(game_n, seat_n)
+
+    # 同じチームが複数いる半荘は後の席の得点を表示する
+    table = np.zeros((game_n, team_n))
+    filled = np.zeros((game_n, team_n), dtype=bool)
+    games = np.arange(game_n)
+    for seat in range(seat_n):
+        valid = cols[:, seat] >= 0
+        table[games[valid], cols[valid, seat]] = scores[valid, seat]
+        filled[games[valid], cols[valid, seat]] = True
+
+    # 合計は半荘・席の順に足す（cumsum は順に加算するため逐次の合計と一致する）
+    contributions = np.zeros((game_n * seat_n, team_n))
+    flat_cols = cols.reshape(-1)
+    valid = flat_cols >= 0
+    contributions[np.flatnonzero(valid), flat_cols[valid]] = scores.reshape(-1)[valid]
+    counted = np.bincount(flat_cols[valid], minlength=team_n) > 0
+    sums = np.cumsum(contributions, axis=0)[-1] if len(contributions) else np.zeros(team_n)
+    totals = [total if has_score else 0 for total, has_score in zip(sums.tolist(), counted.tolist())]
+
+    rows = [
+        [value if has_value else "" for value, has_value in zip(row, row_filled)]
+        for row, row_filled in zip(table.tolist(), filled.tolist())
+    ]
+    return rows, totals
@@ -0,0 +1,249 @@
+"""雀魂の牌譜JSONを模した合成データの生成"""
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import ORIGIN_POINT_3, ORIGIN_POINT_4  # noqa: E402
+
+YAKU_IDS = [1, 2, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 21, 22, 25, 27, 29, 30]
+DORA_IDS = [31, 32, 33, 34]
+RARE_IDS = [3, 4, 5, 6, 18, 19, 20, 24, 28]
+YAKUMAN_IDS = [35, 37, 38, 39, 42]
+TILES = [f"{n}{suit}" for suit in "mpsz" for n in range(1, 10) if not (suit == "z" and n > 7)]
+
+UMA_4 = [15000, 5000, -5000, -15000]
+UMA_3 = [15000, 0, -15000]
+
+
+class GameGenerator:
+    """1半荘分の牌譜を生成する
+
+    PaifuParser が読む head（accounts / result）と、
+    RecordNewRound / RecordDealTile / RecordDiscardTile / RecordAnGangAddGang /
+    RecordHule / RecordNoTile のアクションを含む。
+    ダブロン・槍槓・流し満貫・思考時間（type 2）も一定確率で混ぜる。
+    """
+
+    def __init__(self, rng: random.Random, player_n: int, nicknames: List[str]):
+        self.rng = rng
+        self.player_n = player_n
+        self.nicknames = nicknames
+        self.origin = ORIGIN_POINT_3 if player_n == 3 else ORIGIN_POINT_4
+        self.actions: List[Dict] = []
+
+    def generate(self) -> Dict:
+        scores = [self.origin] * self.player_n
+        ben = 0
+        for chang in range(2):
+            for ju in range(self.player_n):
+                scores, renchan = self._hand(chang, ju, ben, scores)
+                ben = ben + 1 if renchan else 0
+
+        seats = self.rng.sample(self.nicknames, self.player_n)
+        ranking = sorted(range(self.player_n), key=lambda seat: (-scores[seat], seat))
+        uma = UMA_3 if self.player_n == 3 else UMA_4
+        total_points = [0] * self.player_n
+        for rank, seat in enumerate(ranking):
+            total_points[seat] = scores[seat] - self.origin + uma[rank]
+
+        head = {
+            "uuid": f"{self.rng.getrandbits(24):06x}-{self.rng.getrandbits(64):016x}",
+            "start_time": 1700000000 + self.rng.randrange(10 ** 7),
+            "end_time": 1700000000 + 10 ** 7 + self.rng.randrange(3600),
+            "config": {"category": 1, "mode": {"mode": 11 if self.player_n == 3 else 1}},
+            "accounts": [
+                {"account_id": 100000 + self.rng.randrange(10 ** 6), "seat": seat, "nickname": nickname}
+                for seat, nickname in enumerate(seats)
+            ],
+            "result": {
+                "players": [
+                    {"seat": seat, "total_point": total_points[seat], "part_point_1": scores[seat]}
+                    for seat in ranking
+                ]
+            },
+        }
+        # 東家は seat が省略されることがある
+        del head["accounts"][0]["seat"]
+
+        return {
+            "head": head,
+            "data": {
+                "name": ".lq.GameDetailRecords",
+                "data": {"records": [], "version": 210715, "actions": self.actions, "bar": ""},
+            },
+        }
+
+    def _record(self, name: str, data: Dict):
+        self.actions.append({"passed": self.rng.randrange(10 ** 6), "type": 1, "result": {"name": name, "data": data}})
+
+    def _think(self, seat: int):
+        if self.rng.random() < 0.3:
+            self.actions.append({"passed": self.rng.randrange(10 ** 6), "type": 2,
+                                 "user_input": {"seat": seat, "type": 2, "operation": {"type": 1}}})
+
+    def _fans(self, yakuman: bool = False) -> List[Dict[str, int]]:
+        if yakuman:
+            return [{"id": self.rng.choice(YAKUMAN_IDS), "val": 13}]
+        fans = [{"id": fan_id, "val": self.rng.randint(1, 2)}
+                for fan_id in self.rng.sample(YAKU_IDS, self.rng.randint(1, 3))]
+        for fan_id in DORA_IDS:
+            if self.rng.random() < 0.3:
+                fans.append({"id": fan_id, "val": self.rng.randint(1, 3)})
+        if self.rng.random() < 0.05:
+            fans.append({"id": self.rng.choice(RARE_IDS), "val": 1})
+        return fans
+
+    def _hand(self, chang: int, ju: int, ben: int, scores: List[int]):
+        n = self.player_n
+        self._record(".lq.RecordNewRound", {
+            "chang": chang, "ju": ju, "ben": ben, "scores": list(scores), "liqibang": 0,
+            "tiles0": self.rng.sample(TILES, 13), "dora": self.rng.choice(TILES),
+        })
+
+        seat = ju
+        last_discard = seat
+        for _ in range(self.rng.randint(8, 60)):
+            self._record(".lq.RecordDealTile", {"seat": seat, "tile": self.rng.choice(TILES), "left_tile_count": 50})
+            self._think(seat)
+            self._record(".lq.RecordDiscardTile", {"seat": seat, "tile": self.rng.choice(TILES),
+                                                   "is_liqi": False, "moqie": self.rng.random() < 0.5})
+            last_discard = seat
+            seat = (seat + 1) % n
+
+        old_scores = list(scores)
+        if self.rng.random() < 0.3:
+            old_scores[self.rng.randrange(n)] -= 1000  # 立直棒
+
+        outcome = self.rng.random()
+        delta = [0] * n
+        if outcome < 0.3:
+            self._tsumo(ju, old_scores, delta)
+            renchan = delta[ju] > 0
+        elif outcome < 0.75:
+            loser = last_discard
+            if self.rng.random() < 0.03:
+                # 槍槓：次の人が加槓した牌でロン
+                loser = seat
+                self._record(".lq.RecordDealTile", {"seat": loser, "tile": self.rng.choice(TILES), "left_tile_count": 50})
+                self._record(".lq.RecordAnGangAddGang", {"seat": loser, "type": 2, "tiles": self.rng.choice(TILES)})
+            self._ron(loser, old_scores, delta)
+            renchan = delta[ju] > 0
+        else:
+            self._no_tile(ju, old_scores, delta)
+            renchan = True
+        return [old + d for old, d in zip(old_scores, delta)], renchan
+
+    def _tsumo(self, parent: int, old_scores: List[int], delta: List[int]):
+        winner = self.rng.randrange(self.player_n)
+        yakuman = self.rng.random() < 0.01
+        qin = 16000 if yakuman else self.rng.choice([700, 1300, 2000, 3900, 4000, 6000])
+        xian = qin if winner == parent else qin // 2
+        total = 0
+        for seat in range(self.player_n):
+            if seat == winner:
+                continue
+            pay = qin if seat == parent else xian
+            delta[seat] -= pay
+            total += pay
+        delta[winner] += total
+        self._record(".lq.RecordHule", {
+            "hules": [{
+                "seat": winner, "zimo": True, "qinjia": winner == parent,
+                "dadian": total, "count": 13 if yakuman else self.rng.randint(1, 6), "fu": 30,
+                "fans": self._fans(yakuman), "point_rong": 0,
+                "point_zimo_qin": qin, "point_zimo_xian": xian,
+            }],
+            "old_scores": old_scores, "delta_scores": list(delta),
+            "scores": [old + d for old, d in zip(old_scores, delta)],
+        })
+
+    def _ron(self, loser: int, old_scores: List[int], delta: List[int]):
+        # 一定確率でダブロン（三麻はなし）
+        winners = 2 if self.player_n == 4 and self.rng.random() < 0.05 else 1
+        hules = []
+        for i in range(winners):
+            winner = (loser + 1 + i) % self.player_n
+            yakuman = self.rng.random() < 0.01
+            point = 32000 if yakuman else self.rng.choice([1000, 2000, 2600, 3900, 5200, 8000, 12000])
+            delta[winner] += point
+            delta[loser] -= point
+            hules.append({
+                "seat": winner, "zimo": False, "qinjia": False,
+                "dadian": point, "count": 13 if yakuman else self.rng.randint(1, 6), "fu": 30,
+                "fans": self._fans(yakuman), "point_rong": point,
+                "point_zimo_qin": 0, "point_zimo_xian": 0,
+            })
+        # 放銃の直後に和了
+        self._think((loser + 1) % self.player_n)
+        self._record(".lq.RecordHule", {
+            "hules": hules, "old_scores": old_scores, "delta_scores": list(delta),
+            "scores": [old + d for old, d in zip(old_scores, delta)],
+        })
+
+    def _no_tile(self, parent: int, old_scores: List[int], delta: List[int]):
+        n = self.player_n
+        roll = self.rng.random()
+        if roll < 0.05:
+            # 流し満貫
+            winner = self.rng.randrange(n)
+            for seat in range(n):
+                if seat != winner:
+                    pay = 4000 if seat == parent or winner == parent else 2000
+                    delta[seat] -= pay
+                    delta[winner] += pay
+            score = {"seat": winner, "old_scores": old_scores, "delta_scores": list(delta)}
+        elif roll < 0.6:
+            tenpai = [seat for seat in range(n) if self.rng.random() < 0.5]
+            if 0 < len(tenpai) < n:
+                for seat in range(n):
+                    delta[seat] = (3000 // len(tenpai)) if seat in tenpai else -(3000 // (n - len(tenpai)))
+            score = {"old_scores": old_scores, "delta_scores": list(delta)}
+        else:
+            score = {"old_scores": old_scores}
+        self._record(".lq.RecordNoTile", {"liujumanguan": "seat" in score, "players": [], "scores": [score]})
+
+
+def default_nicknames(count: int = 16) -> List[str]:
+    return [f"player{i:02d}" for i in range(count)]
+
+
+def generate_game(rng: random.Random, player_n: int, nicknames: Optional[List[str]] = None) -> Dict:
+    """1半荘分の牌譜を生成"""
+    return GameGenerator(rng, player_n, nicknames or default_nicknames()).generate()
+
+
+def write_archive(directory: Path, games: int, player_n: int, seed: int = 0,
+                  nicknames: Optional[List[str]] = None) -> List[Path]:
+    """games 個の牌譜を directory に 001.json から順に書き出す"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed * 10 + player_n)
+    width = max(3, len(str(games)))
+    paths = []
+    for i in range(1, games + 1):
+        path = directory / f"{i:0{width}d}.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(generate_game(rng, player_n, nicknames), f, ensure_ascii=False)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='合成牌譜の生成')
+    parser.add_argument('output', type=Path, help='出力先（この下に 3/ と 4/ を作る）')
+    parser.add_argument('--games', type=int, default=40, help='人数ごとの試合数')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for player_n in (4, 3):
+        paths = write_archive(args.output / str(player_n), args.games, player_n, args.seed)
+        print(f"{player_n}-player: {len(paths)} games written to {args.output / str(player_n)}")
+
+
+if __name__ == "__main__":
+    main()
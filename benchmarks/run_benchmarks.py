@@ -0,0 +1,248 @@
+"""パースから出力までのベンチマーク
+
+合成牌譜を生成し、parse_round（比較用に逐次読み込みと、牌譜全体の json.load だけの場合も）・
+calc_player_data_by_round・aggregate_players・SheetsExporter.export_* の描画を計測して、ops/sec とピークメモリを表示する。
+Google Sheets への通信はダミーのクライアントで置き換える。
+
+    python benchmarks/run_benchmarks.py --sizes 10,1000,100000
+"""
+import argparse
+import gc
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import cycle, islice
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gspread.http_client import HTTPClient  # noqa: E402
+
+from aggregation import aggregate_players  # noqa: E402
+from main import assign_teams, calc_player_data_by_round  # noqa: E402
+from parser import PaifuParser  # noqa: E402
+from sheets_exporter import SheetsExporter  # noqa: E402
+
+from paifu_generator import default_nicknames, write_archive  # noqa: E402
+
+TEAMS = {4: ["青チーム", "赤チーム", "白チーム", "黒チーム"], 3: ["チームA", "チームB", "チームC"]}
+
+
+class _NullResponse:
+    ok = True
+    status_code = 200
+    headers: Dict[str, str] = {}
+
+    def json(self):
+        return {}
+
+
+class NullSession:
+    """通信せずに成功を返すセッション（リクエスト数と送信バイト数だけ数える）"""
+
+    def __init__(self):
+        self.headers = {}
+        self.requests = 0
+        self.bytes_sent = 0
+
+    def request(self, method, url, json=None, **kwargs):
+        self.requests += 1
+        if json is not None:
+            self.bytes_sent += len(_dumps(json))
+        return _NullResponse()
+
+
+class NullSpreadsheet:
+    """gspread.Spreadsheet のダミー"""
+
+    id = "benchmark"
+    title = "benchmark"
+
+    def __init__(self, session: NullSession):
+        self.session = session
+        self.client = HTTPClient(auth=None, session=session)
+        self._next_sheet_id = 1
+
+    def fetch_sheet_metadata(self, params=None):
+        self.session.request("get", "metadata")
+        return {"sheets": []}
+
+    def batch_update(self, body):
+        self.session.request("post", "batchUpdate", json=body)
+        replies = []
+        for request in body.get("requests", []):
+            if "addSheet" in request:
+                properties = dict(request["addSheet"]["properties"], sheetId=self._next_sheet_id)
+                self._next_sheet_id += 1
+                replies.append({"addSheet": {"properties": properties}})
+            else:
+                replies.append({})
+        return {"replies": replies}
+
+    def values_batch_clear(self, params=None, body=None):
+        self.session.request("post", "values:batchClear", json=body)
+        return {}
+
+    def values_batch_update(self, body=None):
+        self.session.request("post", "values:batchUpdate", json=body)
+        return {}
+
+
+def _dumps(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+def make_exporter(session: NullSession) -> SheetsExporter:
+    """認証をせずにダミーのスプレッドシートへ書き込むSheetsExporterを作る"""
+    return SheetsExporter(spreadsheet=NullSpreadsheet(session))
+
+
+def make_members(player_n: int) -> List[Dict]:
+    teams = TEAMS[player_n]
+    return [
+        {"game_name": nickname, "name": f"HN{i:02d}", f"team{player_n}": teams[i % player_n]}
+        for i, nickname in enumerate(default_nicknames())
+    ]
+
+
+def measure(func: Callable, with_memory: bool) -> Dict[str, float]:
+    """func を実行し、経過時間とピークメモリを返す"""
+    gc.collect()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if with_memory:
+        del result
+        gc.collect()
+        tracemalloc.start()
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {"seconds": elapsed, "peak_bytes": peak}
+
+
+def run_size(files: List[Path], games: int, player_n: int, with_memory: bool) -> List[Dict]:
+    """games 試合分の各段階を計測"""
+    members = make_members(player_n)
+    members_map = {member["game_name"]: member for member in members}
+    parser = PaifuParser(player_n, members_map)
+    streaming_parser = PaifuParser(player_n, members_map, stream_min_bytes=0)
+    archive = list(islice(cycle(files), games))
+    results = []
+
+    def parse():
+        return [parser.parse_round(path) for path in archive]
+
+    stats = measure(parse, with_memory)
+    results.append(dict(stats, stage="parse_round", ops=games))
+    round_data_list = parse()
+
+    def parse_streaming():
+        # 比較用: 大きさにかかわらずすべての牌譜を逐次読み込む場合
+        return [streaming_parser.parse_round(path) for path in archive]
+
+    stats = measure(parse_streaming, with_memory)
+    results.append(dict(stats, stage="parse_round (streaming)", ops=games))
+
+    def load_whole():
+        # 比較用: ストリーミング以前のように牌譜全体を json.load するだけの場合（集計はしない）
+        for path in archive:
+            with open(path, 'r', encoding='utf-8') as f:
+                json.load(f)
+
+    stats = measure(load_whole, with_memory)
+    results.append(dict(stats, stage="json_load (baseline)", ops=games))
+
+    def aggregate():
+        player_data_dict = {}
+        for round_data in round_data_list:
+            calc_player_data_by_round(round_data, player_data_dict, player_n, f"team{player_n}")
+        assign_teams(player_data_dict, members, player_n)
+        return player_data_dict
+
+    stats = measure(aggregate, with_memory)
+    results.append(dict(stats, stage="calc_player_data_by_round", ops=games))
+
+    def aggregate_vectorized():
+        player_data_dict = aggregate_players(round_data_list, player_n)
+        assign_teams(player_data_dict, members, player_n)
+        return player_data_dict
+
+    stats = measure(aggregate_vectorized, with_memory)
+    results.append(dict(stats, stage="aggregate_players", ops=games))
+    player_data_dict = aggregate_vectorized()
+
+    exports = {
+        "export_round_sheet": (games, lambda exporter: [
+            exporter.export_round_sheet(round_data, f"第{i}試合", player_n, player_data_dict)
+            for i, round_data in enumerate(round_data_list, 1)
+        ]),
+        "export_total_result_sheet": (1, lambda exporter: exporter.export_total_result_sheet(
+            round_data_list, player_data_dict, player_n)),
+        "export_player_sheet": (1, lambda exporter: exporter.export_player_sheet(player_data_dict, player_n)),
+    }
+    for stage, (ops, export) in exports.items():
+        sessions = []
+
+        def run_export():
+            session = NullSession()
+            sessions.append(session)
+            return export(make_exporter(session))
+
+        stats = measure(run_export, with_memory)
+        results.append(dict(stats, stage=stage, ops=ops,
+                            requests=sessions[0].requests, bytes_sent=sessions[0].bytes_sent))
+
+    for result in results:
+        result["games"] = games
+        result["player_n"] = player_n
+        result["ops_per_sec"] = result["ops"] / result["seconds"] if result["seconds"] else float("inf")
+    return results
+
+
+def format_bytes(value) -> str:
+    if value is None:
+        return "-"
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if value < 1024:
+            return f"{value:.1f}{unit}"
+        value /= 1024
+    return f"{value:.1f}TiB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='集計パイプラインのベンチマーク')
+    parser.add_argument('--sizes', default="10,1000,100000", help='試合数（カンマ区切り）')
+    parser.add_argument('--players', default="4,3", help='人数（カンマ区切り）')
+    parser.add_argument('--pool', type=int, default=500,
+                        help='生成する牌譜ファイルの数（これを超える試合数は繰り返して使う）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='ピークメモリを計測しない（高速）')
+    parser.add_argument('--json', type=Path, help='結果をJSONで書き出すパス')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    all_results = []
+    with tempfile.TemporaryDirectory(prefix="paifu-bench-") as tmp:
+        for player_n in [int(n) for n in args.players.split(",")]:
+            files = write_archive(Path(tmp) / str(player_n), min(args.pool, max(sizes)), player_n, args.seed)
+            for games in sizes:
+                print(f"\n{player_n}-player, {games} games")
+                print(f"  {'stage':<28}{'ops/sec':>14}{'seconds':>10}{'peak mem':>12}{'requests':>10}")
+                for result in run_size(files, games, player_n, not args.no_memory):
+                    print(f"  {result['stage']:<28}{result['ops_per_sec']:>14.1f}{result['seconds']:>10.3f}"
+                          f"{format_bytes(result['peak_bytes']):>12}{result.get('requests', ''):>10}")
+                    all_results.append(result)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(all_results, f, ensure_ascii=False, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
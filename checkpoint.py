@@ -0,0 +1,77 @@
+"""シート出力のチェックポイント（中断した出力の再開用）"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+
+class CheckpointJournal:
+    """書き込みが完了したシートと内容ハッシュを追記していくJSONLファイル
+
+    1行目は出力先のスプレッドシートIDを持つヘッダー。
+    1シートごとに書き出してfsyncするため、途中で落ちても完了済みの分は残る。
+    """
+
+    def __init__(self, path: Path, spreadsheet_id: str, resume: bool = False):
+        self.path = Path(path)
+        self.spreadsheet_id = spreadsheet_id
+        self._lock = threading.Lock()
+        self.completed: Dict[str, str] = self._load() if resume else {}
+        # 再開できる記録があったか（なければ通常の実行と同じく最初から出力する）
+        self.resumed = bool(self.completed)
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.resumed:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        else:
+            self._file = open(self.path, 'w', encoding='utf-8')
+            self._append({"spreadsheet": spreadsheet_id, "started_at": time.time()})
+
+    def _load(self) -> Dict[str, str]:
+        """記録済みのシートを読み込む（別のスプレッドシートの記録は使わない）"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return {}
+
+        try:
+            header = json.loads(lines[0]) if lines else {}
+        except ValueError:
+            header = {}
+        if header.get("spreadsheet") != self.spreadsheet_id:
+            if lines:
+                print("  Checkpoint is for another spreadsheet, starting over")
+            return {}
+
+        completed = {}
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # 書き込み途中で落ちた最後の行は無視する
+                continue
+            completed[entry["sheet"]] = entry["fingerprint"]
+        return completed
+
+    def _append(self, entry: Dict):
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def is_done(self, title: str, fingerprint: str) -> bool:
+        """同じ内容のシートが書き込み済みか"""
+        with self._lock:
+            return self.completed.get(title) == fingerprint
+
+    def record(self, title: str, fingerprint: str):
+        """シートの書き込み完了を記録"""
+        with self._lock:
+            self.completed[title] = fingerprint
+            self._append({"sheet": title, "fingerprint": fingerprint})
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -1,5 +1,6 @@
 """設定ファイル"""
 import json
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).parent
@@ -12,8 +13,51 @@ FANS_FILE = BASE_DIR / "constants" / "fans.json"
 
 PAIFU_DIR = BASE_DIR / "paifu"
 
+PARSE_CACHE_DIR = BASE_DIR / "cache" / "parse"
+PARSE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# 牌譜の目録（uuid・対局者・最終得点。一覧表示・重複除去・絞り込みに使う）
+CATALOG_FILE = BASE_DIR / "cache" / "catalog.json"
+
+# パース結果を蓄積するデータベース（役・放銃などの検索用）
+GAME_STORE_FILE = BASE_DIR / "cache" / "games.sqlite3"
+
+# 中断したシート出力を --resume で再開するための記録
+CHECKPOINT_FILE = BASE_DIR / "cache" / "export_checkpoint.jsonl"
+
+# これ以上の大きさの牌譜は逐次読み込む（小さい牌譜は json.load で一度に読む方が速い）
+PAIFU_STREAM_MIN_BYTES = 4 * 1024 * 1024
+
+PARSE_WORKERS = 1  # 0ならCPU数
+# --pipeline でパース済みのまま出力を待てる試合数
+PIPELINE_QUEUE_SIZE = 8
+
+# Sheets APIのクォータ（ユーザーごとの1分あたりのリクエスト数）
+SHEETS_READ_REQUESTS_PER_MINUTE = 60
+SHEETS_WRITE_REQUESTS_PER_MINUTE = 60
+SHEETS_MAX_RETRIES = 6
+SHEETS_BACKOFF_BASE = 1.0  # 秒
+SHEETS_BACKOFF_MAX = 64.0  # 秒
+# まとめて送信する際の1リクエストあたりのペイロード上限
+PUBLISH_MAX_PAYLOAD_BYTES = 2 * 1024 * 1024
+# Sheets API の接続先（None なら Google）
+# sheets_stub_server.py などローカルのサーバーを使う場合は http://127.0.0.1:8765 のように指定する
+SHEETS_API_ENDPOINT = os.environ.get("MAHJONG_SHEETS_ENDPOINT") or None
+# サービスアカウントのアクセストークンのキャッシュ（有効期限まで再利用する）
+TOKEN_CACHE_FILE = BASE_DIR / "cache" / "oauth_token.json"
+
+# watchモードのポーリング間隔（inotifyが使えない場合）
+WATCH_POLL_INTERVAL = 2.0  # 秒
+
+# --backend xlsx の出力先
+XLSX_OUTPUT_FILE = BASE_DIR / "output" / "result.xlsx"
+
+# 実行ごとの計測レポート（metrics.json / metrics.prom）の出力先
+METRICS_DIR = BASE_DIR / "metrics"
+
 DORA_FANS = [31, 32, 33, 34]
 RARE_FANS = [-1, 3, 4, 5, 6, 18, 19, 20, 24, 28]
+YAKUMAN_FANS = list(range(35, 51))
 ORIGIN_POINT_4 = 25000
 ORIGIN_POINT_3 = 35000
 
@@ -1,8 +1,34 @@
-"""データ構造の定義"""
-from typing import List, Dict, Optional
+"""データ構造の定義
+
+大量の牌譜をメモリに保持するため、各クラスは __slots__ を使い、
+局ごとの収支は array('i')、役は (id, val) のタプルで持つ。
+"""
+import sys
+from array import array
+from typing import List, Dict, Optional, Tuple, Iterable
 from dataclasses import dataclass, field
 
-@dataclass
+CHANG = ("東", "南", "西")
+JU = ("一", "二", "三", "四", "五", "六", "七", "八", "九", "十")
+
+# 役: (id, val)
+Fan = Tuple[int, int]
+
+_round_labels: Dict[Tuple[int, int, int], str] = {}
+
+def round_label(chang: int, ju: int, ben: int) -> str:
+    """局の表示名（同じ局名は同じ文字列オブジェクトを共有する）"""
+    key = (chang, ju, ben)
+    label = _round_labels.get(key)
+    if label is None:
+        label = _round_labels[key] = sys.intern(CHANG[chang] + JU[ju] + "局\n" + str(ben) + "本場")
+    return label
+
+def pack_fans(fans: Iterable[Dict[str, int]]) -> Tuple[Fan, ...]:
+    """牌譜JSONの役のリストを (id, val) のタプルに変換"""
+    return tuple((fan["id"], fan["val"]) for fan in fans)
+
+@dataclass(slots=True)
 class HuleSingleData:
     """和了単体のデータ"""
     seat: int
@@ -11,42 +37,34 @@ class HuleSingleData:
     dadian: int
     han: int
     fu: int
-    fans: List[Dict[str, int]]
+    fans: Tuple[Fan, ...]
 
     def get_fans_text(self, fan_names: Dict[str, str], dora_fans: List[int]) -> str:
         """役のテキストを取得"""
-        fan_list = [(fan["id"], fan["val"]) for fan in self.fans]
-        fan_list.sort()
+        fan_list = sorted(self.fans)
         return ",".join([
             fan_names[str(fan[0])] + (str(fan[1]) if fan[0] in dora_fans else "")
             for fan in fan_list
         ])
 
-@dataclass
+@dataclass(slots=True)
 class HandData:
     """局のデータ"""
     roundStr: str = ""
-    deltaMain: List[int] = field(default_factory=list)
-    deltaSub: List[int] = field(default_factory=list)
+    deltaMain: array = field(default_factory=lambda: array('i'))
+    deltaSub: array = field(default_factory=lambda: array('i'))
     huleData: List[HuleSingleData] = field(default_factory=list)
 
     def __init__(self, player_n: int, result_data_json: Optional[Dict] = None):
-        self.deltaMain = [0] * player_n
-        self.deltaSub = [0] * player_n
+        self.deltaMain = array('i', [0]) * player_n
+        self.deltaSub = array('i', [0]) * player_n
         self.huleData = []
+        self.roundStr = ""
 
         if result_data_json:
-            CHANG = ["東", "南", "西"]
-            JU = ["一", "二", "三", "四", "五", "六", "七", "八", "九", "十"]
-            self.roundStr = (
-                CHANG[result_data_json["chang"]]
-                + JU[result_data_json["ju"]]
-                + "局\n"
-                + str(result_data_json["ben"])
-                + "本場"
-            )
-
-@dataclass
+            self.roundStr = round_label(result_data_json["chang"], result_data_json["ju"], result_data_json["ben"])
+
+@dataclass(slots=True)
 class RoundData:
     """半荘のデータ"""
     uuid: str = ""
@@ -55,11 +73,12 @@ class RoundData:
     hands: List[HandData] = field(default_factory=list)
 
     def __init__(self, player_n: int):
+        self.uuid = ""
         self.names = [""] * player_n
         self.scores = [0] * player_n
         self.hands = []
 
-@dataclass
+@dataclass(slots=True)
 class PlayerHalfRoundData:
     """プレイヤーの半荘データ"""
     score: float = 0
@@ -68,15 +87,15 @@ class PlayerHalfRoundData:
     doraCount: int = 0
     rareFans: List[int] = field(default_factory=list)
 
-    def reflect_fans(self, fans: List[Dict], dora_fans: List[int], rare_fans: List[int]):
+    def reflect_fans(self, fans: Iterable[Fan], dora_fans: List[int], rare_fans: List[int]):
         """役を反映"""
-        for fan in fans:
-            if fan["id"] in dora_fans:
-                self.doraCount += fan["val"]
-            if fan["id"] in rare_fans:
-                self.rareFans.append(fan["id"])
+        for fan_id, val in fans:
+            if fan_id in dora_fans:
+                self.doraCount += val
+            if fan_id in rare_fans:
+                self.rareFans.append(fan_id)
 
-@dataclass
+@dataclass(slots=True)
 class PlayerData:
     """プレイヤーデータ"""
     team: str = ""
@@ -0,0 +1,59 @@
+"""xlsx を Drive にアップロードしてスプレッドシートを一括で置き換える出力先"""
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import metrics
+from config import SPREADSHEET_ID
+from sheets_exporter import open_spreadsheet
+from xlsx_exporter import XlsxExporter
+
+DRIVE_UPLOAD_URL = "https://www.googleapis.com/upload/drive/v3/files/{}"
+XLSX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+SHEETS_MIME_TYPE = "application/vnd.google-apps.spreadsheet"
+
+
+class DriveUploadExporter(XlsxExporter):
+    """全シートを1つのxlsxに書き出し、Drive の変換付きアップロード1回でスプレッドシートを置き換える
+
+    スプレッドシートの既存シートはすべて置き換わるため、四麻・三麻の両方を出力する場合に使う。
+    試合数によらず、APIリクエストは認証時のシート取得とアップロードの2回になる。
+    """
+
+    def __init__(self, path: Path, spreadsheet_id: str = SPREADSHEET_ID):
+        super().__init__(path)
+        self.spreadsheet_id = spreadsheet_id
+        # 認証はシートを書き出している間に済ませておく
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sheets-auth")
+        self._connection = executor.submit(open_spreadsheet)
+        executor.shutdown(wait=False)
+
+    def close(self):
+        """xlsxを保存してアップロード"""
+        super().close()
+        if not self.workbook.worksheets:
+            return
+        with metrics.run.timer("auth_wait"):
+            spreadsheet = self._connection.result()
+
+        print(f"  Uploading {self.path.name} to spreadsheet {self.spreadsheet_id}...")
+        with metrics.run.timer("publish"):
+            upload_workbook(spreadsheet.client, self.spreadsheet_id, self.path.read_bytes())
+        print(f"Published {len(self.workbook.worksheets)} sheets")
+
+
+def upload_workbook(http_client, file_id: str, data: bytes):
+    """xlsxの内容でGoogleスプレッドシートを置き換える（Drive files.update の変換付きアップロード）"""
+    boundary = uuid.uuid4().hex
+    metadata = json.dumps({"mimeType": SHEETS_MIME_TYPE})
+    body = (
+        f"--{boundary}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n{metadata}\r\n"
+        f"--{boundary}\r\nContent-Type: {XLSX_MIME_TYPE}\r\n\r\n"
+    ).encode("utf-8") + data + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return http_client.request(
+        "patch", DRIVE_UPLOAD_URL.format(file_id),
+        params={"uploadType": "multipart", "supportsAllDrives": "true"},
+        data=body,
+        headers={"Content-Type": f"multipart/related; boundary={boundary}"},
+    )
@@ -0,0 +1,26 @@
+"""--dry-run 用の出力先（Google Sheets に接続しない）"""
+from typing import Iterable
+
+from exporter import Exporter
+from sheet_format import RenderedSheet
+
+
+class DryRunExporter(Exporter):
+    """シート内容を作るだけで書き込まず、書き込む予定のシート名を表示する"""
+
+    def write_sheet(self, rendered: RenderedSheet) -> bool:
+        self._written_titles.add(rendered.title)
+        print(f"  (dry run) Would write: {rendered.title}")
+        return False
+
+    def clean_all_sheets(self, keep: Iterable[str] = ()):
+        print("  (dry run) Existing sheets would be deleted")
+
+    def clean_mahjong_sheets(self, player_n: int):
+        print(f"  (dry run) Existing {'四麻' if player_n == 4 else '三麻'} sheets would be deleted")
+
+    def clean_summary_sheets(self):
+        print("  (dry run) Existing summary sheets would be deleted")
+
+    def save_fingerprints(self):
+        print(f"  (dry run) {len(self._written_titles)} sheets would be written")
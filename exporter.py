@@ -0,0 +1,305 @@
+"""出力先の共通インターフェースとシート内容の作成
+
+シートの内容（値と書式）は RenderedSheet として共通に作り、
+Google Sheets・xlsx などの出力先は write_sheet で書き込みだけを実装する。
+"""
+import re
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Set
+
+import metrics
+from config import load_fans, DORA_FANS, ORIGIN_POINT_3, ORIGIN_POINT_4
+from data_structures import RoundData, PlayerData
+from sheet_format import SheetFormat, RenderedSheet, grid_rows
+
+
+def division_sheet_order(title: str):
+    """四麻・三麻のシートの並び順（各部門は 第N試合・総合結果・プレイヤーデータ の順、四麻が先）"""
+    division = 0 if title.startswith("【四麻】") else 1
+    match = re.fullmatch(r"【..】第(\d+)試合", title)
+    if match:
+        return division, 0, int(match.group(1))
+    return division, 1 if title.endswith("総合結果") else 2, 0
+
+
+class Exporter(ABC):
+    """集計結果の出力先
+
+    シートの削除・並べ替えなどは出力先に合わせて上書きする（既定では何もしない）。
+    """
+
+    def __init__(self, incremental: bool = False, deferred: bool = False):
+        self.fan_names = load_fans()
+        # 差分出力: 内容が変わっていないシートは書き込まない
+        self.incremental = incremental
+        # まとめて送信: write_sheet はシートを溜めるだけにし、flush で一括送信する
+        self.deferred = deferred
+        self._written_titles: Set[str] = set()
+
+    @property
+    def keeps_existing_sheets(self) -> bool:
+        """既存シートを削除せずに出力するか"""
+        return self.incremental
+
+    @property
+    def written_titles(self) -> Set[str]:
+        """この実行で出力したシート名"""
+        return self._written_titles
+
+    @abstractmethod
+    def write_sheet(self, rendered: RenderedSheet) -> bool:
+        """シート内容を書き込む（書き込まなかった場合はFalseを返す）"""
+
+    def clean_all_sheets(self, keep: Iterable[str] = ()):
+        """すべての既存シートを削除（keep 以外）"""
+
+    def clean_mahjong_sheets(self, player_n: int):
+        """指定された人数の既存シートを削除"""
+
+    def clean_summary_sheets(self):
+        """総合結果シートのみを削除"""
+
+    def remove_stale_sheets(self, player_n: int):
+        """この実行で出力しなかった指定人数のシートを削除（差分出力・再開用）"""
+
+    def flush(self):
+        """溜めたシートをまとめて書き込む"""
+
+    def sort_division_sheets(self):
+        """四麻・三麻のシートを順番通りに並べ直す"""
+
+    def save_fingerprints(self):
+        """シートの内容ハッシュを保存"""
+
+    def close(self):
+        """出力を完了する（ファイルへの保存など）"""
+
+    def export_round_sheet(self, round_data: RoundData, sheet_name: str, player_n: int, player_data_dict: Dict[str, PlayerData]):
+        """半荘のデータをシートに出力"""
+        with metrics.run.timer("render"):
+            rendered = self.render_round_sheet(round_data, sheet_name, player_n, player_data_dict)
+        self.write_sheet(rendered)
+
+    def render_round_sheet(self, round_data: RoundData, sheet_name: str, player_n: int, player_data_dict: Dict[str, PlayerData]) -> RenderedSheet:
+        """半荘のシート内容を作成"""
+        # データを準備
+        all_values = []
+
+        # 牌譜リンク
+        paifu_url = f'https://game.mahjongsoul.com/?paipu={round_data.uuid}'
+        row1 = [f'=HYPERLINK("{paifu_url}", "牌譜")'] + [''] * (player_n + 4)
+        all_values.append(row1)
+
+        # 方角行
+        directions = ["東", "南", "西", "北"][:player_n]
+        row2 = ["", "", ""] + directions + ["(供託)", "(和了詳細)"]
+        all_values.append(row2)
+
+        # 空行
+        row3 = [""] * (player_n + 5)
+        all_values.append(row3)
+
+        # HN行とプレイヤー名行
+        row4 = ["", "", "HN"] + round_data.names + ["", ""]
+        all_values.append(row4)
+
+        # 各局のデータ
+        origin_point = ORIGIN_POINT_3 if player_n == 3 else ORIGIN_POINT_4
+        scores = [origin_point] * player_n + [0]
+
+        for hand in round_data.hands:
+            # スコア表示行
+            score_row = ["", "", ""] + [scores[i] for i in range(player_n)] + [scores[player_n], ""]
+            all_values.append(score_row)
+
+            # 和了詳細テキスト作成
+            hule_text = ""
+            for hule in hand.huleData:
+                if len(hule_text) > 0:
+                    hule_text += "\n"
+                if hule.isNagashi:
+                    hule_text += f"{round_data.names[hule.seat]} 流し満貫 8000"
+                else:
+                    hule_text += f"{round_data.names[hule.seat]} "
+                    hule_text += "ツモ" if hule.rongPlayer == -1 else "ロン"
+                    hule_text += f" {hule.dadian}\n"
+                    hule_text += hule.get_fans_text(self.fan_names, DORA_FANS)
+
+            # 局情報と点数変動行（局情報をB列、C列は空）
+            delta_main_row = ["", hand.roundStr, ""] + [hand.deltaMain[i] if hand.deltaMain[i] != 0 else "" for i in range(player_n)] + ["", hule_text]
+            all_values.append(delta_main_row)
+
+            # 供託変動行
+            delta_sub_other = -sum(hand.deltaSub)
+            delta_sub_row = ["", "", ""] + [hand.deltaSub[i] if hand.deltaSub[i] != 0 else "" for i in range(player_n)] + [delta_sub_other if delta_sub_other != 0 else "", ""]
+            all_values.append(delta_sub_row)
+
+            # スコア更新
+            for i in range(player_n):
+                scores[i] += hand.deltaMain[i] + hand.deltaSub[i]
+            scores[player_n] += delta_sub_other
+
+        # 最終スコア行
+        final_score_row = ["", "", ""] + [scores[i] for i in range(player_n)] + [scores[player_n], ""]
+        all_values.append(final_score_row)
+
+        # 最終得点行（JSONのtotal_pointを1000で割った値）
+        final_points_row = ["", "", ""]
+        for i in range(player_n):
+            final_score = round_data.scores[i] / 1000
+            final_points_row.append(final_score)
+        final_points_row.extend(["", ""])
+        all_values.append(final_points_row)
+
+        # チーム色の設定
+        sheet_format = SheetFormat()
+        self._add_team_colors(sheet_format, round_data, player_data_dict, player_n)
+
+        return RenderedSheet(sheet_name, all_values, 'A1', rows=grid_rows(all_values, 'A1'), cols=26, sheet_format=sheet_format)
+
+    def export_player_sheet(self, player_data_dict: Dict[str, PlayerData], player_n: int):
+        """プレイヤーデータをシートに出力"""
+        with metrics.run.timer("render"):
+            rendered = self.render_player_sheet(player_data_dict, player_n)
+        self.write_sheet(rendered)
+
+    def render_player_sheet(self, player_data_dict: Dict[str, PlayerData], player_n: int) -> RenderedSheet:
+        """プレイヤーデータのシート内容を作成"""
+        sheet_name = f"【{'四麻' if player_n == 4 else '三麻'}】プレイヤーデータ"
+
+        # データ準備
+        all_values = []
+
+        # 空行
+        all_values.append([])
+
+        # ヘッダー
+        header = ["HN", "スコア", "最大和了", "支払合計", "ドラ合計", "レア役"]
+        all_values.append(header)
+
+        # データ
+        for name, player_data in player_data_dict.items():
+            for player_single_data in player_data.dataList:
+                rare_fans_text = ",".join([
+                    self.fan_names[str(fan_id)]
+                    for fan_id in player_single_data.rareFans
+                ])
+
+                row_data = [
+                    name,
+                    player_single_data.score,
+                    player_single_data.maxHule,
+                    player_single_data.paySum,
+                    player_single_data.doraCount,
+                    rare_fans_text,
+                ]
+                all_values.append(row_data)
+
+        return RenderedSheet(sheet_name, all_values, 'B1', rows=grid_rows(all_values, 'B1'), cols=10)
+
+    def export_total_result_sheet(self, round_data_list: List[RoundData], player_data_dict: Dict[str, PlayerData], player_n: int):
+        """総合結果をシートに出力"""
+        with metrics.run.timer("render"):
+            rendered = self.render_total_result_sheet(round_data_list, player_data_dict, player_n)
+        self.write_sheet(rendered)
+
+    def render_total_result_sheet(self, round_data_list: List[RoundData], player_data_dict: Dict[str, PlayerData], player_n: int) -> RenderedSheet:
+        """総合結果のシート内容を作成"""
+        # NumPy の読み込みは集計表を作る場合だけにする
+        from aggregation import team_score_table
+
+        sheet_name = f"【{'四麻' if player_n == 4 else '三麻'}】総合結果"
+
+        # データ準備
+        all_values = []
+
+        # 空行
+        all_values.append([])
+
+        # チーム名とマッピング
+        if player_n == 4:
+            teams = ["青チーム", "赤チーム", "白チーム", "黒チーム"]
+        else:
+            teams = ["チームA", "チームB", "チームC"]
+
+        # 空行
+        all_values.append([])
+
+        # ヘッダー（B列から開始）
+        header_row = [""] + teams[:player_n]
+        all_values.append(header_row)
+
+        # データ
+        rows, team_totals = team_score_table(round_data_list, player_data_dict, teams[:player_n])
+        for row in rows:
+            all_values.append([""] + row)  # A列は空、B列から開始
+
+        # 合計行を追加
+        total_row = ["合計"] + team_totals
+        all_values.append(total_row)
+
+        sheet_format = SheetFormat()
+
+        # ヘッダー行に色を適用
+        self._add_total_header_colors(sheet_format, player_n)
+
+        # 合計行の上に罫線を追加
+        total_row_index = len(all_values)
+        range_start = f"A{total_row_index}"
+        range_end = chr(ord('A') + player_n) + str(total_row_index)
+        sheet_format.set_top_border(f"{range_start}:{range_end}")
+
+        return RenderedSheet(sheet_name, all_values, 'A1', rows=grid_rows(all_values, 'A1'), cols=10, sheet_format=sheet_format)
+
+
+    def _add_team_colors(self, sheet_format: SheetFormat, round_data: RoundData, player_data_dict: Dict[str, PlayerData], player_n: int):
+        """チーム色を追加"""
+        # チーム色の定義
+        if player_n == 4:
+            team_colors = {
+                "青チーム": {"red": 0.788, "green": 0.855, "blue": 0.972},
+                "赤チーム": {"red": 0.957, "green": 0.8, "blue": 0.8},
+                "白チーム": {"red": 1, "green": 1, "blue": 1},
+                "黒チーム": {"red": 0.851, "green": 0.851, "blue": 0.851},
+            }
+        else:
+            team_colors = {
+                "チームA": {"red": 0.788, "green": 0.855, "blue": 0.972},
+                "チームB": {"red": 0.957, "green": 0.8, "blue": 0.8},
+                "チームC": {"red": 1, "green": 1, "blue": 1},
+            }
+
+        # プレイヤー名の背景色設定
+        for i, name in enumerate(round_data.names):
+            if name in player_data_dict:
+                team = player_data_dict[name].team
+                if team in team_colors:
+                    # プレイヤー名のセル（D4からの位置）
+                    cell = chr(ord('D') + i) + '4'
+                    sheet_format.set_background(cell, team_colors[team])
+
+                    # 方角のセル（D2からの位置）
+                    direction_cell = chr(ord('D') + i) + '2'
+                    sheet_format.set_background(direction_cell, team_colors[team])
+
+    def _add_total_header_colors(self, sheet_format: SheetFormat, player_n: int):
+        """総合結果のヘッダーにチーム色を追加"""
+        # チーム色の定義
+        if player_n == 4:
+            team_colors = [
+                {"red": 0.788, "green": 0.855, "blue": 0.972},  # 青チーム
+                {"red": 0.957, "green": 0.8, "blue": 0.8},      # 赤チーム
+                {"red": 1, "green": 1, "blue": 1},              # 白チーム
+                {"red": 0.851, "green": 0.851, "blue": 0.851},  # 黒チーム
+            ]
+        else:
+            team_colors = [
+                {"red": 0.788, "green": 0.855, "blue": 0.972},  # チームA
+                {"red": 0.957, "green": 0.8, "blue": 0.8},      # チームB
+                {"red": 1, "green": 1, "blue": 1},              # チームC
+            ]
+
+        # ヘッダー行（2行目）の各チーム列に色を適用
+        for i in range(player_n):
+            cell = chr(ord('B') + i) + '2'
+            sheet_format.set_background(cell, team_colors[i])
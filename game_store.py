@@ -0,0 +1,292 @@
+"""パース結果を蓄積するSQLiteデータベース（半荘・局・収支・和了・役）"""
+import argparse
+import datetime
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from data_structures import Fan, RoundData
+from paifu_catalog import CatalogEntry, parse_since
+
+# テーブルの形式を変えたら上げる（古い形式のデータベースは作り直す）
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    uuid TEXT NOT NULL UNIQUE,
+    player_n INTEGER NOT NULL,
+    start_time INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    parser_version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seats (
+    game_id INTEGER NOT NULL REFERENCES games(id) ON DELETE CASCADE,
+    seat INTEGER NOT NULL,
+    nickname TEXT NOT NULL,
+    name TEXT NOT NULL,
+    team TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    PRIMARY KEY (game_id, seat)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS hands (
+    id INTEGER PRIMARY KEY,
+    game_id INTEGER NOT NULL REFERENCES games(id) ON DELETE CASCADE,
+    hand_index INTEGER NOT NULL,
+    label TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deltas (
+    hand_id INTEGER NOT NULL REFERENCES hands(id) ON DELETE CASCADE,
+    seat INTEGER NOT NULL,
+    main INTEGER NOT NULL,
+    sub INTEGER NOT NULL,
+    PRIMARY KEY (hand_id, seat)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS hules (
+    id INTEGER PRIMARY KEY,
+    hand_id INTEGER NOT NULL REFERENCES hands(id) ON DELETE CASCADE,
+    seat INTEGER NOT NULL,
+    is_nagashi INTEGER NOT NULL,
+    rong_seat INTEGER NOT NULL,  -- ツモ・流し満貫は -1
+    dadian INTEGER NOT NULL,
+    han INTEGER NOT NULL,
+    fu INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fans (
+    hule_id INTEGER NOT NULL REFERENCES hules(id) ON DELETE CASCADE,
+    fan_id INTEGER NOT NULL,
+    val INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_games_start_time ON games(start_time);
+CREATE INDEX IF NOT EXISTS idx_seats_name ON seats(name);
+CREATE INDEX IF NOT EXISTS idx_seats_nickname ON seats(nickname);
+CREATE INDEX IF NOT EXISTS idx_seats_team ON seats(team);
+CREATE INDEX IF NOT EXISTS idx_hands_game ON hands(game_id);
+CREATE INDEX IF NOT EXISTS idx_hules_hand ON hules(hand_id);
+CREATE INDEX IF NOT EXISTS idx_fans_fan_id ON fans(fan_id);
+CREATE INDEX IF NOT EXISTS idx_fans_hule ON fans(hule_id);
+"""
+
+TABLES = ("fans", "hules", "deltas", "hands", "seats", "games")
+
+# 和了1件分の列（winner・loser は和了者と放銃者の席）
+HULE_QUERY = """
+SELECT g.uuid, g.start_time, h.label, winner.name, loser.name,
+       u.dadian, u.han, u.fu, u.is_nagashi,
+       (SELECT group_concat(f.fan_id || ':' || f.val) FROM fans f WHERE f.hule_id = u.id)
+FROM hules u
+JOIN hands h ON h.id = u.hand_id
+JOIN games g ON g.id = h.game_id
+JOIN seats winner ON winner.game_id = g.id AND winner.seat = u.seat
+LEFT JOIN seats loser ON loser.game_id = g.id AND loser.seat = u.rong_seat
+"""
+
+
+@dataclass
+class StoredHule:
+    """データベースから読んだ和了"""
+    uuid: str
+    start_time: int
+    round_label: str
+    winner: str
+    loser: Optional[str]  # ツモ・流し満貫は None
+    dadian: int
+    han: int
+    fu: int
+    is_nagashi: bool
+    fans: Tuple[Fan, ...]
+
+    @classmethod
+    def from_row(cls, row) -> "StoredHule":
+        uuid, start_time, label, winner, loser, dadian, han, fu, is_nagashi, fans = row
+        packed = tuple(
+            (int(fan_id), int(val))
+            for fan_id, val in (fan.split(":") for fan in fans.split(","))
+        ) if fans else ()
+        return cls(uuid, start_time, label, winner, loser, dadian, han, fu, bool(is_nagashi), packed)
+
+
+class GameStore:
+    """半荘ごとのパース結果をSQLiteに保存し、プレイヤー・チーム・役・日付で検索する
+
+    半荘は uuid で識別し、保存済みの半荘は局のデータを入れ直さない（名前とチームだけ更新する）。
+    ただし別のバージョンのパーサーで保存した半荘は、局のデータごと入れ直す。
+    1回の保存は1トランザクションで、行は executemany でまとめて挿入する。
+    """
+
+    def __init__(self, path: Path, parser_version: int):
+        self.path = Path(path)
+        self.parser_version = parser_version
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 四麻・三麻を並行して保存するため、接続はロックで守って共有する
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._migrate()
+
+    def _migrate(self):
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            if version:
+                print("  Game store schema changed, rebuilding")
+            with self._conn:
+                for table in TABLES:
+                    self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def add_games(self, player_n: int, games: Sequence[Tuple[CatalogEntry, RoundData]],
+                  members_map: Dict[str, Dict]) -> int:
+        """半荘を保存し、新しく追加した数と入れ直した数を返す"""
+        team_field = f"team{player_n}"
+        with self._lock, self._conn:
+            stored = {}
+            outdated = []
+            for uuid, (game_id, parser_version) in self._stored_ids([entry.uuid for entry, _ in games]).items():
+                if parser_version == self.parser_version:
+                    stored[uuid] = game_id
+                else:
+                    outdated.append(game_id)
+            # 局・収支・和了・役・席は外部キーでまとめて消える
+            self._conn.executemany("DELETE FROM games WHERE id = ?", [(game_id,) for game_id in outdated])
+            next_game, next_hand, next_hule = (
+                self._conn.execute(f"SELECT coalesce(max(id), 0) + 1 FROM {table}").fetchone()[0]
+                for table in ("games", "hands", "hules")
+            )
+
+            game_rows, seat_rows, hand_rows, delta_rows, hule_rows, fan_rows = [], [], [], [], [], []
+            seat_updates = []
+            for entry, round_data in games:
+                members = [members_map.get(nickname, {}) for nickname in entry.nicknames]
+                if entry.uuid in stored:
+                    # メンバー情報の変更だけを反映する
+                    game_id = stored[entry.uuid]
+                    seat_updates.extend(
+                        (round_data.names[seat], member.get(team_field, ""), game_id, seat)
+                        for seat, member in enumerate(members)
+                    )
+                    continue
+
+                game_id = next_game
+                next_game += 1
+                stored[entry.uuid] = game_id
+                game_rows.append((game_id, entry.uuid, player_n, entry.start_time, entry.path, self.parser_version))
+                seat_rows.extend(
+                    (game_id, seat, entry.nicknames[seat], round_data.names[seat],
+                     member.get(team_field, ""), round_data.scores[seat])
+                    for seat, member in enumerate(members)
+                )
+                for hand_index, hand in enumerate(round_data.hands):
+                    hand_id = next_hand
+                    next_hand += 1
+                    hand_rows.append((hand_id, game_id, hand_index, hand.roundStr))
+                    delta_rows.extend(
+                        (hand_id, seat, hand.deltaMain[seat], hand.deltaSub[seat])
+                        for seat in range(player_n)
+                    )
+                    for hule in hand.huleData:
+                        hule_id = next_hule
+                        next_hule += 1
+                        hule_rows.append((hule_id, hand_id, hule.seat, hule.isNagashi, hule.rongPlayer,
+                                          hule.dadian, hule.han, hule.fu))
+                        fan_rows.extend((hule_id, fan_id, val) for fan_id, val in hule.fans)
+
+            self._conn.executemany("INSERT INTO games VALUES (?, ?, ?, ?, ?, ?)", game_rows)
+            self._conn.executemany("INSERT INTO seats VALUES (?, ?, ?, ?, ?, ?)", seat_rows)
+            self._conn.executemany("INSERT INTO hands VALUES (?, ?, ?, ?)", hand_rows)
+            self._conn.executemany("INSERT INTO deltas VALUES (?, ?, ?, ?)", delta_rows)
+            self._conn.executemany("INSERT INTO hules VALUES (?, ?, ?, ?, ?, ?, ?, ?)", hule_rows)
+            self._conn.executemany("INSERT INTO fans VALUES (?, ?, ?)", fan_rows)
+            self._conn.executemany("UPDATE seats SET name = ?, team = ? WHERE game_id = ? AND seat = ?", seat_updates)
+        return len(game_rows) - len(outdated), len(outdated)
+
+    def _stored_ids(self, uuids: List[str]) -> Dict[str, Tuple[int, int]]:
+        """保存済みの uuid -> (games.id, 保存したパーサーのバージョン)"""
+        stored = {}
+        # SQLiteの変数の上限を超えないよう分けて問い合わせる
+        for i in range(0, len(uuids), 500):
+            chunk = uuids[i:i + 500]
+            rows = self._conn.execute(
+                f"SELECT uuid, id, parser_version FROM games WHERE uuid IN ({','.join('?' * len(chunk))})", chunk
+            )
+            stored.update((uuid, (game_id, parser_version)) for uuid, game_id, parser_version in rows)
+        return stored
+
+    def hules(self, fan_ids: Optional[Iterable[int]] = None, player: Optional[str] = None,
+              team: Optional[str] = None, since: Optional[int] = None) -> List[StoredHule]:
+        """条件に合う和了（fan_ids はいずれかの役を含むもの、player・team は和了者）"""
+        where, params = [], []
+        if fan_ids is not None:
+            fan_ids = list(fan_ids)
+            where.append(f"u.id IN (SELECT hule_id FROM fans WHERE fan_id IN ({','.join('?' * len(fan_ids))}))")
+            params.extend(fan_ids)
+        if player is not None:
+            where.append("(winner.name = ? OR winner.nickname = ?)")
+            params.extend((player, player))
+        if team is not None:
+            where.append("winner.team = ?")
+            params.append(team)
+        return self._query_hules(where, params, since)
+
+    def deal_ins(self, player: str, since: Optional[int] = None) -> List[StoredHule]:
+        """player（HNかゲーム内の名前）が放銃した和了"""
+        return self._query_hules(["(loser.name = ? OR loser.nickname = ?)"], [player, player], since)
+
+    def _query_hules(self, where: List[str], params: List, since: Optional[int]) -> List[StoredHule]:
+        if since is not None:
+            where.append("g.start_time >= ?")
+            params.append(since)
+        sql = HULE_QUERY + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY g.start_time, h.id, u.id"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [StoredHule.from_row(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main():
+    from config import GAME_STORE_FILE, YAKUMAN_FANS, DORA_FANS, load_fans
+    from parser import PARSER_VERSION
+
+    parser = argparse.ArgumentParser(description='保存済みの和了の検索')
+    parser.add_argument('query', choices=['yakuman', 'fan', 'deal-ins'],
+                        help='yakuman=役満, fan=--fan の役, deal-ins=--player の放銃')
+    parser.add_argument('--fan', type=int, action='append', default=[], help='役ID（複数指定可）')
+    parser.add_argument('--player', help='HNかゲーム内の名前')
+    parser.add_argument('--team', help='和了者のチーム')
+    parser.add_argument('--since', type=parse_since, help='この日時（YYYY-MM-DD または ISO 8601）以降の半荘')
+    parser.add_argument('--db', type=Path, default=GAME_STORE_FILE)
+    args = parser.parse_args()
+    if args.query == 'fan' and not args.fan:
+        parser.error("fan には --fan が必要です")
+    if args.query == 'deal-ins' and not args.player:
+        parser.error("deal-ins には --player が必要です")
+
+    store = GameStore(args.db, PARSER_VERSION)
+    if args.query == 'deal-ins':
+        hules = store.deal_ins(args.player, since=args.since)
+    else:
+        fan_ids = YAKUMAN_FANS if args.query == 'yakuman' else args.fan
+        hules = store.hules(fan_ids, player=args.player, team=args.team, since=args.since)
+    store.close()
+
+    fan_names = load_fans()
+    for hule in hules:
+        start = datetime.datetime.fromtimestamp(hule.start_time).strftime("%Y-%m-%d %H:%M")
+        loser = f" <- {hule.loser}" if hule.loser else ""
+        fans = ",".join(
+            fan_names.get(str(fan_id), str(fan_id)) + (str(val) if fan_id in DORA_FANS else "")
+            for fan_id, val in sorted(hule.fans)
+        )
+        print(f"{start}  {hule.round_label.replace(chr(10), ' ')}  {hule.winner}{loser}  {hule.dadian}  {fans}")
+    print(f"{len(hules)} hules")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,37 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import argparse
+import bisect
+import datetime
 import glob
+import io
+import multiprocessing
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List
-from icecream import ic
-import time
+from typing import Dict, List, Optional
 
+import metrics
 from config import (
     load_members, load_fans, PAIFU_DIR,
-    DORA_FANS, RARE_FANS
+    DORA_FANS, RARE_FANS,
+    PARSE_CACHE_DIR, PARSE_CACHE_MAX_BYTES, PARSE_WORKERS, METRICS_DIR,
+    WATCH_POLL_INTERVAL, PIPELINE_QUEUE_SIZE, CHECKPOINT_FILE, SPREADSHEET_ID, XLSX_OUTPUT_FILE,
+    CATALOG_FILE, GAME_STORE_FILE
 )
 from data_structures import (
     PlayerData, PlayerHalfRoundData, RoundData
 )
-from parser import PaifuParser
-from sheets_exporter import SheetsExporter
+from parser import PaifuParser, PARSER_VERSION
+from parse_cache import ParseCache
+from paifu_catalog import PaifuCatalog, CatalogEntry, GameFilter, dedup_by_uuid, parse_since
+from paifu_archive import ArchiveGame, find_archives, iter_archive_members, read_member_head
+from game_store import GameStore
+from checkpoint import CheckpointJournal
 
 def create_members_map(members):
     members_map = {}
@@ -44,164 +60,769 @@ def calc_player_data_by_round(round_data, player_data_dict, player_n, team_field
             player_data_dict[name] = PlayerData()
         player_data_dict[name].dataList.append(records[i])
 
-def process_files(player_n, members_map):
-    parser = PaifuParser(player_n, members_map)
+def assign_teams(player_data_dict, members, player_n):
+    """メンバー情報からチームを設定"""
+    team_field = f"team{player_n}"
+    for name, player_data in player_data_dict.items():
+        for member in members:
+            if member.get('name') == name:
+                player_data.team = member.get(team_field, '')
+                break
+
+@dataclass
+class ParseOptions:
+    """牌譜パースの設定"""
+    cache: Optional[ParseCache] = None
+    workers: int = 1
+    pipeline: bool = False  # パースと出力を並行して行う
+    catalog: Optional[PaifuCatalog] = None  # あれば重複を除き、game_filter で絞り込む
+    game_filter: GameFilter = field(default_factory=GameFilter)
+    # 人数ごとのアーカイブ内の半荘（ingest_archives で読み込む）
+    archive_games: Dict[int, List[ArchiveGame]] = field(default_factory=dict)
+    store: Optional[GameStore] = None  # あればパース結果を保存する
+
+    def archive_index(self, player_n):
+        """アーカイブ内のファイル -> 半荘"""
+        return {game.member: game for game in self.archive_games.get(player_n, [])}
+
+_worker_parser = None
+_worker_parsers = {}
+
+def _init_parse_worker(player_n, members_map):
+    """ワーカープロセスごとにパーサーを用意"""
+    global _worker_parser
+    _worker_parser = PaifuParser(player_n, members_map)
+
+def _parse_in_worker(json_file):
+    """パース結果と、このファイル分の計測値を返す"""
+    metrics.run.reset()
+    return _worker_parser.parse_round(json_file), metrics.run.snapshot()
+
+def _init_archive_worker(members_map):
+    """アーカイブ用のワーカーは四麻・三麻の両方のパーサーを持つ"""
+    global _worker_parsers
+    _worker_parsers = {player_n: PaifuParser(player_n, members_map) for player_n in (4, 3)}
+
+def _parse_archive_member_in_worker(player_n, member, data):
+    metrics.run.reset()
+    return _worker_parsers[player_n].parse_round(member, stream=io.BytesIO(data)), metrics.run.snapshot()
+
+def _process_pool(workers, initializer, initargs):
+    """パース用のプロセスプール
+
+    パースは部門ごとのスレッドからも始まるため、ロックを持ったまま複製されうる fork ではなく
+    forkserver（使えなければ spawn）でワーカーを起動する。
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method),
+                               initializer=initializer, initargs=initargs)
+
+def ingest_archives(archives, members_map, options, heads_only=False, divisions=(4, 3)):
+    """zip / tar.gz 内の牌譜を展開せずに1つずつパースし、headの人数で四麻・三麻に振り分ける
+
+    head を見て、divisions 以外の人数・絞り込み条件に合わない半荘・
+    すでにある牌譜（部門のディレクトリのファイルか先に読んだメンバー）と同じ uuid の半荘は
+    パースせずに除く。heads_only なら目録だけを作り、局のデータはパースしない。
+    """
+    games = {4: [], 3: []}
+    # ディレクトリのファイルと重複する半荘はディレクトリのファイルを使う
+    seen_paths = {}  # uuid -> 先に見つかった牌譜
+    if options.catalog is not None:
+        for player_n in divisions:
+            with metrics.run.timer("catalog"):
+                entries = options.catalog.scan(PAIFU_DIR / str(player_n))
+            seen_paths.update((entry.uuid, entry.path) for entry in entries if entry.player_n == player_n)
+    parsers = {player_n: PaifuParser(player_n, members_map) for player_n in games}
+    executor = None
+    if options.workers > 1 and not heads_only:
+        executor = _process_pool(options.workers, _init_archive_worker, (members_map,))
+    window = deque()
+
+    def resolve(game, key, future):
+        game.round_data, worker_metrics = future.result()
+        metrics.run.merge(worker_metrics)
+        if options.cache is not None:
+            options.cache.put(key, game.round_data)
+
+    try:
+        for archive in archives:
+            print(f"Reading archive {archive.name}...")
+            for member, data in iter_archive_members(archive):
+                metrics.trace("processing", str(member))
+                try:
+                    head = read_member_head(member, data)
+                    player_n = len(head["accounts"])
+                    entry = CatalogEntry.from_head(str(member), len(data), 0, head)
+                except (ValueError, KeyError, TypeError, IndexError) as e:
+                    print(f"Warning: Could not read head of {member}: {e}")
+                    continue
+                if player_n not in games:
+                    print(f"Warning: {member} is a {player_n}-player game, skipped")
+                    continue
+                if player_n not in divisions:
+                    continue
+                if entry.uuid in seen_paths:
+                    print(f"  Duplicate of {seen_paths[entry.uuid]}, skipped: {member}")
+                    continue
+                seen_paths[entry.uuid] = str(member)
+                if options.game_filter and not options.game_filter.matches(entry, members_map):
+                    continue
+                game = ArchiveGame(member, entry)
+                games[player_n].append(game)
+                if heads_only:
+                    continue
+
+                key = None
+                if options.cache is not None:
+                    key = options.cache.key_for_bytes(data, player_n)
+                    game.round_data = options.cache.get(key)
+                if game.round_data is not None:
+                    continue
+                if executor is None:
+                    game.round_data = parsers[player_n].parse_round(member, stream=io.BytesIO(data))
+                    if options.cache is not None:
+                        options.cache.put(key, game.round_data)
+                else:
+                    # 展開済みのデータを持つのはワーカー数の2倍までにする
+                    window.append((game, key, executor.submit(_parse_archive_member_in_worker, player_n, member, data)))
+                    if len(window) > options.workers * 2:
+                        resolve(*window.popleft())
+        while window:
+            resolve(*window.popleft())
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    for player_n, division_games in games.items():
+        if division_games:
+            print(f"  {len(division_games)} {player_n}-player games in archives")
+    return games
+
+def iter_parse_files(json_files, player_n, members_map, options):
+    """牌譜ファイルを順にパースし、ファイル順にRoundDataを返す
+
+    ワーカーを使う場合も先読みはワーカー数の2倍までに抑える。
+    """
+    def resolve(key, round_data, future):
+        if future is not None:
+            round_data, worker_metrics = future.result()
+            metrics.run.merge(worker_metrics)
+        if options.cache is not None and future is not None:
+            options.cache.put(key, round_data)
+        return round_data
+
+    archive_games = options.archive_index(player_n)
+
+    def lookup(json_file):
+        metrics.trace("processing", str(json_file))
+        if json_file in archive_games:
+            return None, archive_games[json_file].round_data
+        if options.cache is not None:
+            return options.cache.load(json_file, player_n)
+        return None, None
+
+    if options.workers > 1 and len(json_files) > 1:
+        workers = min(options.workers, len(json_files))
+        with _process_pool(workers, _init_parse_worker, (player_n, members_map)) as executor:
+            window = deque()
+            for json_file in json_files:
+                key, round_data = lookup(json_file)
+                future = executor.submit(_parse_in_worker, json_file) if round_data is None else None
+                window.append((key, round_data, future))
+                if len(window) > workers * 2:
+                    yield resolve(*window.popleft())
+            while window:
+                yield resolve(*window.popleft())
+    else:
+        parser = PaifuParser(player_n, members_map)
+        for json_file in json_files:
+            key, round_data = lookup(json_file)
+            if round_data is None:
+                round_data = parser.parse_round(json_file)
+                if options.cache is not None:
+                    options.cache.put(key, round_data)
+            yield round_data
+
+def parse_files(json_files, player_n, members_map, options):
+    """牌譜ファイルをパースし、ファイル順のRoundDataのリストを返す"""
+    return list(iter_parse_files(json_files, player_n, members_map, options))
+
+_PIPELINE_END = object()
+
+def iter_parse_files_in_background(json_files, player_n, members_map, options, queue_size=PIPELINE_QUEUE_SIZE):
+    """別スレッドでパースし、ファイル順にRoundDataを返す（先読みは queue_size 件まで）"""
+    parsed = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(item):
+        # 受け取り側が途中で止まった場合に待ち続けないようにする
+        while not stop.is_set():
+            try:
+                parsed.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for round_data in iter_parse_files(json_files, player_n, members_map, options):
+                if not put(round_data):
+                    return
+            put(_PIPELINE_END)
+        except BaseException as e:
+            put(e)
+
+    def consume():
+        try:
+            while True:
+                item = parsed.get()
+                if item is _PIPELINE_END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            producer.join()
+
+    # 最初の1件を取り出す前からパースを始める
+    producer = threading.Thread(target=produce, name=f"parse-{player_n}p", daemon=True)
+    producer.start()
+    return consume()
+
+def select_catalog_entries(player_n, members_map, options):
+    """部門の牌譜の目録を更新し、重複を除いて条件に合うものを返す"""
+    paifu_dir = PAIFU_DIR / str(player_n)
+    with metrics.run.timer("catalog"):
+        entries = options.catalog.scan(paifu_dir)
+    # アーカイブ内の半荘もファイル名順に並べる（同名ならディレクトリのファイルを先にする）
+    archive_paths = {str(game.member) for game in options.archive_games.get(player_n, [])}
+    entries += [game.entry for game in options.archive_games.get(player_n, [])]
+    entries.sort(key=lambda entry: (Path(entry.path).name, entry.path in archive_paths, entry.path))
+
+    selected = []
+    for entry in entries:
+        if entry.player_n != player_n:
+            print(f"Warning: {Path(entry.path).name} is a {entry.player_n}-player game, skipped")
+            continue
+        selected.append(entry)
+    selected = dedup_by_uuid(selected)
+    if options.game_filter:
+        selected = [entry for entry in selected if options.game_filter.matches(entry, members_map)]
+        print(f"{player_n}-player: {len(selected)} games match the filter")
+    return selected
+
+def select_paifu_files(player_n, members_map, options):
+    """処理する牌譜ファイルとアーカイブ内のファイル（目録がなければすべて）"""
+    json_files = sorted((PAIFU_DIR / str(player_n)).glob("*.json"))
+    if options is None:
+        return json_files
+    archive_games = options.archive_index(player_n)
+    if options.catalog is None:
+        return sorted(json_files + list(archive_games), key=lambda json_file: (json_file.name, str(json_file)))
+    archive_members = {str(member): member for member in archive_games}
+    return [
+        archive_members.get(entry.path) or Path(entry.path)
+        for entry in select_catalog_entries(player_n, members_map, options)
+    ]
+
+def store_games(json_files, round_data_list, player_n, members_map, options):
+    """パース結果をデータベースに保存（目録にない牌譜は保存しない）"""
+    if options is None or options.store is None:
+        return
+    archive_games = options.archive_index(player_n)
+    games = []
+    for json_file, round_data in zip(json_files, round_data_list):
+        if json_file in archive_games:
+            entry = archive_games[json_file].entry
+        else:
+            entry = options.catalog.get(str(json_file)) if options.catalog is not None else None
+        if entry is not None:
+            games.append((entry, round_data))
+    with metrics.run.timer("store"):
+        added, refreshed = options.store.add_games(player_n, games, members_map)
+    if added:
+        print(f"  {added} new {player_n}-player games stored")
+    if refreshed:
+        print(f"  {refreshed} {player_n}-player games stored again (parser updated)")
+
+def export_games_pipelined(exporter, player_n, members_map, parse_options):
+    """パースしながら試合シートを出力し、最後に総合結果とプレイヤーデータを出力"""
+    label = '四麻' if player_n == 4 else '三麻'
+    paifu_dir = PAIFU_DIR / str(player_n)
+    json_files = select_paifu_files(player_n, members_map, parse_options)
+    stream = iter_parse_files_in_background(json_files, player_n, members_map, parse_options)
+    clean_division_sheets(exporter, player_n)
+    if not json_files:
+        print(f"No JSON files found in {paifu_dir}")
+        return
+
+    members = load_members()
+    team_field = f"team{player_n}"
     round_data_list = []
     player_data_dict = {}
+    for i, round_data in enumerate(stream, 1):
+        round_data_list.append(round_data)
+        with metrics.run.timer("aggregate"):
+            calc_player_data_by_round(round_data, player_data_dict, player_n, team_field)
+            assign_teams({name: player_data_dict[name] for name in round_data.names}, members, player_n)
+
+        sheet_name = f"【{label}】第{i}試合"
+        print(f"  Exporting {sheet_name}...")
+        exporter.export_round_sheet(round_data, sheet_name, player_n, player_data_dict)
+
+    print(f"{player_n}-player: {len(round_data_list)} games processed")
+    store_games(json_files, round_data_list, player_n, members_map, parse_options)
+
+    print(f"  Exporting total results ({player_n}-player)...")
+    exporter.export_total_result_sheet(round_data_list, player_data_dict, player_n)
+
+    print(f"  Exporting player data ({player_n}-player)...")
+    exporter.export_player_sheet(player_data_dict, player_n)
+
+def clean_division_sheets(exporter, player_n):
+    """指定人数の既存シートを削除（差分出力・再開時は残す）"""
+    if not exporter.keeps_existing_sheets:
+        print(f"\nCleaning existing {player_n}-player sheets...")
+        exporter.clean_mahjong_sheets(player_n)
+
+def process_files(player_n, members_map, options=None):
+    # NumPy の読み込みは集計する場合だけにする
+    from aggregation import aggregate_players
+
+    if options is None:
+        options = ParseOptions()
 
     paifu_dir = PAIFU_DIR / str(player_n)
-    json_files = sorted(paifu_dir.glob("*.json"))
+    json_files = select_paifu_files(player_n, members_map, options)
 
     if not json_files:
         print(f"No JSON files found in {paifu_dir}")
         return [], {}
 
-    for json_file in json_files:
-        ic(f"Processing: {json_file}")
-        round_data = parser.parse_round(json_file)
-        round_data_list.append(round_data)
+    round_data_list = parse_files(json_files, player_n, members_map, options)
+    store_games(json_files, round_data_list, player_n, members_map, options)
 
-        team_field = f"team{player_n}"
-        calc_player_data_by_round(round_data, player_data_dict, player_n, team_field)
+    with metrics.run.timer("aggregate"):
+        player_data_dict = aggregate_players(round_data_list, player_n)
+        assign_teams(player_data_dict, load_members(), player_n)
 
-    members = load_members()
-    for name, player_data in player_data_dict.items():
-        for member in members:
-            if member.get('name') == name:
-                team_field = f"team{player_n}"
-                player_data.team = member.get(team_field, '')
-                break
+    return round_data_list, player_data_dict
+
+def process_heads(player_n, members_map, options=None):
+    """headだけを読み、総合結果に必要な名前・最終得点とチームを集める（目録があればファイルは読まない）"""
+    paifu_dir = PAIFU_DIR / str(player_n)
+    parser = PaifuParser(player_n, members_map)
+    if options is not None and options.catalog is not None:
+        entries = select_catalog_entries(player_n, members_map, options)
+        round_data_list = [parser.parse_catalog_entry(entry) for entry in entries]
+    else:
+        json_files = select_paifu_files(player_n, members_map, options)
+        archive_games = options.archive_index(player_n) if options is not None else {}
+        with metrics.run.timer("parse_head"):
+            round_data_list = [
+                parser.parse_catalog_entry(archive_games[json_file].entry) if json_file in archive_games
+                else parser.parse_head(json_file)
+                for json_file in json_files
+            ]
+
+    if not round_data_list:
+        print(f"No JSON files found in {paifu_dir}")
+        return [], {}
+
+    from aggregation import aggregate_players
+
+    with metrics.run.timer("aggregate"):
+        player_data_dict = aggregate_players(round_data_list, player_n)
+        assign_teams(player_data_dict, load_members(), player_n)
 
     return round_data_list, player_data_dict
 
-def process_4player_games(exporter, members_map):
+def process_4player_games(exporter, members_map, parse_options=None):
     """四麻の処理"""
-    print("\nCleaning existing 4-player sheets...")
-    exporter.clean_mahjong_sheets(4)
-
     print("\nProcessing 4-player games...")
-    round_data_list_4, player_data_dict_4 = process_files(4, members_map)
-    if round_data_list_4:
-        print(f"4-player: {len(round_data_list_4)} games processed")
+    if parse_options is not None and parse_options.pipeline:
+        export_games_pipelined(exporter, 4, members_map, parse_options)
+    else:
+        round_data_list_4, player_data_dict_4 = process_files(4, members_map, parse_options)
+        # 認証はパースと並行して進め、シートに触るのはパースの後にする
+        clean_division_sheets(exporter, 4)
+        if round_data_list_4:
+            print(f"4-player: {len(round_data_list_4)} games processed")
 
-        for i, round_data in enumerate(round_data_list_4, 1):
-            sheet_name = f"【四麻】第{i}試合"
-            print(f"  Exporting {sheet_name}...")
-            exporter.export_round_sheet(round_data, sheet_name, 4, player_data_dict_4)
-            time.sleep(20)  # API制限対策
+            for i, round_data in enumerate(round_data_list_4, 1):
+                sheet_name = f"【四麻】第{i}試合"
+                print(f"  Exporting {sheet_name}...")
+                exporter.export_round_sheet(round_data, sheet_name, 4, player_data_dict_4)
 
-        time.sleep(20)
-        if round_data_list_4:
-            print("  Exporting total results (4-player)...")
-            exporter.export_total_result_sheet(round_data_list_4, player_data_dict_4, 4)
-            time.sleep(20)  # API制限対策
+            if round_data_list_4:
+                print("  Exporting total results (4-player)...")
+                exporter.export_total_result_sheet(round_data_list_4, player_data_dict_4, 4)
 
-            print("  Exporting player data (4-player)...")
-            exporter.export_player_sheet(player_data_dict_4, 4)
-            time.sleep(20)  # API制限対策
+                print("  Exporting player data (4-player)...")
+                exporter.export_player_sheet(player_data_dict_4, 4)
+
+    # 既存シートを残した場合（差分出力・再開）は、今回出力しなかったシートだけを削除する
+    if exporter.keeps_existing_sheets:
+        exporter.remove_stale_sheets(4)
 
     print("\n4-player processing complete!")
 
-def process_3player_games(exporter, members_map):
+def process_3player_games(exporter, members_map, parse_options=None):
     """三麻の処理"""
-    print("\nCleaning existing 3-player sheets...")
-    exporter.clean_mahjong_sheets(3)
-
     print("\nProcessing 3-player games...")
-    round_data_list_3, player_data_dict_3 = process_files(3, members_map)
-    if round_data_list_3:
-        print(f"3-player: {len(round_data_list_3)} games processed")
-
-        for i, round_data in enumerate(round_data_list_3, 1):
-            sheet_name = f"【三麻】第{i}試合"
-            print(f"  Exporting {sheet_name}...")
-            exporter.export_round_sheet(round_data, sheet_name, 3, player_data_dict_3)
-            time.sleep(20)  # API制限対策
-
+    if parse_options is not None and parse_options.pipeline:
+        export_games_pipelined(exporter, 3, members_map, parse_options)
+    else:
+        round_data_list_3, player_data_dict_3 = process_files(3, members_map, parse_options)
+        # 認証はパースと並行して進め、シートに触るのはパースの後にする
+        clean_division_sheets(exporter, 3)
         if round_data_list_3:
-            print("  Exporting total results (3-player)...")
-            exporter.export_total_result_sheet(round_data_list_3, player_data_dict_3, 3)
-            time.sleep(20)  # API制限対策
+            print(f"3-player: {len(round_data_list_3)} games processed")
 
-            print("  Exporting player data (3-player)...")
-            exporter.export_player_sheet(player_data_dict_3, 3)
-            time.sleep(20)  # API制限対策
+            for i, round_data in enumerate(round_data_list_3, 1):
+                sheet_name = f"【三麻】第{i}試合"
+                print(f"  Exporting {sheet_name}...")
+                exporter.export_round_sheet(round_data, sheet_name, 3, player_data_dict_3)
 
-    print("\n3-player processing complete!")
+            if round_data_list_3:
+                print("  Exporting total results (3-player)...")
+                exporter.export_total_result_sheet(round_data_list_3, player_data_dict_3, 3)
 
-def process_summary_only(exporter, members_map):
-    """総合結果のみを処理"""
-    print("\nCleaning existing summary sheets...")
-    # 総合結果シートのみを削除
-    try:
-        worksheets = exporter.spreadsheet.worksheets()
-        patterns_to_delete = ["総合結果"]
+                print("  Exporting player data (3-player)...")
+                exporter.export_player_sheet(player_data_dict_3, 3)
 
-        for ws in worksheets:
-            if any(pattern in ws.title for pattern in patterns_to_delete):
-                try:
-                    exporter.spreadsheet.del_worksheet(ws)
-                    print(f"  Deleted sheet: {ws.title}")
-                except Exception as e:
-                    print(f"  Could not delete sheet {ws.title}: {e}")
-                time.sleep(0.5)
-    except Exception as e:
-        print(f"Warning: Could not clean summary sheets: {e}")
+    # 既存シートを残した場合（差分出力・再開）は、今回出力しなかったシートだけを削除する
+    if exporter.keeps_existing_sheets:
+        exporter.remove_stale_sheets(3)
+
+    print("\n3-player processing complete!")
 
+def process_all_games(exporter, members_map, parse_options=None):
+    """四麻と三麻を並行して処理
+
+    リクエストはすべて共有のレートリミッターを通るため、合計でもクォータを超えない。
+    """
+    if parse_options is not None and parse_options.catalog is not None:
+        # 目録の更新は並行させず先に済ませる（各部門では変わっていないことの確認だけになる）
+        for player_n in (4, 3):
+            parse_options.catalog.scan(PAIFU_DIR / str(player_n))
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="division") as executor:
+        futures = [
+            executor.submit(process_games, exporter, members_map, parse_options)
+            for process_games in (process_4player_games, process_3player_games)
+        ]
+        for future in futures:
+            future.result()
+
+def process_summary_only(exporter, members_map, parse_options=None):
+    """総合結果のみを処理（牌譜はheadだけを読む）"""
     print("\nProcessing summary data only...")
+    round_data_list_4, player_data_dict_4 = process_heads(4, members_map, parse_options)
+    round_data_list_3, player_data_dict_3 = process_heads(3, members_map, parse_options)
+
+    if not exporter.keeps_existing_sheets:
+        print("\nCleaning existing summary sheets...")
+        exporter.clean_summary_sheets()
 
     # 四麻の処理
-    round_data_list_4, player_data_dict_4 = process_files(4, members_map)
     if round_data_list_4:
         print(f"4-player: {len(round_data_list_4)} games processed")
         print("  Exporting total results (4-player)...")
         exporter.export_total_result_sheet(round_data_list_4, player_data_dict_4, 4)
-        time.sleep(5)
 
     # 三麻の処理
-    round_data_list_3, player_data_dict_3 = process_files(3, members_map)
     if round_data_list_3:
         print(f"3-player: {len(round_data_list_3)} games processed")
         print("  Exporting total results (3-player)...")
         exporter.export_total_result_sheet(round_data_list_3, player_data_dict_3, 3)
-        time.sleep(5)
 
     print("\nSummary processing complete!")
 
+def list_games(members_map, parse_options):
+    """目録から試合の一覧を表示（変わったファイルのheadだけを読む）"""
+    for player_n in (4, 3):
+        entries = select_catalog_entries(player_n, members_map, parse_options)
+        print(f"\n{'四麻' if player_n == 4 else '三麻'}: {len(entries)} games")
+        for i, entry in enumerate(entries, 1):
+            start = datetime.datetime.fromtimestamp(entry.start_time).strftime("%Y-%m-%d %H:%M")
+            results = "  ".join(
+                f"{members_map.get(nickname, {}).get('name', nickname)} {score}"
+                for nickname, score in zip(entry.nicknames, entry.scores)
+            )
+            print(f"  {i:3d}  {start}  {Path(entry.path).name}  {results}")
+
+class LiveDivision:
+    """watchモードで1部門の集計を保持し、変わった分だけ出力する"""
+
+    def __init__(self, player_n, exporter, members_map, parse_options):
+        self.player_n = player_n
+        self.exporter = exporter
+        self.members_map = members_map
+        self.parse_options = parse_options
+        self.paifu_dir = PAIFU_DIR / str(player_n)
+        self.files = []
+        self.round_data_list = []
+        self.player_data_dict = {}
+
+    def sync(self):
+        """既存の牌譜をすべて読み込んで出力"""
+        self.files = sorted(self.paifu_dir.glob("*.json"))
+        self.round_data_list = parse_files(self.files, self.player_n, self.members_map, self.parse_options)
+        self._rebuild()
+        self._export(0)
+
+    def update(self, paths):
+        """追加・更新された牌譜だけをパースし、影響するシートを出力"""
+        first_changed = None
+        appended = []
+        for path in sorted(paths):
+            try:
+                round_data = parse_files([path], self.player_n, self.members_map, self.parse_options)[0]
+            except (OSError, ValueError) as e:
+                # 書き込み途中のファイルは次の通知で読み直す
+                print(f"Warning: Could not parse {path.name}: {e}")
+                continue
+
+            if path in self.files:
+                index = self.files.index(path)
+                self.round_data_list[index] = round_data
+            else:
+                index = bisect.bisect(self.files, path)
+                self.files.insert(index, path)
+                self.round_data_list.insert(index, round_data)
+                if index == len(self.files) - 1:
+                    appended.append(round_data)
+            first_changed = index if first_changed is None else min(first_changed, index)
+
+        if first_changed is None:
+            return
+
+        if len(appended) == len(self.round_data_list) - first_changed:
+            # 末尾への追加だけなら集計に足し込む
+            for round_data in appended:
+                calc_player_data_by_round(round_data, self.player_data_dict, self.player_n, f"team{self.player_n}")
+            assign_teams(self.player_data_dict, load_members(), self.player_n)
+        else:
+            self._rebuild()
+        self._export(first_changed)
+
+    def _rebuild(self):
+        from aggregation import aggregate_players
+
+        self.player_data_dict = aggregate_players(self.round_data_list, self.player_n)
+        assign_teams(self.player_data_dict, load_members(), self.player_n)
+
+    def _export(self, start):
+        """start 番目以降の試合シートと、総合結果・プレイヤーデータを出力"""
+        if not self.round_data_list:
+            return
+        label = '四麻' if self.player_n == 4 else '三麻'
+        for i in range(start, len(self.round_data_list)):
+            sheet_name = f"【{label}】第{i + 1}試合"
+            print(f"  Exporting {sheet_name}...")
+            self.exporter.export_round_sheet(self.round_data_list[i], sheet_name, self.player_n, self.player_data_dict)
+        self.exporter.export_total_result_sheet(self.round_data_list, self.player_data_dict, self.player_n)
+        self.exporter.export_player_sheet(self.player_data_dict, self.player_n)
+
+def watch_games(exporter, members_map, parse_options=None, use_inotify=True, metrics_dir=METRICS_DIR):
+    """牌譜ディレクトリを監視し、追加された試合を反映し続ける（Ctrl+Cで終了）"""
+    from watcher import open_watcher
+
+    if parse_options is None:
+        parse_options = ParseOptions()
+    divisions = {
+        PAIFU_DIR / str(player_n): LiveDivision(player_n, exporter, members_map, parse_options)
+        for player_n in (4, 3)
+    }
+
+    watcher = open_watcher(divisions.keys(), use_inotify=use_inotify)
+    print("\nSynchronizing existing games...")
+    for division in divisions.values():
+        division.sync()
+    exporter.flush()
+    exporter.sort_division_sheets()
+    exporter.save_fingerprints()
+
+    print(f"\nWatching {', '.join(str(directory) for directory in divisions)} (Ctrl+C to stop)")
+    try:
+        while True:
+            changed = watcher.wait(WATCH_POLL_INTERVAL)
+            if not changed:
+                continue
+            # 続けて届いたファイルはまとめて処理する
+            while True:
+                more = watcher.wait(0.5)
+                if not more:
+                    break
+                changed |= more
+
+            for directory, division in divisions.items():
+                paths = [path for path in changed if path.parent == directory]
+                if paths:
+                    print(f"\n{len(paths)} new or updated {division.player_n}-player game(s)")
+                    division.update(paths)
+            exporter.flush()
+            # 新しい試合のシートを総合結果の前に移す
+            exporter.sort_division_sheets()
+            exporter.save_fingerprints()
+            metrics.run.write_reports(metrics_dir)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+    finally:
+        watcher.close()
+
 def main():
     parser = argparse.ArgumentParser(description='麻雀大会結果集計プログラム')
-    parser.add_argument('mode', choices=['4', '3', 'all', 'summary'],
-                       help='処理モード: 4=四麻のみ, 3=三麻のみ, all=両方, summary=総合結果のみ')
+    parser.add_argument('mode', choices=['4', '3', 'all', 'summary', 'watch', 'list'],
+                       help='処理モード: 4=四麻のみ, 3=三麻のみ, all=両方, summary=総合結果のみ, '
+                            'watch=牌譜の追加を監視して反映し続ける, list=試合の一覧を表示')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='パース結果のキャッシュを使わない')
+    parser.add_argument('--no-store', action='store_true',
+                       help='パース結果をデータベース（役・放銃の検索用）に保存しない')
+    parser.add_argument('--clear-cache', action='store_true',
+                       help='パース結果のキャッシュを削除してから実行')
+    parser.add_argument('--incremental', action='store_true',
+                       help='既存シートを削除せず、内容が変わったシートだけを書き込む')
+    parser.add_argument('--batch', action='store_true',
+                       help='全シートを作成してから、まとめて少数のリクエストで送信する')
+    parser.add_argument('--workers', type=int, default=PARSE_WORKERS,
+                       help='パースに使うプロセス数（0=CPU数）')
+    parser.add_argument('--metrics-dir', type=Path, default=METRICS_DIR,
+                       help='計測レポート（metrics.json / metrics.prom）の出力先')
+    parser.add_argument('--trace', action='store_true',
+                       help='デバッグ出力を有効にする')
+    parser.add_argument('--pipeline', action='store_true',
+                       help='パースしながら試合シートを出力する（四麻・三麻・allモード）')
+    parser.add_argument('--resume', action='store_true',
+                       help='中断した出力を再開する（書き込み済みのシートは削除も再送もしない）')
+    parser.add_argument('--backend', choices=['sheets', 'xlsx', 'drive'], default='sheets',
+                       help='出力先: sheets=Googleスプレッドシート, xlsx=ローカルのxlsxファイル, '
+                            'drive=xlsxを作ってスプレッドシートに一括アップロード（allモードのみ）')
+    parser.add_argument('--output', type=Path, default=XLSX_OUTPUT_FILE,
+                       help='--backend xlsx / drive で書き出すxlsxファイル')
+    parser.add_argument('--dry-run', action='store_true',
+                       help='パースと集計だけを行い、書き込む予定のシートを表示する（認証しない）')
+    parser.add_argument('--poll', action='store_true',
+                       help='watchモードでinotifyを使わずポーリングで監視する')
+    parser.add_argument('--player', action='append', default=[],
+                       help='このプレイヤー（HNかゲーム内の名前）が参加した試合だけを処理する（複数指定可）')
+    parser.add_argument('--team', help='このチームのメンバーが参加した試合だけを処理する')
+    parser.add_argument('--archive', type=Path, action='append', default=[],
+                       help='牌譜をまとめたzip / tar.gzを展開せずに読む（paifu 直下のものは指定しなくても読む）')
+    parser.add_argument('--since', type=parse_since,
+                       help='この日時（YYYY-MM-DD または ISO 8601）以降に始まった試合だけを処理する')
 
     args = parser.parse_args()
+    if args.backend == 'xlsx' and args.mode == 'watch':
+        parser.error("watchモードは --backend sheets でのみ使えます")
+    if args.mode == 'watch' and (args.player or args.team or args.since is not None or args.archive):
+        parser.error("watchモードでは --player / --team / --since / --archive は使えません")
+    if args.backend == 'drive' and args.mode != 'all':
+        # アップロードはスプレッドシート全体を置き換えるため、両部門をそろえて出力する
+        parser.error("--backend drive は allモードでのみ使えます")
+    if args.trace:
+        metrics.enable_tracing()
 
     print("Starting mahjong tournament result aggregation...")
     mode_descriptions = {
         '4': '四麻のみ',
         '3': '三麻のみ',
         'all': '四麻と三麻',
-        'summary': '総合結果のみ'
+        'summary': '総合結果のみ',
+        'watch': '牌譜の監視',
+        'list': '試合の一覧'
     }
     print(f"Mode: {mode_descriptions.get(args.mode, args.mode)}")
 
     members = load_members()
     members_map = create_members_map(members)
 
-    exporter = SheetsExporter()
-
-    if args.mode == '4':
-        process_4player_games(exporter, members_map)
+    parse_options = ParseOptions(
+        workers=args.workers or os.cpu_count() or 1, pipeline=args.pipeline,
+        catalog=PaifuCatalog(CATALOG_FILE),
+        game_filter=GameFilter(players=args.player, team=args.team, since=args.since),
+    )
+    # 部門のディレクトリに展開していないアーカイブ（watchモードは対象外）
+    archives = [] if args.mode == 'watch' else list(dict.fromkeys(find_archives(PAIFU_DIR) + args.archive))
+    if args.mode == 'list':
+        parse_options.archive_games = ingest_archives(archives, members_map, parse_options, heads_only=True)
+        list_games(members_map, parse_options)
+        return
+
+    if not args.no_cache:
+        parse_options.cache = ParseCache(PARSE_CACHE_DIR, PARSER_VERSION, members_map, PARSE_CACHE_MAX_BYTES)
+        if args.clear_cache:
+            parse_options.cache.clear()
+    if not args.no_store and args.mode != 'watch':
+        parse_options.store = GameStore(GAME_STORE_FILE, PARSER_VERSION)
+
+    # watchモードは変わったシートだけをまとめて送る
+    watch = args.mode == 'watch'
+    # watchモードは内容ハッシュで差分を取るため記録しない
+    journal = None
+    if args.dry_run:
+        from dry_run import DryRunExporter
+        exporter = DryRunExporter(incremental=args.incremental or watch)
+    elif args.backend == 'xlsx':
+        # 毎回新しいファイルに書き出す（差分出力・再開は使わない）
+        from xlsx_exporter import XlsxExporter
+        exporter = XlsxExporter(args.output)
+    elif args.backend == 'drive':
+        from drive_publisher import DriveUploadExporter
+        exporter = DriveUploadExporter(args.output)
+    else:
+        if not watch:
+            journal = CheckpointJournal(CHECKPOINT_FILE, SPREADSHEET_ID, resume=args.resume)
+            if journal.resumed:
+                print(f"Resuming: {len(journal.completed)} sheets already written")
+        # gspread・google-auth の読み込みは書き込む場合だけにする
+        from sheets_exporter import SheetsExporter
+        # 認証はバックグラウンドで始まり、最初にシートに触るまでパースと並行する
+        exporter = SheetsExporter(incremental=args.incremental or watch, deferred=args.batch or watch, journal=journal)
+
+    if archives:
+        # 総合結果だけならheadだけを読む
+        parse_options.archive_games = ingest_archives(archives, members_map, parse_options,
+                                                      heads_only=args.mode == 'summary',
+                                                      divisions=(int(args.mode),) if args.mode in ('4', '3') else (4, 3))
+
+    if watch:
+        watch_games(exporter, members_map, parse_options, use_inotify=not args.poll, metrics_dir=args.metrics_dir)
+    elif args.mode == '4':
+        process_4player_games(exporter, members_map, parse_options)
     elif args.mode == '3':
-        process_3player_games(exporter, members_map)
+        process_3player_games(exporter, members_map, parse_options)
     elif args.mode == 'all':
-        # 既存のシートをクリーンアップ
-        print("\nCleaning existing sheets...")
-        exporter.clean_all_sheets()
+        process_all_games(exporter, members_map, parse_options)
 
-        process_4player_games(exporter, members_map)
-        process_3player_games(exporter, members_map)
+        # 部門ごとの削除で残る旧形式のシートを削除（今回出力したシートは残す）
+        if not exporter.keeps_existing_sheets:
+            print("\nCleaning remaining sheets...")
+            exporter.clean_all_sheets(keep=exporter.written_titles)
     elif args.mode == 'summary':
-        process_summary_only(exporter, members_map)
+        process_summary_only(exporter, members_map, parse_options)
+
+    exporter.flush()
+    # 並行処理や差分出力で追加したシートは末尾に付くため、決まった並びに直す（並んでいれば何もしない）
+    exporter.sort_division_sheets()
+    exporter.save_fingerprints()
+    exporter.close()
+    if journal is not None:
+        journal.close()
+    if parse_options.store is not None:
+        parse_options.store.close()
+
+    if parse_options.cache is not None:
+        print(f"Parse cache: {parse_options.cache.hits} hits, {parse_options.cache.misses} misses")
+        metrics.run.count("parse_cache_hits", parse_options.cache.hits)
+        metrics.run.count("parse_cache_misses", parse_options.cache.misses)
+
+    metrics.run.write_reports(args.metrics_dir)
+    print(f"Metrics written to {args.metrics_dir}")
 
     print("\nAll processing complete!")
 
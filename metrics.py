@@ -0,0 +1,144 @@
+"""実行時の計測（段階ごとの時間・APIリクエスト数など）とデバッグ出力"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Tuple
+
+# デバッグ出力は環境変数で有効化する（ワーカープロセスにも引き継がれる）
+TRACE_ENV = "MAHJONG_TRACE"
+TRACING = os.environ.get(TRACE_ENV, "") not in ("", "0")
+
+PROMETHEUS_PREFIX = "mahjong"
+
+
+def enable_tracing():
+    """デバッグ出力を有効化"""
+    global TRACING
+    TRACING = True
+    os.environ[TRACE_ENV] = "1"
+
+
+def trace(label: str, value=None):
+    """デバッグ出力（無効時は何もしない）
+
+    ホットループでは `if metrics.TRACING:` で呼び出し自体を省略する。
+    """
+    if TRACING:
+        print(f"[trace] {label}: {value!r}" if value is not None else f"[trace] {label}", file=sys.stderr)
+
+
+class Metrics:
+    """段階ごとの経過時間とカウンターを集計する"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # 段階名 -> [回数, 秒]
+            self.timings: Dict[str, list] = {}
+            # (名前, ラベル) -> 値
+            self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+
+    @contextmanager
+    def timer(self, stage: str):
+        """with ブロックの経過時間を stage に加算"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def add_time(self, stage: str, seconds: float, calls: int = 1):
+        with self._lock:
+            timing = self.timings.setdefault(stage, [0, 0.0])
+            timing[0] += calls
+            timing[1] += seconds
+
+    def count(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def snapshot(self) -> Dict:
+        """プロセス間で受け渡せる形の集計値"""
+        with self._lock:
+            return {
+                "timings": {stage: list(timing) for stage, timing in self.timings.items()},
+                "counters": [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+            }
+
+    def merge(self, snapshot: Dict):
+        """別プロセスの集計値を加算"""
+        for stage, (calls, seconds) in snapshot["timings"].items():
+            self.add_time(stage, seconds, calls)
+        for name, labels, value in snapshot["counters"]:
+            self.count(name, value, **labels)
+
+    def report(self) -> Dict:
+        """JSONレポート"""
+        snapshot = self.snapshot()
+        return {
+            "started_at": self.started,
+            "duration_seconds": time.time() - self.started,
+            "stages": {
+                stage: {"calls": calls, "seconds": seconds}
+                for stage, (calls, seconds) in sorted(snapshot["timings"].items())
+            },
+            "counters": sorted(
+                ({"name": name, "labels": labels, "value": value} for name, labels, value in snapshot["counters"]),
+                key=lambda counter: (counter["name"], sorted(counter["labels"].items())),
+            ),
+        }
+
+    def prometheus_text(self) -> str:
+        """Prometheusのテキスト形式"""
+        report = self.report()
+        lines = [
+            f"# HELP {PROMETHEUS_PREFIX}_run_duration_seconds Wall-clock duration of the run.",
+            f"# TYPE {PROMETHEUS_PREFIX}_run_duration_seconds gauge",
+            f"{PROMETHEUS_PREFIX}_run_duration_seconds {report['duration_seconds']:.6f}",
+            f"# HELP {PROMETHEUS_PREFIX}_stage_seconds_total Time spent in each stage.",
+            f"# TYPE {PROMETHEUS_PREFIX}_stage_seconds_total counter",
+        ]
+        for stage, timing in report["stages"].items():
+            lines.append(f'{PROMETHEUS_PREFIX}_stage_seconds_total{{stage="{stage}"}} {timing["seconds"]:.6f}')
+        lines += [
+            f"# HELP {PROMETHEUS_PREFIX}_stage_calls_total Number of times each stage ran.",
+            f"# TYPE {PROMETHEUS_PREFIX}_stage_calls_total counter",
+        ]
+        for stage, timing in report["stages"].items():
+            lines.append(f'{PROMETHEUS_PREFIX}_stage_calls_total{{stage="{stage}"}} {timing["calls"]}')
+
+        declared = set()
+        for counter in report["counters"]:
+            metric = f"{PROMETHEUS_PREFIX}_{counter['name']}_total"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} counter")
+                declared.add(metric)
+            labels = ",".join(f'{key}="{_escape_label(value)}"' for key, value in sorted(counter["labels"].items()))
+            lines.append(f"{metric}{{{labels}}} {counter['value']}" if labels else f"{metric} {counter['value']}")
+        return "\n".join(lines) + "\n"
+
+    def write_reports(self, directory: Path):
+        """metrics.json と metrics.prom を書き出す"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / "metrics.json", 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        with open(directory / "metrics.prom", 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# プロセス全体で共有する計測値
+run = Metrics()
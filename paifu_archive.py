@@ -0,0 +1,81 @@
+"""zip / tar.gz にまとめられた牌譜を展開せずに読む"""
+import io
+import tarfile
+import time
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import metrics
+from data_structures import RoundData
+from paifu_catalog import CatalogEntry
+from paifu_reader import PaifuReader
+
+ARCHIVE_SUFFIXES = (".zip", ".tar.gz", ".tgz")
+
+
+@dataclass(frozen=True)
+class ArchiveMember:
+    """アーカイブ内の牌譜ファイル"""
+    archive: Path
+    member: str  # アーカイブ内のパス
+
+    @property
+    def name(self) -> str:
+        return PurePosixPath(self.member).name
+
+    def __str__(self):
+        return f"{self.archive}:{self.member}"
+
+
+@dataclass
+class ArchiveGame:
+    """アーカイブ内の半荘（head の目録と、パースした場合はそのRoundData）"""
+    member: ArchiveMember
+    entry: CatalogEntry
+    round_data: Optional[RoundData] = None
+
+
+def is_archive(path: Path) -> bool:
+    return path.name.endswith(ARCHIVE_SUFFIXES)
+
+
+def find_archives(directory: Path) -> List[Path]:
+    """ディレクトリ直下の牌譜アーカイブ"""
+    if not Path(directory).is_dir():
+        return []
+    return sorted(path for path in Path(directory).iterdir() if path.is_file() and is_archive(path))
+
+
+def iter_archive_members(archive: Path) -> Iterator[Tuple[ArchiveMember, bytes]]:
+    """アーカイブ内の .json を格納順に1つずつ読み出す
+
+    tar.gz はストリームとして先頭から1回だけ展開する（メンバーごとに先頭からたどり直さない）。
+    """
+    archive = Path(archive)
+    if archive.name.endswith(".zip"):
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.endswith(".json"):
+                    continue
+                start = time.perf_counter()
+                with zf.open(info) as f:
+                    data = f.read()
+                metrics.run.add_time("archive_read", time.perf_counter() - start)
+                yield ArchiveMember(archive, info.filename), data
+    else:
+        with tarfile.open(archive, "r|*") as tf:
+            for info in tf:
+                if not info.isfile() or not info.name.endswith(".json"):
+                    continue
+                start = time.perf_counter()
+                data = tf.extractfile(info).read()
+                metrics.run.add_time("archive_read", time.perf_counter() - start)
+                yield ArchiveMember(archive, info.name), data
+
+
+def read_member_head(member: ArchiveMember, data: bytes) -> Dict:
+    """メンバーの head だけをデコードする"""
+    with PaifuReader(member, stream=io.BytesIO(data)) as reader:
+        return reader.read_head()
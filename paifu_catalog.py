@@ -0,0 +1,154 @@
+"""牌譜ファイルの目録（uuid・対局者・最終得点などを head から集めて保存する）"""
+import datetime
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from paifu_reader import PaifuReader
+
+CATALOG_VERSION = 1
+
+
+@dataclass
+class CatalogEntry:
+    """牌譜ファイル1つ分の目録"""
+    path: str
+    size: int
+    mtime_ns: int
+    uuid: str
+    start_time: int
+    player_n: int
+    nicknames: List[str]  # 席順
+    scores: List[int]     # 席順の total_point
+
+    @classmethod
+    def from_head(cls, path: str, size: int, mtime_ns: int, head: Dict) -> "CatalogEntry":
+        player_n = len(head["accounts"])
+        nicknames = [""] * player_n
+        for account in head["accounts"]:
+            nicknames[account.get("seat", 0)] = account["nickname"]
+        scores = [0] * player_n
+        for player in head["result"]["players"]:
+            scores[player["seat"]] = player["total_point"]
+        return cls(str(path), size, mtime_ns, head["uuid"], head.get("start_time", 0),
+                   player_n, nicknames, scores)
+
+
+@dataclass
+class GameFilter:
+    """対象にする半荘の条件（指定がなければすべて）"""
+    players: List[str] = field(default_factory=list)  # HNかゲーム内の名前のいずれかが参加
+    team: Optional[str] = None                         # このチームのメンバーが参加
+    since: Optional[int] = None                        # 開始時刻（UNIX秒）がこれ以降
+
+    def __bool__(self):
+        return bool(self.players or self.team or self.since is not None)
+
+    def matches(self, entry: CatalogEntry, members_map: Dict[str, Dict]) -> bool:
+        if self.since is not None and entry.start_time < self.since:
+            return False
+        members = [members_map.get(nickname, {}) for nickname in entry.nicknames]
+        if self.players:
+            names = set(entry.nicknames) | {member.get("name") for member in members}
+            if not names.intersection(self.players):
+                return False
+        if self.team is not None:
+            team_field = f"team{entry.player_n}"
+            if not any(member.get(team_field) == self.team for member in members):
+                return False
+        return True
+
+
+def parse_since(value: str) -> int:
+    """--since の日付（YYYY-MM-DD または ISO 8601、タイムゾーンなしはローカル時刻）をUNIX秒にする"""
+    return int(datetime.datetime.fromisoformat(value).timestamp())
+
+
+class PaifuCatalog:
+    """ディレクトリごとの牌譜の目録をJSONファイルに保存する
+
+    ファイルのサイズと更新時刻が変わっていなければ保存済みの内容を使い、
+    変わったファイルだけ head を読み直す。
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, CatalogEntry] = self._load()
+        self.reads = 0
+
+    def _load(self) -> Dict[str, CatalogEntry]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") != CATALOG_VERSION:
+                return {}
+            return {path: CatalogEntry(**entry) for path, entry in data["entries"].items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    def save(self):
+        # 一時ファイルは共通なので、書き込みから置き換えまでをロックで守る
+        with self._lock:
+            data = {"version": CATALOG_VERSION, "entries": {path: asdict(entry) for path, entry in self._entries.items()}}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def get(self, path: str) -> Optional[CatalogEntry]:
+        """ファイルの目録（scan 済みのもの）"""
+        with self._lock:
+            return self._entries.get(path)
+
+    def scan(self, directory: Path) -> List[CatalogEntry]:
+        """ディレクトリの牌譜の目録を更新し、ファイル名順に返す（head が読めないファイルは除く）"""
+        entries = []
+        seen = set()
+        changed = False
+        for path in sorted(Path(directory).glob("*.json")):
+            key = str(path)
+            seen.add(key)
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is None or entry.size != stat.st_size or entry.mtime_ns != stat.st_mtime_ns:
+                try:
+                    with PaifuReader(path) as reader:
+                        entry = CatalogEntry.from_head(key, stat.st_size, stat.st_mtime_ns, reader.read_head())
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    print(f"Warning: Could not read head of {path.name}: {e}")
+                    continue
+                self.reads += 1
+                with self._lock:
+                    self._entries[key] = entry
+                changed = True
+            entries.append(entry)
+
+        # 消えたファイルの目録を削除
+        prefix = str(Path(directory)) + os.sep
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix) and key not in seen]:
+                del self._entries[key]
+                changed = True
+        if changed:
+            self.save()
+        return entries
+
+
+def dedup_by_uuid(entries: List[CatalogEntry]) -> List[CatalogEntry]:
+    """同じ牌譜（同じ uuid）が複数あれば最初のファイルだけを残す"""
+    unique = {}
+    for entry in entries:
+        if entry.uuid in unique:
+            print(f"  Duplicate of {unique[entry.uuid].path}, skipped: {entry.path}")
+            continue
+        unique[entry.uuid] = entry
+    return list(unique.values())
@@ -0,0 +1,258 @@
+"""牌譜JSONの逐次リーダー"""
+import io
+import json
+import os
+import time
+from pathlib import Path
+from typing import IO, Dict, Iterable, Iterator, Optional, Tuple
+
+import metrics
+from config import PAIFU_STREAM_MIN_BYTES
+
+# パーサーが必要とするイベント（打牌と加槓・暗槓はロンの放銃者判定に使う）
+PARSE_EVENTS = (
+    ".lq.RecordNewRound", ".lq.RecordHule", ".lq.RecordNoTile",
+    ".lq.RecordDiscardTile", ".lq.RecordAnGangAddGang",
+)
+
+# data.data.actions へのパス
+ACTIONS_PATH = ("data", "data", "actions")
+
+_WHITESPACE = " \t\n\r"
+
+
+class PaifuReader:
+    """牌譜JSONから必要なイベントだけを取り出す
+
+    stream_min_bytes 以上の牌譜は先頭から少しずつ読み、actions 配列の要素を1つずつデコードして
+    不要なものはすぐに捨てる（全アクションが同時にメモリに載らない）。
+    それより小さい牌譜は json.load で一度にデコードする方が速いため、そうする。
+    ファイル読み込み（file_read）とデコード（decode）の時間を計り、閉じるときに metrics に加算する。
+    stream を渡した場合はファイルを開かずにそこから読む（filename はメッセージ用）。
+    """
+
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, filename: Path, event_names: Iterable[str] = PARSE_EVENTS, stream: Optional[IO[bytes]] = None,
+                 stream_min_bytes: int = PAIFU_STREAM_MIN_BYTES):
+        self.filename = filename
+        self.event_names = frozenset(event_names)
+        self._stream = stream
+        self.stream_min_bytes = stream_min_bytes
+        self.head: Optional[Dict] = None
+
+        self._decoder = json.JSONDecoder()
+        self._file = None
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self.read_seconds = 0.0
+        self.decode_seconds = 0.0
+        self._size = 0
+
+    def __enter__(self):
+        if self._stream is not None:
+            position = self._stream.tell()
+            self._size = self._stream.seek(0, io.SEEK_END) - position
+            self._stream.seek(position)
+            self._file = io.TextIOWrapper(self._stream, encoding='utf-8')
+        else:
+            self._file = open(self.filename, 'r', encoding='utf-8')
+            self._size = os.fstat(self._file.fileno()).st_size
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        self._file = None
+        metrics.run.add_time("file_read", self.read_seconds)
+        metrics.run.add_time("decode", self.decode_seconds)
+
+    def iter_events(self) -> Iterator[Tuple[str, Dict]]:
+        """(イベント名, データ) を牌譜の順に返す
+
+        head は読み進める途中で self.head に格納される。
+        """
+        if self._size < self.stream_min_bytes:
+            yield from self._iter_loaded_events()
+            return
+
+        self._expect("{")
+        for key in self._iter_keys():
+            if key == "head":
+                self.head = self._decode_value()
+            elif key == ACTIONS_PATH[0]:
+                yield from self._walk(ACTIONS_PATH[1:])
+            else:
+                self._decode_value()
+
+    def _iter_loaded_events(self) -> Iterator[Tuple[str, Dict]]:
+        """牌譜全体を一度に読み込んでデコードし、イベントを返す"""
+        start = time.perf_counter()
+        text = self._file.read()
+        self.read_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        data = self._decoder.decode(text)
+        self.decode_seconds += time.perf_counter() - start
+        del text
+
+        self.head = data["head"]
+        actions = data
+        for key in ACTIONS_PATH:
+            actions = actions[key]
+        event_names = self.event_names
+        for action in actions:
+            # 思考時間とスタンプは集計対象外
+            if action.get("type") == 1:
+                result = action["result"]
+                name = result["name"]
+                if name in event_names:
+                    yield name, result["data"]
+
+    def read_head(self) -> Dict:
+        """head だけをデコードして返す（actions は読まない）"""
+        self._expect("{")
+        for key in self._iter_keys():
+            if key == "head":
+                self.head = self._decode_value()
+                return self.head
+            self._decode_value()
+        raise ValueError(f"{self.filename}: head not found in paifu JSON")
+
+    def _walk(self, path: Tuple[str, ...]) -> Iterator[Tuple[str, Dict]]:
+        """path をたどって actions 配列に到達する"""
+        if not path:
+            yield from self._iter_actions()
+            return
+
+        self._expect("{")
+        for key in self._iter_keys():
+            if key == path[0]:
+                yield from self._walk(path[1:])
+            else:
+                self._decode_value()
+
+    def _iter_actions(self) -> Iterator[Tuple[str, Dict]]:
+        """actions 配列の要素を1つずつデコードする
+
+        要素の数だけ回るため、バッファ内で完結する要素は C のスキャナーを直接呼び、
+        区切りの , もここで読む（バッファ境界や空白の扱いは _decode_value・_next_separator に任せる）。
+        スキャナーの時間はローカル変数に溜め、終了時に decode_seconds に足す。
+        """
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+
+        scan_once = self._decoder.scan_once
+        perf_counter = time.perf_counter
+        event_names = self.event_names
+        buf, pos = self._buf, self._pos
+        scan_seconds = 0.0
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    action, end = scan_once(buf, pos)
+                except (StopIteration, json.JSONDecodeError):
+                    end = None
+                scan_seconds += perf_counter() - start
+                if end is None or end == len(buf):
+                    self._pos = pos
+                    action = self._decode_value()
+                    buf, pos = self._buf, self._pos
+                else:
+                    pos = end
+
+                # 思考時間とスタンプは集計対象外
+                if action.get("type") == 1:
+                    result = action["result"]
+                    name = result["name"]
+                    if name in event_names:
+                        yield name, result["data"]
+
+                if buf.startswith(",", pos):
+                    pos += 1
+                    # 区切りの後の空白1文字（json.dumps の既定の書式）
+                    if buf.startswith(" ", pos):
+                        pos += 1
+                else:
+                    self._pos = pos
+                    if self._next_separator("]"):
+                        return
+                    buf, pos = self._buf, self._pos
+        finally:
+            self.decode_seconds += scan_seconds
+
+    def _iter_keys(self) -> Iterator[str]:
+        """オブジェクトのキーを順に返す（値は呼び出し側で読む）"""
+        if self._peek() == "}":
+            self._pos += 1
+            return
+
+        while True:
+            key = self._decode_value()
+            self._expect(":")
+            yield key
+            if self._next_separator("}"):
+                return
+
+    def _next_separator(self, closing: str) -> bool:
+        """区切りの , を読み、閉じ括弧に達したら True を返す"""
+        ch = self._peek()
+        self._pos += 1
+        if ch == closing:
+            return True
+        if ch != ",":
+            raise ValueError(f"{self.filename}: unexpected {ch!r} in paifu JSON")
+        return False
+
+    def _decode_value(self):
+        """現在位置の値を1つデコードする"""
+        self._peek()
+        while True:
+            start = time.perf_counter()
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                self.decode_seconds += time.perf_counter() - start
+                if self._eof:
+                    raise
+                self._fill()
+                continue
+            self.decode_seconds += time.perf_counter() - start
+            # 数値がバッファ境界で途切れている可能性があるため続きを確認
+            if end == len(self._buf) and not self._eof:
+                self._fill()
+                continue
+            self._pos = end
+            return value
+
+    def _expect(self, ch: str):
+        if self._peek() != ch:
+            raise ValueError(f"{self.filename}: expected {ch!r} in paifu JSON")
+        self._pos += 1
+
+    def _peek(self) -> str:
+        """空白を読み飛ばし、次の文字を返す"""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if self._eof:
+                raise ValueError(f"{self.filename}: unexpected end of paifu JSON")
+            self._fill()
+
+    def _fill(self):
+        """ファイルから次のチャンクを読み込む"""
+        # 読み終えた部分は捨てる
+        if self._pos:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        start = time.perf_counter()
+        chunk = self._file.read(self.CHUNK_SIZE)
+        self.read_seconds += time.perf_counter() - start
+        if chunk:
+            self._buf += chunk
+        else:
+            self._eof = True
@@ -0,0 +1,150 @@
+"""パース結果のディスクキャッシュ"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from data_structures import RoundData
+
+META_FILE = "meta.json"
+ENTRY_SUFFIX = ".pickle"
+
+
+def members_digest(members_map: Dict[str, Dict]) -> str:
+    """表示名に関わるメンバー情報のハッシュ"""
+    names = sorted((game_name, member.get("name", game_name)) for game_name, member in members_map.items())
+    return hashlib.sha256(json.dumps(names, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ParseCache:
+    """牌譜ファイルの内容ハッシュをキーにRoundDataを保存するキャッシュ
+
+    キーにはパーサーのバージョンと人数も含める。
+    members.json の表示名が変わった場合はキャッシュ全体を破棄する。
+    容量が max_bytes を超えたら、最後に使われたのが古いものから削除する。
+    """
+
+    def __init__(self, cache_dir: Path, parser_version: int, members_map: Dict[str, Dict], max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.parser_version = parser_version
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # 四麻・三麻を並行して処理する場合に容量と件数の集計を守る
+        self._lock = threading.Lock()
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._validate(members_digest(members_map))
+        self._total_bytes = sum(path.stat().st_size for path in self._entries())
+
+    def _validate(self, digest: str):
+        """メンバー情報が変わっていればキャッシュを破棄"""
+        meta_path = self.cache_dir / META_FILE
+        meta = {}
+        if meta_path.exists():
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                meta = {}
+
+        if meta.get("members") != digest:
+            if meta:
+                print("  Members changed, clearing parse cache")
+            self.clear()
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({"members": digest}, f)
+
+    def key_for(self, filename: Path, player_n: int) -> str:
+        """ファイル内容からキャッシュキーを計算"""
+        digest = hashlib.sha256(f"{self.parser_version}:{player_n}:".encode("utf-8"))
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def key_for_bytes(self, data: bytes, player_n: int) -> str:
+        """アーカイブから読み出した牌譜の内容からキャッシュキーを計算（展開したファイルと同じキーになる）"""
+        digest = hashlib.sha256(f"{self.parser_version}:{player_n}:".encode("utf-8"))
+        digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[RoundData]:
+        """キャッシュからRoundDataを取得"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                round_data = pickle.load(f)
+        except FileNotFoundError:
+            self._count(hit=False)
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            # 壊れたエントリは削除して再パース
+            self._remove(path)
+            self._count(hit=False)
+            return None
+
+        # LRU用に最終使用時刻を更新
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self._count(hit=True)
+        return round_data
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, key: str, round_data: RoundData):
+        """RoundDataをキャッシュに保存"""
+        path = self._path(key)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(round_data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            old_size = path.stat().st_size if path.exists() else 0
+            os.replace(tmp_path, path)
+            self._total_bytes += path.stat().st_size - old_size
+            self._evict()
+
+    def load(self, filename: Path, player_n: int) -> Tuple[str, Optional[RoundData]]:
+        """キーとキャッシュ済みのRoundData（なければNone）を返す"""
+        key = self.key_for(filename, player_n)
+        return key, self.get(key)
+
+    def clear(self):
+        """キャッシュを全削除"""
+        for path in self._entries():
+            self._remove(path)
+        self._total_bytes = 0
+
+    def _evict(self):
+        """容量超過分を古い順に削除"""
+        if self._total_bytes <= self.max_bytes:
+            return
+        entries = sorted(self._entries(), key=lambda path: path.stat().st_mtime)
+        for path in entries:
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._total_bytes -= path.stat().st_size
+            self._remove(path)
+
+    def _entries(self):
+        return list(self.cache_dir.glob(f"*{ENTRY_SUFFIX}"))
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{ENTRY_SUFFIX}"
+
+    @staticmethod
+    def _remove(path: Path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
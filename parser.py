@@ -1,141 +1,172 @@
 """牌譜JSONパーサー"""
-import json
+import time
 from pathlib import Path
-from typing import Dict, List
-from icecream import ic
+from typing import IO, Dict, List, Optional
 
 from data_structures import (
     HuleSingleData, HandData, RoundData,
-    PlayerHalfRoundData, PlayerData
+    PlayerHalfRoundData, PlayerData, pack_fans
 )
-from config import DORA_FANS, RARE_FANS, ORIGIN_POINT_3, ORIGIN_POINT_4
+from paifu_reader import PaifuReader
+import metrics
+from config import DORA_FANS, RARE_FANS, ORIGIN_POINT_3, ORIGIN_POINT_4, PAIFU_STREAM_MIN_BYTES
+
+# パース結果の形式を変えたら上げる（キャッシュの無効化に使う）
+PARSER_VERSION = 3
 
 class PaifuParser:
-    def __init__(self, player_n: int, members_map: Dict[str, Dict]):
+    def __init__(self, player_n: int, members_map: Dict[str, Dict], stream_min_bytes: int = PAIFU_STREAM_MIN_BYTES):
         self.player_n = player_n
         self.members_map = members_map
+        self.stream_min_bytes = stream_min_bytes  # これ以上の大きさの牌譜は逐次読み込む
         self.origin_point = ORIGIN_POINT_3 if player_n == 3 else ORIGIN_POINT_4
 
-    def parse_round(self, filename: Path) -> RoundData:
-        """半荘のデータをパース"""
-        with open(filename, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+    def parse_round(self, filename: Path, stream: Optional[IO[bytes]] = None) -> RoundData:
+        """半荘のデータをパース（stream があればファイルの代わりにそこから読む）"""
+        round_data = RoundData(self.player_n)
+
+        # 読み込み・デコードの時間は PaifuReader が計上する
+        with PaifuReader(filename, stream=stream, stream_min_bytes=self.stream_min_bytes) as reader:
+            self._parse_actions(reader, round_data)
+            self._apply_head(reader.head, round_data)
+
+        metrics.trace("names", round_data.names)
 
+        return round_data
+
+    def parse_head(self, filename: Path) -> RoundData:
+        """head だけを読み、名前と最終得点のみのRoundDataを返す（局のデータは空）"""
+        round_data = RoundData(self.player_n)
+        with PaifuReader(filename) as reader:
+            self._apply_head(reader.read_head(), round_data)
+        return round_data
+
+    def parse_catalog_entry(self, entry) -> RoundData:
+        """牌譜目録の名前・最終得点からRoundDataを作る（ファイルは読まない）"""
         round_data = RoundData(self.player_n)
-        round_data.uuid = data["head"]["uuid"]
+        round_data.uuid = entry.uuid
+        round_data.scores = list(entry.scores)
+        round_data.names = [self._display_name(nickname) for nickname in entry.nicknames]
+        return round_data
+
+    def _display_name(self, game_name: str) -> str:
+        # game_nameからメンバー情報を取得
+        member_info = self.members_map.get(game_name, {})
+        return member_info.get("name", game_name)
 
-        # head
-        for player in data["head"]["result"]["players"]:
+    def _apply_head(self, data_head: Dict, round_data: RoundData):
+        """head から uuid・最終得点・名前を設定"""
+        round_data.uuid = data_head["uuid"]
+
+        for player in data_head["result"]["players"]:
             round_data.scores[player["seat"]] = player["total_point"]
 
-        for account in data["head"]["accounts"]:
+        for account in data_head["accounts"]:
             seat = account.get("seat", 0)
-            game_name = account["nickname"]
-            # game_nameからメンバー情報を取得
-            member_info = self.members_map.get(game_name, {})
-            display_name = member_info.get("name", game_name)
-            round_data.names[seat] = display_name
+            round_data.names[seat] = self._display_name(account["nickname"])
 
-        ic(round_data.names)
+    def _parse_actions(self, reader: PaifuReader, round_data: RoundData):
+        """局ごとのアクションを先頭から1回だけ走査してパース
 
-        # action
+        ロンの放銃者は直前の打牌か槓（槍槓）の席なので、それだけを状態として持つ。
+        """
         current_scores = [0] * self.player_n
         current_parent = 0
         current_round_hand_data = None
-
-        for ai, action in enumerate(data["data"]["data"]["actions"]):
-            if action["type"] == 1:
-                # 局開始
-                if action["result"]["name"] == ".lq.RecordNewRound":
-                    current_parent = action["result"]["data"]["ju"]
-                    current_round_hand_data = HandData(self.player_n, action["result"]["data"])
-                    current_scores = action["result"]["data"]["scores"]
-                    ic(current_scores)
-
-                # 和了
-                elif action["result"]["name"] == ".lq.RecordHule":
-                    for hule in action["result"]["data"]["hules"]:
-                        if hule["zimo"]:  # ツモ
-                            current_round_hand_data.huleData.append(
-                                HuleSingleData(
-                                    seat=hule["seat"],
-                                    isNagashi=False,
-                                    rongPlayer=-1,
-                                    dadian=hule["dadian"],
-                                    han=hule["count"],
-                                    fu=hule["fu"],
-                                    fans=hule["fans"],
-                                )
+        deal_in_seat = -1  # 直前に打牌・槓をした席
+
+        start = time.perf_counter()
+        read_seconds, decode_seconds = reader.read_seconds, reader.decode_seconds
+        for name, result_data in reader.iter_events():
+            # 打牌・加槓（暗槓）
+            if name == ".lq.RecordDiscardTile" or name == ".lq.RecordAnGangAddGang":
+                deal_in_seat = result_data["seat"]
+
+            # 局開始
+            elif name == ".lq.RecordNewRound":
+                current_parent = result_data["ju"]
+                current_round_hand_data = HandData(self.player_n, result_data)
+                current_scores = result_data["scores"]
+                deal_in_seat = -1
+                if metrics.TRACING:
+                    metrics.trace("scores", current_scores)
+
+            # 和了
+            elif name == ".lq.RecordHule":
+                for hule in result_data["hules"]:
+                    if hule["zimo"]:  # ツモ
+                        current_round_hand_data.huleData.append(
+                            HuleSingleData(
+                                seat=hule["seat"],
+                                isNagashi=False,
+                                rongPlayer=-1,
+                                dadian=hule["dadian"],
+                                han=hule["count"],
+                                fu=hule["fu"],
+                                fans=pack_fans(hule["fans"]),
+                            )
+                        )
+                        # それぞれの収支を計算
+                        for seat in range(self.player_n):
+                            if seat == hule["seat"]:
+                                current_round_hand_data.deltaMain[seat] += hule["dadian"]
+                            elif seat == current_parent:
+                                current_round_hand_data.deltaMain[seat] -= hule["point_zimo_qin"]
+                            else:
+                                current_round_hand_data.deltaMain[seat] -= hule["point_zimo_xian"]
+                    elif deal_in_seat >= 0:  # ロン
+                        current_round_hand_data.huleData.append(
+                            HuleSingleData(
+                                seat=hule["seat"],
+                                isNagashi=False,
+                                rongPlayer=deal_in_seat,
+                                dadian=hule["dadian"],
+                                han=hule["count"],
+                                fu=hule["fu"],
+                                fans=pack_fans(hule["fans"]),
                             )
-                            # それぞれの収支を計算
-                            for seat in range(self.player_n):
-                                if seat == hule["seat"]:
-                                    current_round_hand_data.deltaMain[seat] += hule["dadian"]
-                                elif seat == current_parent:
-                                    current_round_hand_data.deltaMain[seat] -= hule["point_zimo_qin"]
-                                else:
-                                    current_round_hand_data.deltaMain[seat] -= hule["point_zimo_xian"]
-                        else:  # ロン
-                            # 放銃者の情報を取得
-                            for back in range(2, 7):
-                                if ai - back < 0:
-                                    continue
-                                prev_action = data["data"]["data"]["actions"][ai - back]
-                                if (prev_action["type"] == 1 and
-                                    prev_action["result"]["name"] == ".lq.RecordDiscardTile"):
-                                    rong_player = prev_action["result"]["data"]["seat"]
-                                    current_round_hand_data.huleData.append(
-                                        HuleSingleData(
-                                            seat=hule["seat"],
-                                            isNagashi=False,
-                                            rongPlayer=rong_player,
-                                            dadian=hule["dadian"],
-                                            han=hule["count"],
-                                            fu=hule["fu"],
-                                            fans=hule["fans"],
-                                        )
-                                    )
-                                    current_round_hand_data.deltaMain[hule["seat"]] += hule["dadian"]
-                                    current_round_hand_data.deltaMain[rong_player] -= hule["dadian"]
-                                    break
-
-                    round_data.hands.append(current_round_hand_data)
-
-                    for seat in range(self.player_n):
-                        current_round_hand_data.deltaSub[seat] = (
-                            (action["result"]["data"]["old_scores"][seat] - current_scores[seat])
-                            + action["result"]["data"]["delta_scores"][seat]
-                            - current_round_hand_data.deltaMain[seat]
                         )
+                        current_round_hand_data.deltaMain[hule["seat"]] += hule["dadian"]
+                        current_round_hand_data.deltaMain[deal_in_seat] -= hule["dadian"]
+
+                round_data.hands.append(current_round_hand_data)
+
+                for seat in range(self.player_n):
+                    current_round_hand_data.deltaSub[seat] = (
+                        (result_data["old_scores"][seat] - current_scores[seat])
+                        + result_data["delta_scores"][seat]
+                        - current_round_hand_data.deltaMain[seat]
+                    )
+
+            # 流局
+            elif name == ".lq.RecordNoTile":
+                if "scores" in result_data:
+                    scores_data = result_data["scores"]
+                    if scores_data:
+                        score = scores_data[0]
+                        for seat in range(self.player_n):
+                            old_score = score["old_scores"][seat] if "old_scores" in score else current_scores[seat]
+                            delta_score = score["delta_scores"][seat] if "delta_scores" in score else 0
+                            current_round_hand_data.deltaSub[seat] = (
+                                old_score - current_scores[seat] + delta_score
+                            )
+
+                        # 流し満貫
+                        if "seat" in score:
+                            hule_single_data = HuleSingleData(
+                                seat=score["seat"],
+                                isNagashi=True,
+                                rongPlayer=-1,
+                                dadian=0,
+                                han=0,
+                                fu=0,
+                                fans=((-1, 0),),
+                            )
+                            current_round_hand_data.huleData.append(hule_single_data)
+
+                round_data.hands.append(current_round_hand_data)
 
-                # 流局
-                elif action["result"]["name"] == ".lq.RecordNoTile":
-                    if "scores" in action["result"]["data"]:
-                        scores_data = action["result"]["data"]["scores"]
-                        if scores_data:
-                            score = scores_data[0]
-                            for seat in range(self.player_n):
-                                old_score = score["old_scores"][seat] if "old_scores" in score else current_scores[seat]
-                                delta_score = score["delta_scores"][seat] if "delta_scores" in score else 0
-                                current_round_hand_data.deltaSub[seat] = (
-                                    old_score - current_scores[seat] + delta_score
-                                )
-
-                            # 流し満貫
-                            if "seat" in score:
-                                hule_single_data = HuleSingleData(
-                                    seat=score["seat"],
-                                    isNagashi=True,
-                                    rongPlayer=-1,
-                                    dadian=0,
-                                    han=0,
-                                    fu=0,
-                                    fans=[{"id": -1, "val": 0}],
-                                )
-                                current_round_hand_data.huleData.append(hule_single_data)
-
-                    round_data.hands.append(current_round_hand_data)
-
-            # 思考時間とスタンプは集計対象外のため削除
-
-        return round_data
\ No newline at end of file
+        # ループ全体からこの間の読み込み・デコードを除いた時間をアクションの走査に計上
+        elapsed = time.perf_counter() - start
+        metrics.run.add_time("action_walk", elapsed - (reader.read_seconds - read_seconds)
+                             - (reader.decode_seconds - decode_seconds))
@@ -0,0 +1,172 @@
+"""Google Sheets APIのレート制限"""
+import json
+import random
+import re
+import threading
+import time
+from http import HTTPStatus
+from typing import Optional
+from urllib.parse import urlsplit
+
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+
+import metrics
+from config import (
+    SHEETS_READ_REQUESTS_PER_MINUTE, SHEETS_WRITE_REQUESTS_PER_MINUTE,
+    SHEETS_MAX_RETRIES, SHEETS_BACKOFF_BASE, SHEETS_BACKOFF_MAX, SHEETS_API_ENDPOINT
+)
+
+RETRY_STATUS_CODES = (HTTPStatus.REQUEST_TIMEOUT, HTTPStatus.TOO_MANY_REQUESTS)
+
+# URL末尾の :batchUpdate などのメソッド名（セル範囲の A1:B2 とは区別する）
+_CUSTOM_METHOD = re.compile(r":([a-z][A-Za-z]*)$")
+
+# gspread が使う Google API のURL（接続先を差し替える場合に置き換える）
+GOOGLE_API_ORIGINS = ("https://sheets.googleapis.com", "https://www.googleapis.com")
+
+
+class TokenBucket:
+    """1分あたりの予算を持つトークンバケット"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """トークンを1つ取得し、待機した秒数を返す"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class SheetsRateLimiter:
+    """読み込み・書き込みそれぞれの予算を管理し、失敗時の待機時間を決める"""
+
+    def __init__(self, read_per_minute: int, write_per_minute: int,
+                 max_retries: int, backoff_base: float, backoff_max: float):
+        self.read_bucket = TokenBucket(read_per_minute)
+        self.write_bucket = TokenBucket(write_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def acquire(self, method: str) -> float:
+        """リクエスト前に予算を確保する"""
+        if method.upper() == "GET":
+            return self.read_bucket.acquire()
+        return self.write_bucket.acquire()
+
+    def backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """attempt回目の再試行までの待機秒数（ジッター付き指数バックオフ）"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @staticmethod
+    def should_retry(code: int) -> bool:
+        return code in RETRY_STATUS_CODES or code >= HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+_shared_limiter: Optional[SheetsRateLimiter] = None
+_shared_limiter_lock = threading.Lock()
+
+
+def shared_limiter() -> SheetsRateLimiter:
+    """プロセス内で共有するレートリミッター"""
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            _shared_limiter = SheetsRateLimiter(
+                SHEETS_READ_REQUESTS_PER_MINUTE, SHEETS_WRITE_REQUESTS_PER_MINUTE,
+                SHEETS_MAX_RETRIES, SHEETS_BACKOFF_BASE, SHEETS_BACKOFF_MAX,
+            )
+        return _shared_limiter
+
+
+class RateLimitedHTTPClient(HTTPClient):
+    """すべてのリクエストを共有のレートリミッター経由で送るHTTPクライアント
+
+    gspread.authorize の http_client に渡して使う。
+    リクエスト数・再試行回数・送信バイト数・所要時間を metrics に記録する。
+    SHEETS_API_ENDPOINT が設定されていれば、Google API のURLをその接続先に置き換える。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limiter = shared_limiter()
+        self.api_endpoint = SHEETS_API_ENDPOINT
+
+    def request(self, method: str, endpoint: str, *args, **kwargs):
+        kind = request_kind(method, endpoint)
+        size = _payload_bytes(kwargs)
+        if self.api_endpoint:
+            endpoint = rewrite_endpoint(endpoint, self.api_endpoint)
+        attempt = 0
+        while True:
+            metrics.run.add_time("api_rate_limit_wait", self.limiter.acquire(method))
+            metrics.run.count("sheets_requests", kind=kind)
+            metrics.run.count("sheets_bytes_sent", size)
+            start = time.perf_counter()
+            try:
+                return super().request(method, endpoint, *args, **kwargs)
+            except APIError as err:
+                if attempt >= self.limiter.max_retries or not self.limiter.should_retry(err.code):
+                    raise
+                wait = self.limiter.backoff(attempt, err.response.headers.get("Retry-After"))
+                metrics.run.count("sheets_retries", kind=kind, code=err.code)
+                print(f"  API error {err.code}, retrying in {wait:.1f}s...")
+                time.sleep(wait)
+                attempt += 1
+            finally:
+                metrics.run.add_time(f"api.{kind}", time.perf_counter() - start)
+
+
+def request_kind(method: str, endpoint: str) -> str:
+    """リクエストの種類（spreadsheets.batchUpdate, values.update, drive.upload など）"""
+    path = urlsplit(endpoint).path
+    custom = _CUSTOM_METHOD.search(path)
+    if "/values" in path:
+        if custom:
+            return f"values.{custom.group(1)}"
+        return {"GET": "values.get", "PUT": "values.update"}.get(method.upper(), f"values.{method.lower()}")
+    if "/spreadsheets" in path:
+        if custom:
+            return f"spreadsheets.{custom.group(1)}"
+        return f"spreadsheets.{method.lower()}"
+    if "/drive/" in path:
+        return "drive.upload" if path.startswith("/upload/") else f"drive.{method.lower()}"
+    return f"{urlsplit(endpoint).netloc}.{method.lower()}"
+
+
+def rewrite_endpoint(endpoint: str, api_endpoint: str) -> str:
+    """Google API のURLを api_endpoint に置き換える（パスとクエリはそのまま）"""
+    for origin in GOOGLE_API_ORIGINS:
+        if endpoint.startswith(origin):
+            return api_endpoint.rstrip("/") + endpoint[len(origin):]
+    return endpoint
+
+
+def _payload_bytes(kwargs) -> int:
+    """リクエスト本文のバイト数"""
+    if kwargs.get("json") is not None:
+        return len(json.dumps(kwargs["json"], ensure_ascii=False).encode("utf-8"))
+    data = kwargs.get("data")
+    if isinstance(data, (bytes, str)):
+        return len(data)
+    return 0
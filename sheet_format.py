@@ -0,0 +1,97 @@
+"""シートの書式設定リクエストのビルダー"""
+import hashlib
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+# 新しく作るシートの最小行数
+MIN_SHEET_ROWS = 200
+
+
+class SheetFormat:
+    """1シート分の書式設定を溜めておき、まとめて1回のbatchUpdateで送る
+
+    セル範囲はA1形式で指定する。
+    """
+
+    def __init__(self):
+        # (A1範囲, 色)
+        self.backgrounds: List[Tuple[str, Dict[str, float]]] = []
+        # (A1範囲, 罫線の設定)
+        self.top_borders: List[Tuple[str, Dict]] = []
+
+    def __bool__(self):
+        return bool(self.backgrounds or self.top_borders)
+
+    def set_background(self, cell_range: str, color: Dict[str, float]):
+        """背景色を設定"""
+        self.backgrounds.append((cell_range, color))
+
+    def set_top_border(self, cell_range: str, style: str = "SOLID", width: int = 1):
+        """範囲の上辺に罫線を設定"""
+        self.top_borders.append((cell_range, {"style": style, "width": width}))
+
+    def to_requests(self, sheet_id: int) -> List[Dict]:
+        """Sheets APIのrepeatCell/updateBordersリクエストに変換
+
+        既存シートを上書きするときに前回の背景色・罫線が残らないよう、
+        先頭でシート全体の書式と罫線をリセットする。
+        """
+        # gspread は Google Sheets に出力する場合だけ読み込む
+        from gspread.utils import a1_range_to_grid_range
+
+        no_border = {"style": "NONE"}
+        requests = [
+            {"repeatCell": {"range": {"sheetId": sheet_id}, "cell": {}, "fields": "userEnteredFormat"}},
+            {"updateBorders": {
+                "range": {"sheetId": sheet_id},
+                "top": no_border, "bottom": no_border, "left": no_border, "right": no_border,
+                "innerHorizontal": no_border, "innerVertical": no_border,
+            }},
+        ]
+        for cell_range, color in self.backgrounds:
+            requests.append({
+                "repeatCell": {
+                    "range": a1_range_to_grid_range(cell_range, sheet_id),
+                    "cell": {"userEnteredFormat": {"backgroundColor": color}},
+                    "fields": "userEnteredFormat.backgroundColor",
+                }
+            })
+        for cell_range, border in self.top_borders:
+            requests.append({
+                "updateBorders": {
+                    "range": a1_range_to_grid_range(cell_range, sheet_id),
+                    "top": border,
+                }
+            })
+        return requests
+
+    def apply(self, worksheet):
+        """溜めた書式設定を1回のbatchUpdateで送信"""
+        worksheet.spreadsheet.batch_update({"requests": self.to_requests(worksheet.id)})
+
+
+def grid_rows(values: List[List], start_cell: str = "A1") -> int:
+    """values を start_cell から書き込むのに必要なシートの行数（最小 MIN_SHEET_ROWS）"""
+    start_row = int(re.search(r"\d+", start_cell).group())
+    return max(MIN_SHEET_ROWS, start_row - 1 + len(values))
+
+
+@dataclass
+class RenderedSheet:
+    """書き込み前のシート内容（値と書式）"""
+    title: str
+    values: List[List]
+    start_cell: str = "A1"
+    rows: int = MIN_SHEET_ROWS
+    cols: int = 26
+    sheet_format: SheetFormat = field(default_factory=SheetFormat)
+
+    def fingerprint(self) -> str:
+        """内容のハッシュ（変更検出に使う）"""
+        payload = json.dumps(
+            [self.start_cell, self.values, self.sheet_format.backgrounds, self.sheet_format.top_borders],
+            ensure_ascii=False, sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
@@ -0,0 +1,150 @@
+"""スプレッドシートのシート一覧キャッシュ"""
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from gspread import Worksheet
+
+
+class SpreadsheetMetadata:
+    """シート一覧を1回だけ取得し、追加・削除はローカルにも反映する
+
+    シートの追加・削除はそれぞれまとめて1回のbatchUpdateで送る。
+    """
+
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+        self._sheets: Optional[Dict[str, Dict]] = None  # シート名 -> properties
+        self._lock = threading.RLock()
+
+    def refresh(self):
+        """シート一覧を取得し直す"""
+        metadata = self.spreadsheet.fetch_sheet_metadata()
+        with self._lock:
+            self._sheets = {sheet["properties"]["title"]: sheet["properties"] for sheet in metadata["sheets"]}
+
+    def titles(self) -> List[str]:
+        """シート名の一覧（シートの並び順）"""
+        with self._lock:
+            sheets = self._load()
+            return sorted(sheets, key=lambda title: sheets[title].get("index", 0))
+
+    def has(self, title: str) -> bool:
+        with self._lock:
+            return title in self._load()
+
+    def worksheet(self, title: str) -> Optional[Worksheet]:
+        """キャッシュからWorksheetを作る（APIは呼ばない）"""
+        with self._lock:
+            properties = self._load().get(title)
+        if properties is None:
+            return None
+        return Worksheet(self.spreadsheet, properties, self.spreadsheet.id, self.spreadsheet.client)
+
+    def get_or_add(self, title: str, rows: int, cols: int, hidden: bool = False) -> Worksheet:
+        """シートを取得し、なければ追加する（既存シートが小さければ広げる）"""
+        self.add_missing([(title, rows, cols)], hidden=hidden)
+        self.expand([(title, rows, cols)])
+        return self.worksheet(title)
+
+    def expand(self, specs: Iterable[Tuple[str, int, int]]) -> List[str]:
+        """行数・列数が足りない既存シートをまとめて広げ、広げたシート名を返す"""
+        with self._lock:
+            sheets = self._load()
+            requests = []
+            resized = {}
+            for title, rows, cols in specs:
+                if title not in sheets:
+                    continue
+                grid = dict(resized.get(title) or sheets[title].get("gridProperties", {}))
+                if grid.get("rowCount", 0) >= rows and grid.get("columnCount", 0) >= cols:
+                    continue
+                grid["rowCount"] = max(grid.get("rowCount", 0), rows)
+                grid["columnCount"] = max(grid.get("columnCount", 0), cols)
+                resized[title] = grid
+            for title, grid in resized.items():
+                requests.append({"updateSheetProperties": {
+                    "properties": {"sheetId": sheets[title]["sheetId"], "gridProperties": grid},
+                    "fields": "gridProperties.rowCount,gridProperties.columnCount",
+                }})
+
+            if requests:
+                self.spreadsheet.batch_update({"requests": requests})
+                for title, grid in resized.items():
+                    sheets[title]["gridProperties"] = {**sheets[title].get("gridProperties", {}), **grid}
+            return list(resized)
+
+    def add_missing(self, specs: Iterable[Tuple[str, int, int]], hidden: bool = False) -> List[str]:
+        """存在しないシートをまとめて追加し、追加したシート名を返す"""
+        with self._lock:
+            sheets = self._load()
+            requests = []
+            added = []
+            for title, rows, cols in specs:
+                if title in sheets or title in added:
+                    continue
+                properties = {
+                    "title": title,
+                    "sheetType": "GRID",
+                    "gridProperties": {"rowCount": rows, "columnCount": cols},
+                }
+                if hidden:
+                    properties["hidden"] = True
+                requests.append({"addSheet": {"properties": properties}})
+                added.append(title)
+
+            if requests:
+                response = self.spreadsheet.batch_update({"requests": requests})
+                for reply in response["replies"]:
+                    properties = reply["addSheet"]["properties"]
+                    sheets[properties["title"]] = properties
+            return added
+
+    def delete(self, titles: Iterable[str]) -> List[str]:
+        """シートをまとめて削除し、削除したシート名を返す"""
+        with self._lock:
+            sheets = self._load()
+            targets = [title for title in dict.fromkeys(titles) if title in sheets]
+            if targets:
+                self.spreadsheet.batch_update({
+                    "requests": [{"deleteSheet": {"sheetId": sheets[title]["sheetId"]}} for title in targets]
+                })
+                for title in targets:
+                    del sheets[title]
+            return targets
+
+    def reorder(self, titles: Iterable[str]) -> int:
+        """titles をこの順で連続して並べ、位置が変わるシートだけをまとめて移動する
+
+        titles の先頭より前にある他のシートは前に、それ以外は後ろに置く。
+        """
+        with self._lock:
+            sheets = self._load()
+            current = self.titles()
+            ordered = [title for title in dict.fromkeys(titles) if title in sheets]
+            targets = set(ordered)
+            first = next((index for index, title in enumerate(current) if title in targets), len(current))
+            others = [title for title in current if title not in targets]
+            before = current[:first]
+            order = before + ordered + [title for title in others if title not in before]
+
+            # 先頭から確定させるため、移動は常に前方向になる
+            requests = []
+            for index, title in enumerate(order):
+                if current[index] != title:
+                    current.remove(title)
+                    current.insert(index, title)
+                    requests.append({"updateSheetProperties": {
+                        "properties": {"sheetId": sheets[title]["sheetId"], "index": index},
+                        "fields": "index",
+                    }})
+
+            if requests:
+                self.spreadsheet.batch_update({"requests": requests})
+                for index, title in enumerate(current):
+                    sheets[title]["index"] = index
+            return len(requests)
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._sheets is None:
+            self.refresh()
+        return self._sheets
@@ -1,32 +1,117 @@
 """Google Sheetsへのエクスポート処理（統合版）"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import gspread
+from google.auth.credentials import AnonymousCredentials
 from google.oauth2.service_account import Credentials
-from typing import List, Dict
-from data_structures import RoundData, PlayerData
-from config import CREDENTIAL_FILE, SPREADSHEET_ID, load_fans, DORA_FANS, ORIGIN_POINT_3, ORIGIN_POINT_4
-import time
-
-class SheetsExporter:
-    def __init__(self):
-        # Google Sheets APIの認証
-        scope = [
-            'https://spreadsheets.google.com/feeds',
-            'https://www.googleapis.com/auth/spreadsheets',
-            'https://www.googleapis.com/auth/drive.file',
-            'https://www.googleapis.com/auth/drive'
-        ]
-
-        creds = Credentials.from_service_account_file(str(CREDENTIAL_FILE), scopes=scope)
-        self.client = gspread.authorize(creds)
-        self.spreadsheet = self.client.open_by_key(SPREADSHEET_ID)
-        self.fan_names = load_fans()
-
-    def clean_all_sheets(self):
-        """すべての既存シートを削除（デフォルトシート以外）"""
+from typing import Iterable, List, Dict, Optional
+from exporter import Exporter, division_sheet_order
+from sheet_format import SheetFormat, RenderedSheet
+from sheet_metadata import SpreadsheetMetadata
+from rate_limiter import RateLimitedHTTPClient
+from checkpoint import CheckpointJournal
+from token_cache import load_token, save_token
+import metrics
+from gspread.utils import absolute_range_name
+from config import (
+    CREDENTIAL_FILE, SPREADSHEET_ID, PUBLISH_MAX_PAYLOAD_BYTES, SHEETS_API_ENDPOINT, TOKEN_CACHE_FILE
+)
+
+# シートごとの内容ハッシュを保存する非表示シート
+FINGERPRINT_SHEET = "_fingerprints"
+
+# Google Sheets APIのスコープ
+SCOPES = [
+    'https://spreadsheets.google.com/feeds',
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive.file',
+    'https://www.googleapis.com/auth/drive'
+]
+
+def open_spreadsheet():
+    """認証してスプレッドシートを開く（アクセストークンは期限までキャッシュを使う）"""
+    with metrics.run.timer("auth"):
+        if SHEETS_API_ENDPOINT:
+            # ローカルの代替サーバーは認証しない
+            print(f"Using Sheets API endpoint: {SHEETS_API_ENDPOINT}")
+            creds = AnonymousCredentials()
+        else:
+            creds = Credentials.from_service_account_file(str(CREDENTIAL_FILE), scopes=SCOPES)
+            if load_token(creds, TOKEN_CACHE_FILE):
+                metrics.run.count("oauth_token_cache_hits")
+        token = getattr(creds, "token", None)
+        # リクエストはすべて共有のレートリミッターを通す
+        client = gspread.authorize(creds, http_client=RateLimitedHTTPClient)
+        spreadsheet = client.open_by_key(SPREADSHEET_ID)
+    if not SHEETS_API_ENDPOINT and getattr(creds, "token", None) != token:
+        try:
+            save_token(creds, TOKEN_CACHE_FILE)
+        except OSError as e:
+            print(f"Warning: Could not cache OAuth token: {e}")
+    return spreadsheet
+
+class SheetsExporter(Exporter):
+    """Google Sheetsへの出力"""
+
+    def __init__(self, incremental: bool = False, deferred: bool = False, spreadsheet=None,
+                 journal: Optional[CheckpointJournal] = None):
+        super().__init__(incremental, deferred)
+        self._lock = threading.RLock()
+        self._spreadsheet = spreadsheet
+        self._sheets = None
+        self._connection = None
+        if spreadsheet is None:
+            # 認証とシート一覧の取得はバックグラウンドで行い、牌譜のパースと並行させる
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sheets-auth")
+            self._connection = executor.submit(self._connect)
+            executor.shutdown(wait=False)
+
+        self._fingerprints = None
+        self._fingerprints_dirty = False
+        self._pending: List[RenderedSheet] = []
+
+        # 再開用: 書き込みが完了したシートを記録し、再開時は記録済みのシートを書き込まない
+        self.journal = journal
+
+    @staticmethod
+    def _connect():
+        spreadsheet = open_spreadsheet()
+        # シート一覧は1回だけ取得し、以降はローカルで管理する
+        sheets = SpreadsheetMetadata(spreadsheet)
+        sheets.refresh()
+        return spreadsheet, sheets
+
+    def _wait_connection(self):
+        """バックグラウンドの認証が終わるまで待つ"""
+        with self._lock:
+            if self._connection is not None:
+                with metrics.run.timer("auth_wait"):
+                    self._spreadsheet, self._sheets = self._connection.result()
+                self._connection = None
+            elif self._sheets is None:
+                self._sheets = SpreadsheetMetadata(self._spreadsheet)
+
+    @property
+    def spreadsheet(self):
+        if self._sheets is None:
+            self._wait_connection()
+        return self._spreadsheet
+
+    @property
+    def sheets(self) -> SpreadsheetMetadata:
+        if self._sheets is None:
+            self._wait_connection()
+        return self._sheets
+
+    @property
+    def keeps_existing_sheets(self) -> bool:
+        """既存シートを削除せずに出力するか（差分出力・中断した出力の再開）"""
+        return self.incremental or (self.journal is not None and self.journal.resumed)
+
+    def clean_all_sheets(self, keep: Iterable[str] = ()):
+        """すべての既存シートを削除（デフォルトシートと keep 以外）"""
         try:
-            # 現在のすべてのシートを取得
-            worksheets = self.spreadsheet.worksheets()
-
             # 削除対象のパターン
             patterns_to_delete = [
                 "【四麻】", "【三麻】",
@@ -34,21 +119,7 @@ class SheetsExporter:
                 "Match", "_4P", "_3P"
             ]
 
-            sheets_to_delete = []
-            for ws in worksheets:
-                # 削除対象のパターンにマッチするシートを探す
-                if any(pattern in ws.title for pattern in patterns_to_delete):
-                    sheets_to_delete.append(ws.title)
-
-            # シートを削除
-            for sheet_name in sheets_to_delete:
-                try:
-                    worksheet = self.spreadsheet.worksheet(sheet_name)
-                    self.spreadsheet.del_worksheet(worksheet)
-                    print(f"  Deleted sheet: {sheet_name}")
-                except Exception as e:
-                    print(f"  Could not delete sheet {sheet_name}: {e}")
-                time.sleep(2)  # API制限対策
+            sheets_to_delete = self._delete_matching_sheets(patterns_to_delete, keep=keep)
 
             if sheets_to_delete:
                 print(f"  Total {len(sheets_to_delete)} sheets deleted")
@@ -61,30 +132,10 @@ class SheetsExporter:
     def clean_mahjong_sheets(self, player_n: int):
         """指定された人数の既存シートを削除"""
         try:
-            # 現在のすべてのシートを取得
-            worksheets = self.spreadsheet.worksheets()
-
             # 削除対象のパターン
-            if player_n == 4:
-                patterns_to_delete = ["【四麻】", "Match", "_4P"]
-            else:
-                patterns_to_delete = ["【三麻】", "_3P"]
-
-            sheets_to_delete = []
-            for ws in worksheets:
-                # 削除対象のパターンにマッチするシートを探す
-                if any(pattern in ws.title for pattern in patterns_to_delete):
-                    sheets_to_delete.append(ws.title)
-
-            # シートを削除
-            for sheet_name in sheets_to_delete:
-                try:
-                    worksheet = self.spreadsheet.worksheet(sheet_name)
-                    self.spreadsheet.del_worksheet(worksheet)
-                    print(f"  Deleted sheet: {sheet_name}")
-                except Exception as e:
-                    print(f"  Could not delete sheet {sheet_name}: {e}")
-                time.sleep(2)  # API制限対策
+            patterns_to_delete = self._division_patterns(player_n)
+
+            sheets_to_delete = self._delete_matching_sheets(patterns_to_delete)
 
             if sheets_to_delete:
                 print(f"  Total {len(sheets_to_delete)} {'四麻' if player_n == 4 else '三麻'} sheets deleted")
@@ -94,274 +145,193 @@ class SheetsExporter:
         except Exception as e:
             print(f"Warning: Could not clean {'四麻' if player_n == 4 else '三麻'} sheets: {e}")
 
-    def export_round_sheet(self, round_data: RoundData, sheet_name: str, player_n: int, player_data_dict: Dict[str, PlayerData]):
-        """半荘のデータをシートに出力"""
-        try:
-            worksheet = self.spreadsheet.worksheet(sheet_name)
-        except gspread.exceptions.WorksheetNotFound:
-            worksheet = self.spreadsheet.add_worksheet(title=sheet_name, rows=200, cols=26)
-
-        # データを準備
-        all_values = []
-
-        # 牌譜リンク
-        paifu_url = f'https://game.mahjongsoul.com/?paipu={round_data.uuid}'
-        row1 = [f'=HYPERLINK("{paifu_url}", "牌譜")'] + [''] * (player_n + 4)
-        all_values.append(row1)
-
-        # 方角行
-        directions = ["東", "南", "西", "北"][:player_n]
-        row2 = ["", "", ""] + directions + ["(供託)", "(和了詳細)"]
-        all_values.append(row2)
-
-        # 空行
-        row3 = [""] * (player_n + 5)
-        all_values.append(row3)
-
-        # HN行とプレイヤー名行
-        row4 = ["", "", "HN"] + round_data.names + ["", ""]
-        all_values.append(row4)
-
-        # 各局のデータ
-        origin_point = ORIGIN_POINT_3 if player_n == 3 else ORIGIN_POINT_4
-        scores = [origin_point] * player_n + [0]
-
-        for hand in round_data.hands:
-            # スコア表示行
-            score_row = ["", "", ""] + [scores[i] for i in range(player_n)] + [scores[player_n], ""]
-            all_values.append(score_row)
-
-            # 和了詳細テキスト作成
-            hule_text = ""
-            for hule in hand.huleData:
-                if len(hule_text) > 0:
-                    hule_text += "\n"
-                if hule.isNagashi:
-                    hule_text += f"{round_data.names[hule.seat]} 流し満貫 8000"
-                else:
-                    hule_text += f"{round_data.names[hule.seat]} "
-                    hule_text += "ツモ" if hule.rongPlayer == -1 else "ロン"
-                    hule_text += f" {hule.dadian}\n"
-                    hule_text += hule.get_fans_text(self.fan_names, DORA_FANS)
-
-            # 局情報と点数変動行（局情報をB列、C列は空）
-            delta_main_row = ["", hand.roundStr, ""] + [hand.deltaMain[i] if hand.deltaMain[i] != 0 else "" for i in range(player_n)] + ["", hule_text]
-            all_values.append(delta_main_row)
-
-            # 供託変動行
-            delta_sub_other = -sum(hand.deltaSub)
-            delta_sub_row = ["", "", ""] + [hand.deltaSub[i] if hand.deltaSub[i] != 0 else "" for i in range(player_n)] + [delta_sub_other if delta_sub_other != 0 else "", ""]
-            all_values.append(delta_sub_row)
-
-            # スコア更新
-            for i in range(player_n):
-                scores[i] += hand.deltaMain[i] + hand.deltaSub[i]
-            scores[player_n] += delta_sub_other
-
-        # 最終スコア行
-        final_score_row = ["", "", ""] + [scores[i] for i in range(player_n)] + [scores[player_n], ""]
-        all_values.append(final_score_row)
-
-        # 最終得点行（JSONのtotal_pointを1000で割った値）
-        final_points_row = ["", "", ""]
-        for i in range(player_n):
-            final_score = round_data.scores[i] / 1000
-            final_points_row.append(final_score)
-        final_points_row.extend(["", ""])
-        all_values.append(final_points_row)
-
-        # 一括更新
-        worksheet.clear()
-        if all_values:
-            worksheet.update('A1', all_values, value_input_option='USER_ENTERED')
-
-        # チーム色の設定
-        self._apply_team_colors(worksheet, round_data, player_data_dict, player_n)
-
-        # 少し待機（レート制限対策）
-        time.sleep(10)
-
-    def export_player_sheet(self, player_data_dict: Dict[str, PlayerData], player_n: int):
-        """プレイヤーデータをシートに出力"""
-        sheet_name = f"【{'四麻' if player_n == 4 else '三麻'}】プレイヤーデータ"
+    def clean_summary_sheets(self):
+        """総合結果シートのみを削除"""
         try:
-            worksheet = self.spreadsheet.worksheet(sheet_name)
-        except gspread.exceptions.WorksheetNotFound:
-            worksheet = self.spreadsheet.add_worksheet(title=sheet_name, rows=200, cols=10)
-
-        # データ準備
-        all_values = []
-
-        # 空行
-        all_values.append([])
-
-        # ヘッダー
-        header = ["HN", "スコア", "最大和了", "支払合計", "ドラ合計", "レア役"]
-        all_values.append(header)
-
-        # データ
-        for name, player_data in player_data_dict.items():
-            for player_single_data in player_data.dataList:
-                rare_fans_text = ",".join([
-                    self.fan_names[str(fan_id)]
-                    for fan_id in player_single_data.rareFans
-                ])
-
-                row_data = [
-                    name,
-                    player_single_data.score,
-                    player_single_data.maxHule,
-                    player_single_data.paySum,
-                    player_single_data.doraCount,
-                    rare_fans_text,
-                ]
-                all_values.append(row_data)
-
-        # 一括更新
-        worksheet.clear()
-        if all_values:
-            worksheet.update('B1', all_values, value_input_option='USER_ENTERED')
-
-        # 少し待機
-        time.sleep(10)
-
-    def export_total_result_sheet(self, round_data_list: List[RoundData], player_data_dict: Dict[str, PlayerData], player_n: int):
-        """総合結果をシートに出力"""
-        sheet_name = f"【{'四麻' if player_n == 4 else '三麻'}】総合結果"
-        try:
-            worksheet = self.spreadsheet.worksheet(sheet_name)
-        except gspread.exceptions.WorksheetNotFound:
-            worksheet = self.spreadsheet.add_worksheet(title=sheet_name, rows=200, cols=10)
-
-        # データ準備
-        all_values = []
-
-        # 空行
-        all_values.append([])
-
-        # チーム名とマッピング
-        if player_n == 4:
-            teams = ["青チーム", "赤チーム", "白チーム", "黒チーム"]
-        else:
-            teams = ["チームA", "チームB", "チームC"]
-
-        # 空行
-        all_values.append([])
-
-        # ヘッダー（B列から開始）
-        header_row = [""] + teams[:player_n]
-        all_values.append(header_row)
-
-        # データ
-        team_totals = [0] * player_n
-        for round_data in round_data_list:
-            row_data = [""] + [""] * player_n  # A列は空、B列から開始
-            for i in range(player_n):
-                player_name = round_data.names[i]
-                if player_name in player_data_dict:
-                    team = player_data_dict[player_name].team
-                    score = round_data.scores[i] / 1000
-
-                    # チームに応じてカラムを決定
-                    if player_n == 4:
-                        team_to_col = {"青チーム": 0, "赤チーム": 1, "白チーム": 2, "黒チーム": 3}
-                    else:
-                        team_to_col = {"チームA": 0, "チームB": 1, "チームC": 2}
-
-                    col = team_to_col.get(team, 0)
-                    if col < player_n:
-                        row_data[col + 1] = score  # +1でB列から開始
-                        team_totals[col] += score
-
-            all_values.append(row_data)
-
-        # 合計行を追加
-        total_row = ["合計"] + team_totals
-        all_values.append(total_row)
-
-        # 一括更新
-        worksheet.clear()
-        if all_values:
-            worksheet.update('A1', all_values, value_input_option='USER_ENTERED')
-
-            # ヘッダー行に色を適用
-            self._apply_total_header_colors(worksheet, player_n)
-
-            # 合計行の上に罫線を追加
-            total_row_index = len(all_values)
-            range_start = f"A{total_row_index}"
-            range_end = chr(ord('A') + player_n) + str(total_row_index)
-            worksheet.format(f"{range_start}:{range_end}", {
-                "borders": {
-                    "top": {"style": "SOLID", "width": 1}
-                }
+            self._delete_matching_sheets(["総合結果"])
+        except Exception as e:
+            print(f"Warning: Could not clean summary sheets: {e}")
+
+    def _delete_matching_sheets(self, patterns: List[str], keep: Iterable[str] = ()) -> List[str]:
+        """パターンにマッチするシートを1回のbatchUpdateで削除"""
+        keep = set(keep)
+        sheets_to_delete = [
+            title for title in self.sheets.titles()
+            if title not in keep and any(pattern in title for pattern in patterns)
+        ]
+        deleted = self.sheets.delete(sheets_to_delete)
+        for sheet_name in deleted:
+            print(f"  Deleted sheet: {sheet_name}")
+        return deleted
+
+    def write_sheet(self, rendered: RenderedSheet) -> bool:
+        """シート内容を書き込む（差分出力で変更がなければスキップしてFalseを返す）"""
+        self._written_titles.add(rendered.title)
+        fingerprint = rendered.fingerprint()
+        if self.incremental and self._is_unchanged(rendered.title, fingerprint):
+            print(f"  Unchanged, skipped: {rendered.title}")
+            return False
+        if self.journal is not None and self.journal.is_done(rendered.title, fingerprint) and self.sheets.has(rendered.title):
+            print(f"  Already written, skipped: {rendered.title}")
+            with self._lock:
+                if self._load_fingerprints().get(rendered.title) != fingerprint:
+                    self._fingerprints[rendered.title] = fingerprint
+                    self._fingerprints_dirty = True
+            return False
+
+        if self.deferred:
+            self._pending.append(rendered)
+            return True
+
+        with metrics.run.timer("write"):
+            worksheet = self.sheets.get_or_add(rendered.title, rendered.rows, rendered.cols)
+
+            # 一括更新
+            worksheet.clear()
+            if rendered.values:
+                worksheet.update(rendered.start_cell, rendered.values, value_input_option='USER_ENTERED')
+
+            self._apply_format(worksheet, rendered.sheet_format)
+
+        if self.journal is not None:
+            self.journal.record(rendered.title, fingerprint)
+        with self._lock:
+            self._load_fingerprints()[rendered.title] = fingerprint
+            self._fingerprints_dirty = True
+        return True
+
+    def flush(self):
+        """溜めたシートをまとめて送信
+
+        シートの追加・値のクリア・値の書き込み・書式設定をそれぞれ1回ずつ送る。
+        ペイロードが上限を超える場合のみ分割する。
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        print(f"  Publishing {len(pending)} sheets...")
+        with metrics.run.timer("publish"):
+            self._publish(pending)
+
+        if self.journal is not None:
+            for rendered in pending:
+                self.journal.record(rendered.title, rendered.fingerprint())
+        with self._lock:
+            fingerprints = self._load_fingerprints()
+            for rendered in pending:
+                fingerprints[rendered.title] = rendered.fingerprint()
+            self._fingerprints_dirty = True
+
+    def _publish(self, pending: List[RenderedSheet]):
+        """シートの追加・拡張・値のクリア・値の書き込み・書式設定を送る"""
+        specs = [(rendered.title, rendered.rows, rendered.cols) for rendered in pending]
+        self.sheets.add_missing(specs)
+        # 前回より行数が増えたシートは書き込む前に広げる
+        self.sheets.expand(specs)
+
+        self.spreadsheet.values_batch_clear(body={
+            "ranges": [absolute_range_name(rendered.title) for rendered in pending]
+        })
+
+        value_ranges = [
+            {"range": absolute_range_name(rendered.title, rendered.start_cell), "values": rendered.values}
+            for rendered in pending if rendered.values
+        ]
+        for chunk in _chunk_by_size(value_ranges, PUBLISH_MAX_PAYLOAD_BYTES):
+            self.spreadsheet.values_batch_update(body={
+                "valueInputOption": "USER_ENTERED",
+                "data": chunk,
             })
 
-        # 少し待機
-        time.sleep(10)
-
-    def _apply_team_colors(self, worksheet, round_data: RoundData, player_data_dict: Dict[str, PlayerData], player_n: int):
-        """チーム色を適用"""
+        format_requests = []
+        for rendered in pending:
+            format_requests.extend(rendered.sheet_format.to_requests(self.sheets.worksheet(rendered.title).id))
         try:
-            # チーム色の定義
-            if player_n == 4:
-                team_colors = {
-                    "青チーム": {"red": 0.788, "green": 0.855, "blue": 0.972},
-                    "赤チーム": {"red": 0.957, "green": 0.8, "blue": 0.8},
-                    "白チーム": {"red": 1, "green": 1, "blue": 1},
-                    "黒チーム": {"red": 0.851, "green": 0.851, "blue": 0.851},
-                }
-            else:
-                team_colors = {
-                    "チームA": {"red": 0.788, "green": 0.855, "blue": 0.972},
-                    "チームB": {"red": 0.957, "green": 0.8, "blue": 0.8},
-                    "チームC": {"red": 1, "green": 1, "blue": 1},
-                }
-
-            # プレイヤー名の背景色設定
-            for i, name in enumerate(round_data.names):
-                if name in player_data_dict:
-                    team = player_data_dict[name].team
-                    if team in team_colors:
-                        # プレイヤー名のセル（D4からの位置）
-                        cell = chr(ord('D') + i) + '4'
-                        worksheet.format(cell, {
-                            "backgroundColor": team_colors[team]
-                        })
-
-                        # 方角のセル（D2からの位置）
-                        direction_cell = chr(ord('D') + i) + '2'
-                        worksheet.format(direction_cell, {
-                            "backgroundColor": team_colors[team]
-                        })
+            for chunk in _chunk_by_size(format_requests, PUBLISH_MAX_PAYLOAD_BYTES):
+                self.spreadsheet.batch_update({"requests": chunk})
+        except Exception as e:
+            print(f"Warning: Could not apply formats: {e}")
 
+    def sort_division_sheets(self):
+        """四麻・三麻のシートを順番通りに並べ直す（並行出力・差分出力・watch で末尾に追加されたシートを戻す）"""
+        try:
+            titles = [title for title in self.sheets.titles() if title.startswith(("【四麻】", "【三麻】"))]
+            self.sheets.reorder(sorted(titles, key=division_sheet_order))
         except Exception as e:
-            print(f"Warning: Could not apply team colors: {e}")
+            print(f"Warning: Could not reorder sheets: {e}")
 
-    def _apply_total_header_colors(self, worksheet, player_n: int):
-        """総合結果のヘッダーにチーム色を適用"""
+    def remove_stale_sheets(self, player_n: int):
+        """この実行で出力しなかった指定人数のシートを削除（差分出力・再開用）"""
         try:
-            # チーム色の定義
-            if player_n == 4:
-                team_colors = [
-                    {"red": 0.788, "green": 0.855, "blue": 0.972},  # 青チーム
-                    {"red": 0.957, "green": 0.8, "blue": 0.8},      # 赤チーム
-                    {"red": 1, "green": 1, "blue": 1},              # 白チーム
-                    {"red": 0.851, "green": 0.851, "blue": 0.851},  # 黒チーム
-                ]
-            else:
-                team_colors = [
-                    {"red": 0.788, "green": 0.855, "blue": 0.972},  # チームA
-                    {"red": 0.957, "green": 0.8, "blue": 0.8},      # チームB
-                    {"red": 1, "green": 1, "blue": 1},              # チームC
-                ]
-
-            # ヘッダー行（2行目）の各チーム列に色を適用
-            for i in range(player_n):
-                cell = chr(ord('B') + i) + '2'
-                worksheet.format(cell, {
-                    "backgroundColor": team_colors[i]
-                })
+            deleted = self._delete_matching_sheets(self._division_patterns(player_n), keep=self._written_titles)
+        except Exception as e:
+            print(f"Warning: Could not remove stale sheets: {e}")
+            return
+        with self._lock:
+            if self._fingerprints is not None:
+                for title in deleted:
+                    if self._fingerprints.pop(title, None):
+                        self._fingerprints_dirty = True
+
+    def save_fingerprints(self):
+        """シートの内容ハッシュを非表示シートに保存"""
+        if not self._fingerprints_dirty:
+            return
+        rows = [["sheet", "fingerprint"]] + sorted([title, fp] for title, fp in self._fingerprints.items())
+        try:
+            worksheet = self.sheets.get_or_add(FINGERPRINT_SHEET, len(rows), 2, hidden=True)
+            # 行数を合わせてから上書きする（古い行は縮小で消える）
+            if worksheet.row_count != len(rows):
+                worksheet.resize(rows=len(rows))
+            worksheet.update('A1', rows, value_input_option='RAW')
+            self._fingerprints_dirty = False
+        except Exception as e:
+            print(f"Warning: Could not save sheet fingerprints: {e}")
+
+    def _load_fingerprints(self) -> Dict[str, str]:
+        """保存済みの内容ハッシュを読み込む"""
+        with self._lock:
+            if self._fingerprints is None:
+                worksheet = self.sheets.worksheet(FINGERPRINT_SHEET)
+                rows = worksheet.get_all_values() if worksheet is not None else []
+                self._fingerprints = {row[0]: row[1] for row in rows[1:] if len(row) >= 2}
+            return self._fingerprints
+
+    def _is_unchanged(self, title: str, fingerprint: str) -> bool:
+        """シートが存在し、内容ハッシュが一致するか"""
+        return self.sheets.has(title) and self._load_fingerprints().get(title) == fingerprint
+
+    @staticmethod
+    def _division_patterns(player_n: int) -> List[str]:
+        """指定人数のシート名のパターン"""
+        if player_n == 4:
+            return ["【四麻】", "Match", "_4P"]
+        return ["【三麻】", "_3P"]
 
+    def _apply_format(self, worksheet, sheet_format: SheetFormat):
+        """書式設定をまとめて適用"""
+        try:
+            sheet_format.apply(worksheet)
         except Exception as e:
-            print(f"Warning: Could not apply total header colors: {e}")
\ No newline at end of file
+            print(f"Warning: Could not apply format to {worksheet.title}: {e}")
+
+
+
+def _chunk_by_size(items: List, max_bytes: int) -> List[List]:
+    """JSONにしたときのサイズが max_bytes を超えないように分割"""
+    chunks = []
+    chunk = []
+    size = 0
+    for item in items:
+        item_size = len(json.dumps(item, ensure_ascii=False).encode("utf-8"))
+        if chunk and size + item_size > max_bytes:
+            chunks.append(chunk)
+            chunk = []
+            size = 0
+        chunk.append(item)
+        size += item_size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
@@ -0,0 +1,474 @@
+"""Google Sheets APIのローカル代替サーバー（負荷試験用）
+
+gspread が使う Sheets v4 と Drive v3 の一部（xlsx のアップロードによる変換を含む）をメモリ上で処理する。
+応答の遅延・1分あたりのクォータ・429の注入を設定できる。
+
+    python sheets_stub_server.py --port 8765 --write-per-minute 60 --error-rate 0.05
+
+config.SHEETS_API_ENDPOINT（環境変数 MAHJONG_SHEETS_ENDPOINT）に
+http://127.0.0.1:8765 を指定すると、SheetsExporter はこのサーバーに接続する。
+"""
+import argparse
+import email.parser
+import io
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit, parse_qs
+
+from gspread.utils import a1_range_to_grid_range
+
+from config import SPREADSHEET_ID
+
+_SPREADSHEET_PATH = re.compile(r"^/v4/spreadsheets/([^/:]+)(.*)$")
+_DRIVE_FILE_PATH = re.compile(r"^/drive/v3/files/([^/]+)$")
+_DRIVE_UPLOAD_PATH = re.compile(r"^/upload/drive/v3/files/([^/]+)$")
+
+
+class StubError(Exception):
+    def __init__(self, code: int, message: str, status: str = "INVALID_ARGUMENT", retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+        self.status = status
+        self.retry_after = retry_after
+
+    def body(self) -> Dict:
+        return {"error": {"code": self.code, "message": str(self), "status": self.status}}
+
+
+class StubSheetsBackend:
+    """スプレッドシートをメモリ上に保持し、Sheets v4 APIの一部を処理する"""
+
+    def __init__(self, latency: float = 0.0, read_per_minute: Optional[int] = None,
+                 write_per_minute: Optional[int] = None, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.read_per_minute = read_per_minute
+        self.write_per_minute = write_per_minute
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.spreadsheets: Dict[str, Dict] = {}
+        self.request_log: List[Tuple[str, str]] = []
+        self._reads = deque()
+        self._writes = deque()
+
+    def create_spreadsheet(self, spreadsheet_id: str, title: str = "stub"):
+        now = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+        self.spreadsheets[spreadsheet_id] = {"title": title, "sheets": [], "next_id": 1, "created": now}
+        self._add_sheet(self.spreadsheets[spreadsheet_id], {"title": "シート1"})
+
+    def handle(self, method: str, path: str, query: Dict[str, List[str]], body: Optional[Dict],
+               media: bytes = b"", content_type: str = "") -> Tuple[int, Dict, Dict[str, str]]:
+        """1リクエストを処理し、(ステータス, レスポンス, ヘッダー) を返す
+
+        media と content_type はアップロード（JSON以外の本文）の場合に渡す。
+        """
+        method = method.upper()
+        if self.latency:
+            time.sleep(self.latency)
+        try:
+            with self.lock:
+                self.request_log.append((method, path))
+                self._check_quota(method)
+                if self.error_rate and self.random.random() < self.error_rate:
+                    raise StubError(429, "Injected quota error", "RESOURCE_EXHAUSTED")
+                upload = _DRIVE_UPLOAD_PATH.match(path)
+                if upload and method in ("PATCH", "PUT"):
+                    return 200, self._drive_import(upload.group(1), media, content_type), {}
+                return 200, self._dispatch(method, path, query, body or {}), {}
+        except StubError as e:
+            headers = {"Retry-After": str(e.retry_after)} if e.retry_after is not None else {}
+            return e.code, e.body(), headers
+
+    def _check_quota(self, method: str):
+        """1分あたりのクォータを超えていたら429"""
+        limit, window = (self.read_per_minute, self._reads) if method == "GET" else (self.write_per_minute, self._writes)
+        if limit is None:
+            return
+        now = time.monotonic()
+        while window and now - window[0] >= 60:
+            window.popleft()
+        if len(window) >= limit:
+            raise StubError(429, "Quota exceeded", "RESOURCE_EXHAUSTED",
+                            retry_after=math.ceil(60 - (now - window[0])))
+        window.append(now)
+
+    def _dispatch(self, method: str, path: str, query: Dict[str, List[str]], body: Dict) -> Dict:
+        drive_match = _DRIVE_FILE_PATH.match(path)
+        if drive_match and method == "GET":
+            return self._drive_file(drive_match.group(1))
+        match = _SPREADSHEET_PATH.match(path)
+        if not match:
+            raise StubError(404, f"Unknown path: {path}", "NOT_FOUND")
+        spreadsheet_id, rest = match.group(1), unquote(match.group(2))
+        spreadsheet = self.spreadsheets.get(spreadsheet_id)
+        if spreadsheet is None:
+            raise StubError(404, "Requested entity was not found.", "NOT_FOUND")
+
+        if rest == "" and method == "GET":
+            return self._metadata(spreadsheet_id, spreadsheet)
+        if rest == ":batchUpdate" and method == "POST":
+            return self._batch_update(spreadsheet_id, spreadsheet, body)
+        if rest == "/values:batchUpdate" and method == "POST":
+            responses = [self._values_update(spreadsheet, data["range"], data.get("values", [])) for data in body.get("data", [])]
+            return {"spreadsheetId": spreadsheet_id, "responses": responses,
+                    "totalUpdatedCells": sum(r["updatedCells"] for r in responses)}
+        if rest == "/values:batchClear" and method == "POST":
+            for cell_range in body.get("ranges", []):
+                self._values_clear(spreadsheet, cell_range)
+            return {"spreadsheetId": spreadsheet_id, "clearedRanges": body.get("ranges", [])}
+        if rest.startswith("/values/"):
+            cell_range = rest[len("/values/"):]
+            if method == "POST" and cell_range.endswith(":clear"):
+                cell_range = cell_range[:-len(":clear")]
+                self._values_clear(spreadsheet, cell_range)
+                return {"spreadsheetId": spreadsheet_id, "clearedRange": cell_range}
+            if method == "PUT":
+                return dict(self._values_update(spreadsheet, cell_range, body.get("values", [])), spreadsheetId=spreadsheet_id)
+            if method == "GET":
+                return {"range": cell_range, "majorDimension": "ROWS", "values": self._values_get(spreadsheet, cell_range)}
+        raise StubError(404, f"Unsupported request: {method} {path}", "NOT_FOUND")
+
+    def _drive_file(self, file_id: str) -> Dict:
+        """Drive のファイル情報（スプレッドシートのみ）"""
+        spreadsheet = self.spreadsheets.get(file_id)
+        if spreadsheet is None:
+            raise StubError(404, f"File not found: {file_id}.", "NOT_FOUND")
+        return {
+            "kind": "drive#file",
+            "id": file_id,
+            "name": spreadsheet["title"],
+            "mimeType": "application/vnd.google-apps.spreadsheet",
+            "createdTime": spreadsheet["created"],
+            "modifiedTime": spreadsheet["created"],
+        }
+
+    def _drive_import(self, file_id: str, media: bytes, content_type: str) -> Dict:
+        """xlsx をアップロードしてスプレッドシートの内容を置き換える（値のみ。書式は無視する）"""
+        from openpyxl import load_workbook
+
+        spreadsheet = self.spreadsheets.get(file_id)
+        if spreadsheet is None:
+            raise StubError(404, f"File not found: {file_id}.", "NOT_FOUND")
+        if content_type.startswith("multipart/"):
+            message = email.parser.BytesParser().parsebytes(
+                b"Content-Type: " + content_type.encode("ascii") + b"\r\n\r\n" + media)
+            parts = message.get_payload()
+            if not message.is_multipart() or len(parts) != 2:
+                raise StubError(400, "Multipart upload must have metadata and media parts")
+            media = parts[1].get_payload(decode=True)
+        try:
+            workbook = load_workbook(io.BytesIO(media))
+        except Exception as e:
+            raise StubError(400, f"Unable to convert the uploaded file: {e}")
+
+        spreadsheet["sheets"] = []
+        for worksheet in workbook.worksheets:
+            properties = self._add_sheet(spreadsheet, {
+                "title": worksheet.title,
+                "gridProperties": {"rowCount": max(worksheet.max_row, 1000), "columnCount": max(worksheet.max_column, 26)},
+            })
+            cells = spreadsheet["sheets"][properties["index"]]["cells"]
+            for row in worksheet.iter_rows():
+                for cell in row:
+                    if cell.value not in (None, ""):
+                        cells[(cell.row - 1, cell.column - 1)] = cell.value
+        return self._drive_file(file_id)
+
+    def _metadata(self, spreadsheet_id: str, spreadsheet: Dict) -> Dict:
+        return {
+            "spreadsheetId": spreadsheet_id,
+            "properties": {"title": spreadsheet["title"], "locale": "ja_JP", "timeZone": "Asia/Tokyo"},
+            "sheets": [{"properties": sheet["properties"]} for sheet in spreadsheet["sheets"]],
+        }
+
+    def _batch_update(self, spreadsheet_id: str, spreadsheet: Dict, body: Dict) -> Dict:
+        replies = []
+        for request in body.get("requests", []):
+            if "addSheet" in request:
+                properties = self._add_sheet(spreadsheet, request["addSheet"].get("properties", {}))
+                replies.append({"addSheet": {"properties": properties}})
+            elif "deleteSheet" in request:
+                sheet = self._sheet_by_id(spreadsheet, request["deleteSheet"]["sheetId"])
+                spreadsheet["sheets"].remove(sheet)
+                self._reindex(spreadsheet)
+                replies.append({})
+            elif "updateSheetProperties" in request:
+                update = request["updateSheetProperties"]
+                sheet = self._sheet_by_id(spreadsheet, update["properties"]["sheetId"])
+                fields = [field.strip() for field in update.get("fields", "").split(",")]
+                if "index" in fields and "index" in update["properties"]:
+                    # 移動先の位置（削除前の並びでの位置）に移す
+                    target = update["properties"]["index"]
+                    current = spreadsheet["sheets"].index(sheet)
+                    spreadsheet["sheets"].remove(sheet)
+                    spreadsheet["sheets"].insert(target - 1 if target > current else target, sheet)
+                    self._reindex(spreadsheet)
+                    fields.remove("index")
+                for field_path in filter(None, fields):
+                    self._copy_field(update["properties"], sheet["properties"], field_path.strip().replace("/", ".").split("."))
+                if "gridProperties" in update["properties"]:
+                    self._truncate(sheet)
+                replies.append({})
+            elif "repeatCell" in request or "updateBorders" in request:
+                grid_range = next(iter(request.values()))["range"]
+                self._sheet_by_id(spreadsheet, grid_range.get("sheetId", 0))
+                replies.append({})
+            else:
+                raise StubError(400, f"Unsupported batchUpdate request: {list(request)}")
+        return {"spreadsheetId": spreadsheet_id, "replies": replies}
+
+    @staticmethod
+    def _copy_field(source: Dict, target: Dict, keys: List[str]):
+        """fieldsで指定された項目だけをコピー"""
+        for key in keys[:-1]:
+            if key not in source:
+                return
+            source = source[key]
+            target = target.setdefault(key, {})
+        if keys[-1] in source:
+            target[keys[-1]] = source[keys[-1]]
+
+    @staticmethod
+    def _truncate(sheet: Dict):
+        """グリッドの外に出たセルを削除"""
+        grid = sheet["properties"]["gridProperties"]
+        for key in list(sheet["cells"]):
+            if key[0] >= grid["rowCount"] or key[1] >= grid["columnCount"]:
+                del sheet["cells"][key]
+
+    def _add_sheet(self, spreadsheet: Dict, properties: Dict) -> Dict:
+        title = properties.get("title") or f"シート{len(spreadsheet['sheets']) + 1}"
+        if any(sheet["properties"]["title"] == title for sheet in spreadsheet["sheets"]):
+            raise StubError(400, f'A sheet with the name "{title}" already exists.')
+        sheet_id = properties.get("sheetId")
+        if sheet_id is None:
+            sheet_id = spreadsheet["next_id"]
+        elif any(sheet["properties"]["sheetId"] == sheet_id for sheet in spreadsheet["sheets"]):
+            raise StubError(400, f"Sheet id {sheet_id} already exists.")
+        spreadsheet["next_id"] = max(spreadsheet["next_id"], sheet_id + 1)
+
+        grid = properties.get("gridProperties", {})
+        sheet = {
+            "properties": {
+                "sheetId": sheet_id,
+                "title": title,
+                "index": len(spreadsheet["sheets"]),
+                "sheetType": "GRID",
+                "gridProperties": {"rowCount": grid.get("rowCount", 1000), "columnCount": grid.get("columnCount", 26)},
+            },
+            "cells": {},
+        }
+        if properties.get("hidden"):
+            sheet["properties"]["hidden"] = True
+        index = properties.get("index")
+        if index is None:
+            spreadsheet["sheets"].append(sheet)
+        else:
+            spreadsheet["sheets"].insert(index, sheet)
+        self._reindex(spreadsheet)
+        return sheet["properties"]
+
+    @staticmethod
+    def _reindex(spreadsheet: Dict):
+        for index, sheet in enumerate(spreadsheet["sheets"]):
+            sheet["properties"]["index"] = index
+
+    @staticmethod
+    def _sheet_by_id(spreadsheet: Dict, sheet_id: int) -> Dict:
+        for sheet in spreadsheet["sheets"]:
+            if sheet["properties"]["sheetId"] == sheet_id:
+                return sheet
+        raise StubError(400, f"No grid with id: {sheet_id}")
+
+    def _resolve(self, spreadsheet: Dict, cell_range: str) -> Tuple[Dict, Dict]:
+        """A1形式の範囲から (シート, グリッド範囲) を得る"""
+        if "!" in cell_range:
+            title, a1 = cell_range.rsplit("!", 1)
+        else:
+            title, a1 = cell_range, ""
+        if title.startswith("'") and title.endswith("'"):
+            title = title[1:-1].replace("''", "'")
+        for sheet in spreadsheet["sheets"]:
+            if sheet["properties"]["title"] == title:
+                break
+        else:
+            raise StubError(400, f"Unable to parse range: {cell_range}")
+        grid = sheet["properties"]["gridProperties"]
+        bounds = a1_range_to_grid_range(a1) if a1 else {}
+        return sheet, {
+            "startRowIndex": bounds.get("startRowIndex", 0),
+            "endRowIndex": bounds.get("endRowIndex", grid["rowCount"]),
+            "startColumnIndex": bounds.get("startColumnIndex", 0),
+            "endColumnIndex": bounds.get("endColumnIndex", grid["columnCount"]),
+        }
+
+    def _values_update(self, spreadsheet: Dict, cell_range: str, values: List[List]) -> Dict:
+        sheet, bounds = self._resolve(spreadsheet, cell_range)
+        grid = sheet["properties"]["gridProperties"]
+        row0, col0 = bounds["startRowIndex"], bounds["startColumnIndex"]
+        width = max((len(row) for row in values), default=0)
+        if row0 + len(values) > grid["rowCount"] or col0 + width > grid["columnCount"]:
+            raise StubError(400, f"Range ({cell_range}) exceeds grid limits.")
+        cells = 0
+        for r, row in enumerate(values):
+            for c, value in enumerate(row):
+                key = (row0 + r, col0 + c)
+                if value in ("", None):
+                    sheet["cells"].pop(key, None)
+                else:
+                    sheet["cells"][key] = value
+                cells += 1
+        return {"updatedRange": cell_range, "updatedRows": len(values), "updatedColumns": width, "updatedCells": cells}
+
+    def _values_clear(self, spreadsheet: Dict, cell_range: str):
+        sheet, bounds = self._resolve(spreadsheet, cell_range)
+        for key in list(sheet["cells"]):
+            if (bounds["startRowIndex"] <= key[0] < bounds["endRowIndex"]
+                    and bounds["startColumnIndex"] <= key[1] < bounds["endColumnIndex"]):
+                del sheet["cells"][key]
+
+    def _values_get(self, spreadsheet: Dict, cell_range: str) -> List[List]:
+        sheet, bounds = self._resolve(spreadsheet, cell_range)
+        keys = [key for key in sheet["cells"]
+                if bounds["startRowIndex"] <= key[0] < bounds["endRowIndex"]
+                and bounds["startColumnIndex"] <= key[1] < bounds["endColumnIndex"]]
+        if not keys:
+            return []
+        rows = max(key[0] for key in keys) - bounds["startRowIndex"] + 1
+        cols = max(key[1] for key in keys) - bounds["startColumnIndex"] + 1
+        values = [[""] * cols for _ in range(rows)]
+        for key in keys:
+            values[key[0] - bounds["startRowIndex"]][key[1] - bounds["startColumnIndex"]] = sheet["cells"][key]
+        for row in values:
+            while row and row[-1] == "":
+                row.pop()
+        return values
+
+    def sheet_values(self, spreadsheet_id: str, title: str) -> List[List]:
+        """テスト用: シートの値を取得"""
+        return self._values_get(self.spreadsheets[spreadsheet_id], f"'{title}'")
+
+
+class _StubResponse:
+    def __init__(self, status_code: int, payload: Dict, headers: Dict[str, str]):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = headers
+        self._payload = payload
+        self.text = json.dumps(payload)
+        self.content = self.text.encode("utf-8")
+
+    def json(self):
+        return self._payload
+
+
+class StubSession:
+    """requests.Sessionの代わりにStubSheetsBackendへ直接リクエストを渡す（HTTPを通さない）"""
+
+    def __init__(self, backend: StubSheetsBackend):
+        self.backend = backend
+        self.headers = {}
+
+    def request(self, method, url, json=None, params=None, data=None, files=None, headers=None, timeout=None):
+        parts = urlsplit(url)
+        query = parse_qs(parts.query)
+        for key, value in (params or {}).items():
+            query.setdefault(key, []).append(str(value))
+        content_type = (headers or {}).get("Content-Type", "")
+        return _StubResponse(*self.backend.handle(method, parts.path, query, json, data or b"", content_type))
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """HTTPリクエストを StubSheetsBackend に渡す"""
+
+    protocol_version = "HTTP/1.1"
+
+    def _handle(self):
+        parts = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        content_type = self.headers.get("Content-Type", "")
+        body = None
+        if raw and content_type.startswith("application/json"):
+            try:
+                body = json.loads(raw)
+            except ValueError:
+                pass
+        status, payload, headers = self.server.backend.handle(
+            self.command, parts.path, parse_qs(parts.query), body, raw, content_type)
+
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class StubSheetsServer(ThreadingHTTPServer):
+    """StubSheetsBackend を持つHTTPサーバー"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], backend: StubSheetsBackend, verbose: bool = False):
+        super().__init__(address, StubRequestHandler)
+        self.backend = backend
+        self.verbose = verbose
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def serve_in_background(backend: StubSheetsBackend, host: str = "127.0.0.1", port: int = 0) -> StubSheetsServer:
+    """別スレッドでサーバーを起動する（port=0なら空いているポート）。止めるときは shutdown()"""
+    server = StubSheetsServer((host, port), backend)
+    threading.Thread(target=server.serve_forever, name="sheets-stub", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Google Sheets APIのローカル代替サーバー')
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--spreadsheet-id', default=SPREADSHEET_ID, help='最初から用意するスプレッドシートのID')
+    parser.add_argument('--latency', type=float, default=0.0, help='1リクエストごとの遅延（秒）')
+    parser.add_argument('--read-per-minute', type=int, help='読み込みのクォータ（1分あたり）')
+    parser.add_argument('--write-per-minute', type=int, help='書き込みのクォータ（1分あたり）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='429を返す確率')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--verbose', action='store_true', help='リクエストごとにログを出す')
+    args = parser.parse_args()
+
+    backend = StubSheetsBackend(latency=args.latency, read_per_minute=args.read_per_minute,
+                                write_per_minute=args.write_per_minute, error_rate=args.error_rate, seed=args.seed)
+    backend.create_spreadsheet(args.spreadsheet_id)
+    server = StubSheetsServer((args.host, args.port), backend, verbose=args.verbose)
+    print(f"Serving Sheets API stub on {server.endpoint} (spreadsheet {args.spreadsheet_id})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"{len(backend.request_log)} requests handled")
+
+
+if __name__ == "__main__":
+    main()
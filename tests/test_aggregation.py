@@ -0,0 +1,36 @@
+"""aggregation のテスト（NumPy での集計を半荘ごとの集計と比べる）"""
+import io
+import json
+import random
+
+import pytest
+
+from aggregation import aggregate_players
+from benchmarks.paifu_generator import generate_game
+from main import calc_player_data_by_round
+from parser import PaifuParser
+
+
+@pytest.mark.parametrize("player_n", [4, 3])
+def test_aggregate_players_matches_calc_player_data_by_round(player_n):
+    """生成した300半荘（四麻・三麻で計600半荘）で、プレイヤーの並びも含めて一致する"""
+    rng = random.Random(13)
+    parser = PaifuParser(player_n, {})
+    round_data_list = [
+        parser.parse_round(f"{i}.json", stream=io.BytesIO(json.dumps(generate_game(rng, player_n)).encode("utf-8")))
+        for i in range(300)
+    ]
+
+    expected = {}
+    for round_data in round_data_list:
+        calc_player_data_by_round(round_data, expected, player_n, f"team{player_n}")
+    actual = aggregate_players(round_data_list, player_n)
+
+    assert list(actual) == list(expected)
+    assert actual == expected
+    # 役満・レア役を含む半荘がある（比較が空振りしていない）
+    assert any(data.rareFans for player_data in actual.values() for data in player_data.dataList)
+
+
+def test_aggregate_players_empty():
+    assert aggregate_players([], 4) == {}
@@ -0,0 +1,49 @@
+"""paifu_catalog のテスト"""
+import json
+import threading
+
+from paifu_catalog import PaifuCatalog
+
+
+def write_paifu(path, uuid, player_n):
+    head = {
+        "uuid": uuid,
+        "start_time": 1700000000,
+        "accounts": [{"seat": seat, "nickname": f"p{seat}"} for seat in range(player_n)],
+        "result": {"players": [{"seat": seat, "total_point": 1000 * seat} for seat in range(player_n)]},
+    }
+    path.write_text(json.dumps({"head": head, "data": {}}), encoding="utf-8")
+
+
+def test_scan_and_save_from_two_threads(tmp_path):
+    """四麻・三麻を並行して scan・save しても一時ファイルを取り合わない"""
+    for player_n in (4, 3):
+        directory = tmp_path / "paifu" / str(player_n)
+        directory.mkdir(parents=True)
+        for i in range(50):
+            write_paifu(directory / f"{i:03d}.json", f"{player_n}-{i}", player_n)
+
+    catalog = PaifuCatalog(tmp_path / "cache" / "catalog.json")
+    errors = []
+    start = threading.Barrier(2)
+
+    def run(player_n):
+        try:
+            start.wait()
+            catalog.scan(tmp_path / "paifu" / str(player_n))
+            for _ in range(50):
+                catalog.save()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(player_n,)) for player_n in (4, 3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    reloaded = PaifuCatalog(tmp_path / "cache" / "catalog.json")
+    assert len(reloaded.scan(tmp_path / "paifu" / "4")) == 50
+    assert len(reloaded.scan(tmp_path / "paifu" / "3")) == 50
+    assert reloaded.reads == 0
@@ -0,0 +1,62 @@
+"""paifu_reader のテスト（逐次読み込みの結果を json.load と比べる）"""
+import io
+import json
+import random
+
+import pytest
+
+from benchmarks.paifu_generator import generate_game
+from paifu_reader import PARSE_EVENTS, PaifuReader
+
+
+def expected_events(paifu):
+    """json.load で全体を読んだ場合に取り出されるイベント"""
+    return [
+        (action["result"]["name"], action["result"]["data"])
+        for action in paifu["data"]["data"]["actions"]
+        if action.get("type") == 1 and action["result"]["name"] in PARSE_EVENTS
+    ]
+
+
+def read_events(path, **kwargs):
+    with PaifuReader(path, **kwargs) as reader:
+        events = list(reader.iter_events())
+        return reader.head, events
+
+
+@pytest.mark.parametrize("player_n", [4, 3])
+@pytest.mark.parametrize("indent", [None, 2])
+@pytest.mark.parametrize("chunk_size", [7, 1 << 16])
+def test_streaming_matches_json_load(tmp_path, monkeypatch, player_n, indent, chunk_size):
+    """バッファ境界・空白の有無にかかわらず json.load と同じイベントと head を返す"""
+    monkeypatch.setattr(PaifuReader, "CHUNK_SIZE", chunk_size)
+    paifu = generate_game(random.Random(player_n), player_n)
+    path = tmp_path / "paifu.json"
+    path.write_text(json.dumps(paifu, ensure_ascii=False, indent=indent), encoding="utf-8")
+    with open(path, 'r', encoding='utf-8') as f:
+        loaded = json.load(f)
+
+    head, events = read_events(path, stream_min_bytes=0)
+    assert head == loaded["head"]
+    assert events == expected_events(loaded)
+
+    # 小さい牌譜を一度に読む既定の経路も同じ結果になる
+    assert read_events(path) == (head, events)
+
+
+def test_stream_argument():
+    """stream を渡した場合はファイルを開かずにそこから読む"""
+    paifu = generate_game(random.Random(0), 4)
+    data = json.dumps(paifu).encode("utf-8")
+    for stream_min_bytes in (0, len(data) + 1):
+        head, events = read_events("member.json", stream=io.BytesIO(data), stream_min_bytes=stream_min_bytes)
+        assert head == paifu["head"]
+        assert events == expected_events(paifu)
+
+
+def test_read_head(tmp_path):
+    paifu = generate_game(random.Random(1), 3)
+    path = tmp_path / "paifu.json"
+    path.write_text(json.dumps(paifu), encoding="utf-8")
+    with PaifuReader(path) as reader:
+        assert reader.read_head() == paifu["head"]
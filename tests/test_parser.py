@@ -0,0 +1,93 @@
+"""parser のテスト（ロンの放銃者の判定）"""
+import json
+
+from parser import PaifuParser
+
+NICKNAMES = ["p0", "p1", "p2", "p3"]
+SCORES = [25000] * 4
+
+
+def action(name, data):
+    return {"type": 1, "result": {"name": name, "data": data}}
+
+
+def new_round(ju, scores):
+    return action(".lq.RecordNewRound", {"chang": 0, "ju": ju, "ben": 0, "scores": scores})
+
+
+def discard(seat):
+    return action(".lq.RecordDiscardTile", {"seat": seat, "tile": "1m"})
+
+
+def deal(seat):
+    return action(".lq.RecordDealTile", {"seat": seat, "tile": "1m"})
+
+
+def rong_hule(seat, dadian):
+    return {"seat": seat, "zimo": False, "dadian": dadian, "count": 1, "fu": 30, "fans": [{"id": 1, "val": 1}]}
+
+
+def hule_action(hules, old_scores, delta_scores):
+    return action(".lq.RecordHule", {"hules": hules, "old_scores": old_scores, "delta_scores": delta_scores})
+
+
+def write_paifu(path, actions):
+    head = {
+        "uuid": "test",
+        "accounts": [{"seat": seat, "nickname": nickname} for seat, nickname in enumerate(NICKNAMES)],
+        "result": {"players": [{"seat": seat, "total_point": 0} for seat in range(4)]},
+    }
+    # 思考時間（type 2）は読み飛ばされる
+    actions = [{"type": 2, "result": {}}] + actions
+    path.write_text(json.dumps({"head": head, "data": {"data": {"actions": actions}}}), encoding="utf-8")
+
+
+def parse(tmp_path, actions):
+    path = tmp_path / "paifu.json"
+    write_paifu(path, actions)
+    return PaifuParser(4, {}).parse_round(path)
+
+
+def test_ron_on_last_discard(tmp_path):
+    """放銃者は最後に打牌した席（それより前の打牌・ツモは関係ない）"""
+    round_data = parse(tmp_path, [
+        new_round(0, SCORES),
+        deal(0), discard(0), deal(1), discard(1), deal(2), discard(2),
+        hule_action([rong_hule(3, 2000)], SCORES, [0, 0, -2000, 2000]),
+    ])
+    hand, = round_data.hands
+    hule, = hand.huleData
+    assert (hule.seat, hule.rongPlayer) == (3, 2)
+    assert list(hand.deltaMain) == [0, 0, -2000, 2000]
+
+
+def test_robbed_kan(tmp_path):
+    """槍槓は打牌ではなく加槓した席が放銃者"""
+    round_data = parse(tmp_path, [
+        new_round(0, SCORES),
+        deal(0), discard(0), deal(1),
+        action(".lq.RecordAnGangAddGang", {"seat": 1, "type": 2, "tiles": "5p"}),
+        hule_action([rong_hule(2, 1000)], SCORES, [0, -1000, 1000, 0]),
+    ])
+    hule, = round_data.hands[0].huleData
+    assert (hule.seat, hule.rongPlayer) == (2, 1)
+    assert list(round_data.hands[0].deltaMain) == [0, -1000, 1000, 0]
+
+
+def test_double_ron_and_new_round_reset(tmp_path):
+    """ダブロンは同じ放銃者、次の局では前局の打牌を引き継がない"""
+    second_scores = [25000, 20000, 27000, 28000]
+    round_data = parse(tmp_path, [
+        new_round(0, SCORES),
+        deal(0), discard(0), deal(1), discard(1),
+        hule_action([rong_hule(2, 2000), rong_hule(3, 3000)], SCORES, [0, -5000, 2000, 3000]),
+        new_round(1, second_scores),
+        deal(1), discard(1), deal(2), discard(2), deal(3), discard(3),
+        hule_action([rong_hule(0, 1000)], second_scores, [1000, 0, 0, -1000]),
+    ])
+    first, second = round_data.hands
+    assert [(hule.seat, hule.rongPlayer) for hule in first.huleData] == [(2, 1), (3, 1)]
+    assert list(first.deltaMain) == [0, -5000, 2000, 3000]
+    assert [(hule.seat, hule.rongPlayer) for hule in second.huleData] == [(0, 3)]
+    assert list(second.deltaMain) == [1000, 0, 0, -1000]
+    assert list(second.deltaSub) == [0, 0, 0, 0]
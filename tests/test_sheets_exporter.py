@@ -0,0 +1,42 @@
+"""sheets_exporter のテスト（Google Sheets API の代わりに sheets_stub_server を使う）"""
+import gspread
+import pytest
+from google.auth.credentials import AnonymousCredentials
+
+from sheet_format import RenderedSheet, SheetFormat, grid_rows
+from sheets_exporter import SheetsExporter
+from sheets_stub_server import StubSession, StubSheetsBackend
+
+SPREADSHEET_ID = "test-spreadsheet"
+
+
+@pytest.fixture
+def backend():
+    backend = StubSheetsBackend()
+    backend.create_spreadsheet(SPREADSHEET_ID)
+    return backend
+
+
+def open_exporter(backend, **kwargs):
+    client = gspread.Client(AnonymousCredentials(), session=StubSession(backend))
+    return SheetsExporter(spreadsheet=client.open_by_key(SPREADSHEET_ID), **kwargs)
+
+
+def render(title, row_count):
+    values = [[f"row{i}", i] for i in range(row_count)]
+    sheet_format = SheetFormat()
+    sheet_format.set_top_border(f"A{row_count}:B{row_count}")
+    return RenderedSheet(title, values, "B1", rows=grid_rows(values, "B1"), cols=10, sheet_format=sheet_format)
+
+
+@pytest.mark.parametrize("deferred", [False, True])
+def test_rewrite_grows_existing_sheet(backend, deferred):
+    """前回より行数が増えたシート（60半荘分のプレイヤーデータなど）も書き込める"""
+    for row_count in (10, 250):
+        exporter = open_exporter(backend, deferred=deferred)
+        exporter.write_sheet(render("【四麻】プレイヤーデータ", row_count))
+        exporter.flush()
+
+    values = backend.sheet_values(SPREADSHEET_ID, "【四麻】プレイヤーデータ")
+    assert len(values) == 250
+    assert values[-1][1:] == ["row249", 249]
@@ -0,0 +1,48 @@
+"""OAuthアクセストークンのディスクキャッシュ（実行ごとのトークン取得を省く）"""
+import datetime
+import json
+import os
+from pathlib import Path
+
+# 期限切れ直前のトークンは使わない
+EXPIRY_MARGIN = datetime.timedelta(minutes=5)
+
+
+def _cache_key(creds) -> dict:
+    """同じサービスアカウント・スコープのトークンだけを使う"""
+    return {
+        "account": getattr(creds, "service_account_email", ""),
+        "scopes": sorted(getattr(creds, "scopes", None) or []),
+    }
+
+
+def load_token(creds, path: Path) -> bool:
+    """有効期限内のトークンがあれば creds に設定し、設定したかを返す"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        expiry = datetime.datetime.fromisoformat(cached["expiry"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+    # google-auth は expiry をタイムゾーンなしのUTCで扱う
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    if cached.get("key") != _cache_key(creds) or expiry - EXPIRY_MARGIN <= now:
+        return False
+    creds.token = cached["token"]
+    creds.expiry = expiry
+    return True
+
+
+def save_token(creds, path: Path):
+    """creds のトークンを保存（本人だけが読めるようにする）"""
+    if not creds.token or creds.expiry is None:
+        return
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {"key": _cache_key(creds), "token": creds.token, "expiry": creds.expiry.isoformat()}
+    tmp_path = path.with_suffix(".tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
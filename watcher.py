@@ -0,0 +1,107 @@
+"""牌譜ディレクトリの監視（inotify、使えなければポーリング）"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Set, Tuple
+
+# inotify のイベント（linux/inotify.h）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class InotifyWatcher:
+    """inotify で書き込み完了・移動してきたファイルを検出する"""
+
+    def __init__(self, directories: Iterable[Path], suffix: str = ".json"):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.suffix = suffix
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.directories: Dict[int, Path] = {}
+        for directory in directories:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(errno, f"inotify_add_watch failed: {directory}")
+            self.directories[wd] = Path(directory)
+
+    def wait(self, timeout: float) -> Set[Path]:
+        """timeout 秒まで待ち、追加・更新されたファイルを返す"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0").decode(sys.getfilesystemencoding())
+                offset += length
+                if wd in self.directories and name.endswith(self.suffix):
+                    changed.add(self.directories[wd] / name)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """一定間隔でディレクトリを走査し、更新時刻かサイズが変わったファイルを検出する"""
+
+    def __init__(self, directories: Iterable[Path], suffix: str = ".json"):
+        self.directories = [Path(directory) for directory in directories]
+        self.suffix = suffix
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        snapshot = {}
+        for directory in self.directories:
+            for path in directory.glob(f"*{self.suffix}"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout: float) -> Set[Path]:
+        """timeout 秒待ってから走査し、追加・更新されたファイルを返す"""
+        time.sleep(timeout)
+        snapshot = self._scan()
+        changed = {path for path, stat in snapshot.items() if self._snapshot.get(path) != stat}
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def open_watcher(directories: Iterable[Path], use_inotify: bool = True):
+    """inotify の監視を作り、使えない環境ではポーリングにする"""
+    directories = list(directories)
+    for directory in directories:
+        Path(directory).mkdir(parents=True, exist_ok=True)
+    if use_inotify and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError) as e:
+            print(f"Warning: inotify unavailable ({e}), falling back to polling")
+    return PollingWatcher(directories)
@@ -0,0 +1,112 @@
+"""xlsxファイルへの出力（openpyxl の write-only モード）"""
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill
+from openpyxl.styles.borders import Border, Side
+from openpyxl.utils.cell import coordinate_to_tuple, range_boundaries
+
+import metrics
+from exporter import Exporter, division_sheet_order
+from sheet_format import RenderedSheet
+
+# Sheets APIの罫線スタイル -> openpyxl
+BORDER_STYLES = {"SOLID": "thin", "SOLID_MEDIUM": "medium", "SOLID_THICK": "thick", "DASHED": "dashed", "DOTTED": "dotted"}
+
+
+class XlsxExporter(Exporter):
+    """Google Sheets と同じレイアウトのシートを1つのxlsxファイルに書き出す
+
+    write-only モードでシートごとに行を書き出すため、試合数が多くてもメモリは増えない。
+    ファイルは close で保存する。
+    """
+
+    def __init__(self, path: Path):
+        super().__init__()
+        self.path = Path(path)
+        self.workbook = Workbook(write_only=True)
+        self._lock = threading.Lock()
+        # 同じ色・罫線のスタイルは使い回す
+        self._fills: Dict[Tuple[float, float, float], PatternFill] = {}
+        self._borders: Dict[str, Border] = {}
+
+    def write_sheet(self, rendered: RenderedSheet) -> bool:
+        """シートを追加して値と書式を書き出す"""
+        with metrics.run.timer("write"), self._lock:
+            self._written_titles.add(rendered.title)
+            worksheet = self.workbook.create_sheet(rendered.title)
+            styles = self._cell_styles(rendered)
+            row0, col0 = coordinate_to_tuple(rendered.start_cell)
+
+            last_row = max([row0 + len(rendered.values) - 1] + [row for row, _ in styles])
+            for row in range(1, last_row + 1):
+                values = rendered.values[row - row0] if 0 <= row - row0 < len(rendered.values) else []
+                last_col = max([col0 + len(values) - 1] + [col for r, col in styles if r == row])
+                cells = []
+                for col in range(1, last_col + 1):
+                    value = values[col - col0] if 0 <= col - col0 < len(values) else None
+                    cell = WriteOnlyCell(worksheet, value=None if value == "" else value)
+                    fill, border = styles.get((row, col), (None, None))
+                    if fill is not None:
+                        cell.fill = fill
+                    if border is not None:
+                        cell.border = border
+                    cells.append(cell)
+                worksheet.append(cells)
+            # 書き終えたシートは一時ファイルを閉じる（シート数だけファイルを開いたままにしない）
+            worksheet.close()
+        return True
+
+    def _cell_styles(self, rendered: RenderedSheet) -> Dict[Tuple[int, int], List]:
+        """(行, 列) -> [背景, 罫線]（後から設定したものを優先する）"""
+        styles: Dict[Tuple[int, int], List] = {}
+        for cell_range, color in rendered.sheet_format.backgrounds:
+            fill = self._fill(color)
+            for key in _cells(cell_range):
+                styles.setdefault(key, [None, None])[0] = fill
+        for cell_range, border in rendered.sheet_format.top_borders:
+            top = self._top_border(border["style"])
+            for key in _cells(cell_range):
+                styles.setdefault(key, [None, None])[1] = top
+        return styles
+
+    def _fill(self, color: Dict[str, float]) -> PatternFill:
+        key = (color.get("red", 0), color.get("green", 0), color.get("blue", 0))
+        if key not in self._fills:
+            rgb = "".join(f"{round(channel * 255):02X}" for channel in key)
+            self._fills[key] = PatternFill(fgColor=rgb, fill_type="solid")
+        return self._fills[key]
+
+    def _top_border(self, style: str) -> Border:
+        if style not in self._borders:
+            self._borders[style] = Border(top=Side(style=BORDER_STYLES.get(style, "thin")))
+        return self._borders[style]
+
+    def sort_division_sheets(self):
+        """四麻・三麻のシートを順番通りに並べ直す（並行して出力した後に使う）"""
+        with self._lock:
+            ordered = sorted(self.workbook.worksheets, key=lambda worksheet: division_sheet_order(worksheet.title))
+            # 先頭から順に目的の位置へ移す（移動は常に前方向になる）
+            for index, worksheet in enumerate(ordered):
+                self.workbook.move_sheet(worksheet.title, index - self.workbook.index(worksheet))
+
+    def close(self):
+        """ファイルに保存"""
+        if not self.workbook.worksheets:
+            print("No sheets to save")
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with metrics.run.timer("save"):
+            self.workbook.save(self.path)
+        print(f"Saved {len(self.workbook.worksheets)} sheets to {self.path}")
+
+
+def _cells(cell_range: str):
+    """A1形式の範囲に含まれる (行, 列)"""
+    min_col, min_row, max_col, max_row = range_boundaries(cell_range)
+    for row in range(min_row, max_row + 1):
+        for col in range(min_col, max_col + 1):
+            yield row, col